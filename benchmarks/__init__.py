@@ -0,0 +1,3 @@
+"""
+Benchmarks for the bot. Run from the repository root, e.g. `python -m benchmarks.bench_save_order`.
+"""
@@ -0,0 +1,100 @@
+"""
+Cart micro-benchmark: the old dict-of-CartItem cart (float/Decimal prices,
+totals and text rebuilt on every change) against Cart (integer kopecks,
+incremental total, cached lines), for carts of growing size; and the time to
+parse a cart typed in one message against catalogs of growing size.
+
+    python -m benchmarks.bench_cart --lines 10 100 1000 --updates 2000
+"""
+import json
+import time
+import random
+import argparse
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Callable, Dict
+from bot.models.models import Cart, Product, to_minor_units
+from bot.utils.product_matcher import ProductMatcher, parse_cart_entry
+from bot.utils.formatters import format_cart_text
+
+@dataclass
+class OldCartItem:
+    name: str
+    price: float
+    quantity: int
+
+def format_cart_text_before(cart: Dict[str, OldCartItem]) -> str:
+    """The previous format_cart_text: every subtotal, the total and the text from scratch."""
+    total = 0
+    cart_lines = []
+    for item in cart.values():
+        subtotal = item.quantity * item.price
+        total += subtotal
+        cart_lines.append(f"• {item.name}: {item.quantity} × ₴{item.price} = ₴{subtotal}")
+    return "🛒 Cart:\n" + "\n".join(cart_lines) + f"\n\n💰 Total: ₴{total:.2f}\n\n🔽 Select more products or confirm order:"
+
+def encode_before(cart: Dict[str, OldCartItem]) -> str:
+    return json.dumps(
+        {product_id: [item.name, str(item.price), item.quantity] for product_id, item in cart.items()},
+        ensure_ascii=False, separators=(',', ':')
+    )
+
+def time_per_call(fn: Callable[[int], None], calls: int) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - started) / calls * 1e6
+
+def run(lines: int, updates: int) -> None:
+    prices = [Decimal(random.randint(100, 99999)).scaleb(-2) for _ in range(lines)]
+    old: Dict[str, OldCartItem] = {}
+    new = Cart()
+    for product_id, price in enumerate(prices):
+        old[str(product_id)] = OldCartItem(f'Product {product_id}', price, 1)
+        new.set(str(product_id), f'Product {product_id}', to_minor_units(price), 1)
+    changes = [(str(random.randrange(lines)), random.randint(1, 50)) for _ in range(updates)]
+
+    def update_before(i: int) -> None:
+        product_id, quantity = changes[i]
+        old[product_id] = OldCartItem(old[product_id].name, old[product_id].price, quantity)
+        format_cart_text_before(old)
+
+    def update_after(i: int) -> None:
+        product_id, quantity = changes[i]
+        item = new.get(product_id)
+        new.set(product_id, item.name, item.price, quantity)
+        format_cart_text(new)
+
+    before = time_per_call(update_before, updates)
+    after = time_per_call(update_after, updates)
+    size_before = len(encode_before(old).encode())
+    size_after = len(json.dumps(new.encode(), ensure_ascii=False, separators=(',', ':')).encode())
+    print(
+        f"{lines:>5} lines: update + render {before:8.1f} µs -> {after:8.1f} µs ({before / after:4.1f}x), "
+        f"serialized {size_before} -> {size_after} bytes"
+    )
+
+def run_entry_parse(products: int, calls: int) -> None:
+    catalog = [Product(1, 'Plastic', Decimal('100')), Product(2, 'Leather', Decimal('300')),
+               Product(3, 'Bracelet', Decimal('200'))]
+    catalog += [Product(id, f'Product {id}', Decimal('1')) for id in range(4, products + 1)]
+    matcher = ProductMatcher(catalog)
+    for text in ('Plastic 3, Leather x2, brac 1', 'plastc 3, lether x2, braclet 1'):
+        items, errors = parse_cart_entry(text, matcher)
+        assert len(items) == 3 and not errors
+        elapsed = time_per_call(lambda i: parse_cart_entry(text, matcher), calls)
+        print(f"{products:>5} products: parse {text!r} {elapsed:6.1f} µs")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, nargs='+', default=[10, 100, 1000], help='cart sizes to measure')
+    parser.add_argument('--updates', type=int, default=2000, help='quantity changes per cart size')
+    args = parser.parse_args()
+    random.seed(1)
+    for lines in args.lines:
+        run(lines, args.updates)
+    for products in (3, 100, 1000):
+        run_entry_parse(products, args.updates)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+End-to-end order-flow benchmark. Drives the real application from bot.py
+(command_new_order -> handle_name -> handle_location -> handle_product_selection
+-> handle_quantity -> confirm) with synthetic updates for concurrent simulated
+operators, using a stub Bot that records outbound API calls and either an
+in-memory fake database or the local database in DATABASE_URL (Postgres or a
+sqlite:/// file).
+
+    python -m benchmarks.bench_order_flow --operators 20 --orders 50 --output results.json
+    python -m benchmarks.bench_order_flow --database local --compare results.json
+    python -m benchmarks.bench_order_flow --rate-limit   # through the outbound scheduler
+    python -m benchmarks.bench_order_flow --products 3 --bulk   # cart typed in one message
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import itertools
+import importlib.util
+from collections import defaultdict
+from typing import Dict, List
+from .common import ROOT, summarize
+from .fake_telegram import FakeBotAPI, StubRequest, order_flow, order_updates
+
+def load_entrypoint():
+    """Import bot.py (shadowed by the `bot` package, so it is loaded by path)."""
+    spec = importlib.util.spec_from_file_location('bot_entrypoint', ROOT / 'bot.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+async def run(args) -> Dict:
+    entrypoint = load_entrypoint()
+    from telegram import Update
+    from telegram.ext import ExtBot
+    from bot.database.database import db
+    from bot.database.order_queue import order_queue
+    from bot.utils.catalog import catalog
+    from bot.utils.rate_limiter import create_rate_limiter
+    from .fake_database import FakeDatabase
+
+    api = FakeBotAPI()
+    rate_limiter = create_rate_limiter() if args.rate_limit else None
+    bot = ExtBot(
+        '123456:stub', request=StubRequest(api), get_updates_request=StubRequest(api), rate_limiter=rate_limiter
+    )
+    application = entrypoint.build_application(bot)
+
+    database = FakeDatabase(args.db_latency) if args.database == 'fake' else db
+    await database.open()
+    catalog.db = database
+    order_queue.db = database
+
+    # post_init is only run by run_polling/run_webhook, the parts the flow needs are done here
+    await application.initialize()
+    await catalog.reload()
+    await order_queue.start()
+
+    flow = order_flow(args.products, args.bulk)
+    step_samples: Dict[int, List[float]] = defaultdict(list)
+    calls_before = sum(api.calls.values())
+    update_ids = itertools.count(1)
+
+    async def operator(chat_id: int) -> None:
+        for _ in range(args.orders):
+            for step, data in enumerate(order_updates(update_ids, chat_id, chat_id, flow)):
+                update = Update.de_json(data, bot)
+                started = time.perf_counter()
+                await application.process_update(update)
+                step_samples[step].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(operator(chat_id) for chat_id in range(1, args.operators + 1)))
+    elapsed = time.perf_counter() - started
+
+    await order_queue.stop(timeout=60)
+    await application.shutdown()
+    await database.close()
+
+    orders = args.operators * args.orders
+    calls = sum(api.calls.values()) - calls_before
+    handler_samples: Dict[str, List[float]] = defaultdict(list)
+    steps = []
+    for step, (_, payload, handler) in enumerate(flow):
+        handler_samples[handler].extend(step_samples[step])
+        steps.append({'step': step, 'update': payload, 'handler': handler, **summarize(step_samples[step])})
+
+    result = {
+        'config': vars(args),
+        'orders': orders,
+        'elapsed_s': elapsed,
+        'orders_per_sec': orders / elapsed,
+        'api_calls_per_order': calls / orders,
+        'api_calls': dict(api.calls),
+        'steps': steps,
+        'handlers': {handler: summarize(samples) for handler, samples in handler_samples.items()}
+    }
+    if rate_limiter:
+        result['rate_limiter'] = dict(rate_limiter.stats)
+    if args.database == 'fake':
+        result['orders_saved'] = len(database.orders)
+        result['db_round_trips_per_order'] = database.round_trips / orders
+    return result
+
+def print_result(result: Dict) -> None:
+    print(
+        f"{result['orders']} orders in {result['elapsed_s']:.2f}s: {result['orders_per_sec']:.1f} orders/s, "
+        f"{result['api_calls_per_order']:.1f} Bot API calls/order"
+    )
+    if 'rate_limiter' in result:
+        print(f"rate limiter: {result['rate_limiter']}")
+    if 'orders_saved' in result:
+        print(f"orders saved: {result['orders_saved']}, db round trips/order: {result['db_round_trips_per_order']:.2f}")
+    for step in result['steps']:
+        print(
+            f"  step {step['step']} {step['handler']:<26} {step['update']:<18} "
+            f"p50 {step['p50_ms']:.3f} ms  p99 {step['p99_ms']:.3f} ms"
+        )
+    for handler, stats in result['handlers'].items():
+        print(f"  {handler:<33} p50 {stats['p50_ms']:.3f} ms  p99 {stats['p99_ms']:.3f} ms")
+
+def print_comparison(baseline: Dict, result: Dict) -> None:
+    def change(old: float, new: float) -> str:
+        return f"{old:.3f} -> {new:.3f} ({(new - old) / old * 100:+.1f}%)" if old else f"{old} -> {new}"
+    print("Compared with baseline:")
+    print(f"  orders/s            {change(baseline['orders_per_sec'], result['orders_per_sec'])}")
+    print(f"  API calls/order     {change(baseline['api_calls_per_order'], result['api_calls_per_order'])}")
+    for old, new in zip(baseline['steps'], result['steps']):
+        print(f"  step {new['step']} p99 ms      {change(old['p99_ms'], new['p99_ms'])}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--operators', type=int, default=10, help='concurrent simulated operators')
+    parser.add_argument('--orders', type=int, default=20, help='orders per operator')
+    parser.add_argument('--products', type=int, choices=[1, 2, 3], default=1, help='products per order')
+    parser.add_argument('--bulk', action='store_true', help='type all products of an order in one message')
+    parser.add_argument('--database', choices=['fake', 'local'], default='fake')
+    parser.add_argument('--db-latency', type=float, default=0.0, help='simulated round trip of the fake database (s)')
+    parser.add_argument('--rate-limit', action='store_true', help='send Bot API calls through the outbound scheduler')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='compare with a previous JSON result')
+    args = parser.parse_args()
+
+    # Configure the bot before its modules are imported
+    os.environ['AUTHORIZED_USERS'] = ','.join(str(user_id) for user_id in range(1, args.operators + 1))
+    os.environ['PERSISTENCE_URL'] = 'none'
+    os.environ['ORDER_JOURNAL_PATH'] = os.path.join(tempfile.mkdtemp(), 'orders.journal')
+    if args.database == 'fake':
+        os.environ.setdefault('DATABASE_URL', 'postgresql://fake/fake')
+    elif not os.getenv('DATABASE_URL'):
+        sys.exit("DATABASE_URL must point at a local Postgres or SQLite file for --database local")
+
+    result = asyncio.run(run(args))
+    print_result(result)
+    if args.compare:
+        with open(args.compare) as baseline:
+            print_comparison(json.load(baseline), result)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(result, output, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Sharded-mode throughput benchmark. Starts a ShardFront with N worker processes,
+each running the real application from bot.py against a stub Bot and the
+in-memory fake database, routes the order flow of concurrent simulated
+operators through it and waits until every worker has drained.
+
+    python -m benchmarks.bench_sharding --workers 1 2 4 --operators 40 --orders 20
+    python -m benchmarks.bench_sharding --workers 4 --rebalance   # scale 4 -> 5 -> 4 mid-run
+
+Throughput only scales with workers up to the number of CPU cores.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import itertools
+from typing import Dict, List
+from .fake_telegram import FakeBotAPI, StubRequest, order_updates
+
+async def run_fake_worker(socket_path: str, db_latency: float) -> None:
+    """A worker as started by the front, with the stub Bot and fake database swapped in."""
+    from telegram.ext import ExtBot
+    from bot.database.order_queue import order_queue
+    from bot.utils.catalog import catalog
+    from bot.utils.sharding import run_worker
+    from .bench_order_flow import load_entrypoint
+    from .fake_database import FakeDatabase
+
+    api = FakeBotAPI()
+    application = load_entrypoint().build_application(
+        ExtBot('123456:stub', request=StubRequest(api), get_updates_request=StubRequest(api))
+    )
+    database = FakeDatabase(db_latency)
+
+    async def post_init(_) -> None:
+        await database.open()
+        catalog.db = database
+        order_queue.db = database
+        await catalog.reload()
+        await order_queue.start()
+
+    async def post_shutdown(_) -> None:
+        await order_queue.stop(timeout=60)
+        await database.close()
+        print(f"{os.getenv('SHARD_WORKER')}: {len(database.orders)} orders saved", file=sys.stderr)
+
+    application.post_init = post_init
+    application.post_shutdown = post_shutdown
+    await run_worker(application, socket_path)
+
+async def run(args, workers: int) -> Dict:
+    from bot.utils.sharding import ShardFront
+
+    command = [sys.executable, '-m', 'benchmarks.bench_sharding', 'worker', '--db-latency', str(args.db_latency)]
+    front = ShardFront(command, tempfile.mkdtemp())
+    await front.scale(workers)
+
+    update_ids = itertools.count(1)
+    updates: List[Dict] = []
+    for _ in range(args.orders):
+        for chat_id in range(1, args.operators + 1):
+            updates.extend(order_updates(update_ids, chat_id, chat_id))
+
+    started = time.perf_counter()
+    for index, update in enumerate(updates):
+        front.route(update)
+        if args.rebalance and index == len(updates) // 3:
+            await front.scale(workers + 1)
+        elif args.rebalance and index == 2 * len(updates) // 3:
+            await front.scale(workers)
+        elif index % 1000 == 0:
+            await asyncio.sleep(0)
+    await asyncio.gather(*(worker.drain() for worker in front.workers.values()))
+    elapsed = time.perf_counter() - started
+
+    await front.stop()
+    orders = args.operators * args.orders
+    return {'workers': workers, 'orders': orders, 'elapsed_s': elapsed, 'orders_per_sec': orders / elapsed}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+    worker_parser = subparsers.add_parser('worker')
+    worker_parser.add_argument('--socket', required=True)
+    worker_parser.add_argument('--db-latency', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='worker counts to measure')
+    parser.add_argument('--operators', type=int, default=40, help='concurrent simulated operators')
+    parser.add_argument('--orders', type=int, default=20, help='orders per operator')
+    parser.add_argument('--db-latency', type=float, default=0.0, help='simulated round trip of the fake database (s)')
+    parser.add_argument('--rebalance', action='store_true', help='add and remove a worker during the run')
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        asyncio.run(run_fake_worker(args.socket, args.db_latency))
+        return
+
+    # Configure the workers, which inherit the environment, before they are started
+    os.environ['AUTHORIZED_USERS'] = ','.join(str(user_id) for user_id in range(1, args.operators + 1))
+    os.environ['PERSISTENCE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'persistence.db')}"
+    os.environ['ORDER_JOURNAL_PATH'] = os.path.join(tempfile.mkdtemp(), 'orders.journal')
+    os.environ.setdefault('DATABASE_URL', 'postgresql://fake/fake')
+    os.environ.pop('METRICS_PORT', None)
+
+    baseline = None
+    for workers in args.workers:
+        result = asyncio.run(run(args, workers))
+        baseline = baseline or result['orders_per_sec']
+        print(
+            f"{workers} workers: {result['orders']} orders in {result['elapsed_s']:.2f}s, "
+            f"{result['orders_per_sec']:.1f} orders/s ({result['orders_per_sec'] / baseline:.2f}x)"
+        )
+
+if __name__ == '__main__':
+    main()
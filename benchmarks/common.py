@@ -0,0 +1,42 @@
+import os
+import statistics
+from pathlib import Path
+from typing import Dict, List, Optional
+import psycopg
+from psycopg.conninfo import make_conninfo
+from dotenv import load_dotenv
+from bot.database.migrate import migrate
+
+ROOT = Path(__file__).resolve().parent.parent
+
+load_dotenv(ROOT / '.env')
+
+def scratch_conninfo(schema: str) -> str:
+    """DATABASE_URL with the search_path pinned to a scratch schema."""
+    url = os.getenv('DATABASE_URL')
+    if not url:
+        raise SystemExit("DATABASE_URL must point at a local Postgres to run this benchmark")
+    return make_conninfo(url, options=f'-c search_path={schema}')
+
+async def create_scratch_schema(schema: str, target: Optional[int] = None) -> None:
+    """(Re)create `schema` and migrate it up to `target` (default: latest)."""
+    with psycopg.connect(os.getenv('DATABASE_URL'), autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        conn.execute(f"CREATE SCHEMA {schema}")
+    await migrate(scratch_conninfo(schema), target)
+
+def drop_scratch_schema(schema: str) -> None:
+    with psycopg.connect(os.getenv('DATABASE_URL'), autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    ordered = sorted(samples)
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        'p50_ms': pct(0.50) if ordered else 0.0,
+        'p99_ms': pct(0.99) if ordered else 0.0
+    }
@@ -0,0 +1,43 @@
+import asyncio
+from decimal import Decimal
+from typing import List, Optional
+from bot.models.models import Cart, Order, Product
+
+class FakeDatabase:
+    """In-memory stand-in for Database with an optional simulated round-trip latency."""
+
+    notifies = False
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.products = [
+            Product(id=1, name='Plastic', price=Decimal('100.00')),
+            Product(id=2, name='Leather', price=Decimal('300.00')),
+            Product(id=3, name='Bracelet', price=Decimal('200.00'))
+        ]
+        self.orders: List[Order] = []
+        self.round_trips = 0
+
+    async def _round_trip(self) -> None:
+        self.round_trips += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def get_products(self) -> List[Product]:
+        await self._round_trip()
+        return list(self.products)
+
+    async def save_order(self, client_name: str, username: Optional[str], location: str,
+                         cart: Cart, key: Optional[str] = None) -> List[int]:
+        await self.save_orders([Order(key or str(len(self.orders)), client_name, username, location, cart)])
+        return []
+
+    async def save_orders(self, orders: List[Order]) -> None:
+        await self._round_trip()
+        self.orders.extend(orders)
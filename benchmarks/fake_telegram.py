@@ -0,0 +1,215 @@
+"""
+A local stand-in for Telegram: a Bot API stub that answers the bot's outbound
+calls, and a generator that posts synthetic order conversations to the bot's
+webhook.
+
+Start the bot against it (the fake users have ids 1..CHATS):
+
+    TELEGRAM_API_URL=http://127.0.0.1:8081 WEBHOOK_URL=http://127.0.0.1:8443 \
+    AUTHORIZED_USERS=$(seq -s, 1 50) python bot.py run --mode webhook
+
+then drive it:
+
+    python -m benchmarks.fake_telegram --webhook http://127.0.0.1:8443/telegram --chats 50 --orders 10
+"""
+import json
+import time
+import argparse
+import threading
+import itertools
+import urllib.request
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+from telegram.request import BaseRequest, RequestData
+
+BOT_USER = {'id': 1000000, 'is_bot': True, 'first_name': 'Order Bot', 'username': 'order_bot'}
+
+def make_user(user_id: int) -> Dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'Operator {user_id}', 'username': f'operator{user_id}'}
+
+def make_chat(chat_id: int) -> Dict:
+    return {'id': chat_id, 'type': 'private', 'first_name': f'Operator {chat_id}'}
+
+def make_message(message_id: int, chat_id: int, user: Dict, text: str) -> Dict:
+    message = {'message_id': message_id, 'date': int(time.time()), 'chat': make_chat(chat_id), 'from': user, 'text': text}
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return message
+
+def message_update(update_id: int, chat_id: int, user_id: int, text: str, message_id: int = 1) -> Dict:
+    return {'update_id': update_id, 'message': make_message(message_id, chat_id, make_user(user_id), text)}
+
+def callback_update(update_id: int, chat_id: int, user_id: int, data: str, message_id: int = 1) -> Dict:
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': f'{chat_id}:{update_id}',
+            'from': make_user(user_id),
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': make_message(message_id, chat_id, BOT_USER, 'menu')
+        }
+    }
+
+# Products of the sample catalog, by id
+PRODUCT_NAMES = {1: 'Plastic', 2: 'Leather', 3: 'Bracelet'}
+
+def order_flow(products: int = 1, bulk: bool = False) -> List[Tuple[str, str, str]]:
+    """One complete order: command, name, location, then per product a button and a
+    quantity, or with `bulk` all products typed in one message, and confirm.
+    Each step is (kind, payload, name of the handler that should process it)."""
+    flow = [
+        ('message', '/new_order', 'command_new_order'),
+        ('message', 'Customer {chat_id}', 'handle_name'),
+        ('callback', 'Omega', 'handle_location')
+    ]
+    product_ids = list(PRODUCT_NAMES)[:products]
+    if bulk:
+        flow.append(('message', ', '.join(f'{PRODUCT_NAMES[product_id]} 2' for product_id in product_ids), 'handle_cart_entry'))
+    else:
+        for product_id in product_ids:
+            flow.append(('callback', f'input_quantity:{product_id}', 'handle_product_selection'))
+            flow.append(('message', '2', 'handle_quantity'))
+    flow.append(('callback', 'confirm_order', 'handle_product_selection'))
+    return flow
+
+ORDER_FLOW = order_flow()
+
+def order_updates(update_ids, chat_id: int, user_id: int, flow: List[Tuple[str, str, str]] = ORDER_FLOW) -> List[Dict]:
+    updates = []
+    for kind, payload, _ in flow:
+        payload = payload.format(chat_id=chat_id)
+        make = message_update if kind == 'message' else callback_update
+        updates.append(make(next(update_ids), chat_id, user_id, payload))
+    return updates
+
+class FakeBotAPI:
+    """Bot API stub that records every call it receives."""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self.sent_texts: Dict[int, List[str]] = defaultdict(list)
+        self._message_ids = itertools.count(1000)
+        self.commands: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def result(self, method: str, params: Dict) -> object:
+        chat_id = int(params.get('chat_id', 0) or 0)
+        with self._lock:
+            self.calls[method] += 1
+            if method in ('sendMessage', 'editMessageText') and 'text' in params:
+                self.sent_texts[chat_id].append(params['text'])
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'getMyCommands':
+            return self.commands
+        if method == 'setMyCommands':
+            commands = params.get('commands', [])
+            self.commands = json.loads(commands) if isinstance(commands, str) else commands
+        if method in ('sendMessage', 'sendDocument', 'editMessageText', 'editMessageReplyMarkup'):
+            message = make_message(next(self._message_ids), chat_id, BOT_USER, params.get('text', ''))
+            if method == 'sendDocument':
+                message['document'] = {'file_id': f'file{message["message_id"]}', 'file_unique_id': f'u{message["message_id"]}'}
+            return message
+        return True
+
+    def serve(self, host: str, port: int) -> ThreadingHTTPServer:
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                method = self.path.rstrip('/').rsplit('/', 1)[-1]
+                content_type = self.headers.get('Content-Type', '')
+                if content_type.startswith('application/json'):
+                    params = json.loads(body or b'{}')
+                elif content_type.startswith('application/x-www-form-urlencoded'):
+                    params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+                else:
+                    # Multipart uploads: only the method matters here
+                    params = {}
+                payload = json.dumps({'ok': True, 'result': api.result(method, params)}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+class StubRequest(BaseRequest):
+    """In-process transport for a Bot/ExtBot that answers from a FakeBotAPI."""
+
+    def __init__(self, api: FakeBotAPI):
+        self.api = api
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None, *args, **kwargs):
+        endpoint = url.rstrip('/').rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        return 200, json.dumps({'ok': True, 'result': self.api.result(endpoint, params)}).encode()
+
+def post_update(url: str, update: Dict, secret: Optional[str]) -> None:
+    request = urllib.request.Request(url, data=json.dumps(update).encode(), method='POST')
+    request.add_header('Content-Type', 'application/json')
+    if secret:
+        request.add_header('X-Telegram-Bot-Api-Secret-Token', secret)
+    urllib.request.urlopen(request).read()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--webhook', required=True, help="the bot's webhook URL")
+    parser.add_argument('--secret', help='WEBHOOK_SECRET of the bot')
+    parser.add_argument('--api-host', default='127.0.0.1')
+    parser.add_argument('--api-port', type=int, default=8081)
+    parser.add_argument('--chats', type=int, default=20, help='simulated operators, one chat each')
+    parser.add_argument('--orders', type=int, default=5, help='orders per operator')
+    parser.add_argument('--settle', type=float, default=5.0, help='seconds to wait for the bot to finish')
+    args = parser.parse_args()
+
+    api = FakeBotAPI()
+    api.serve(args.api_host, args.api_port)
+    input(f"Fake Bot API listening on http://{args.api_host}:{args.api_port}; start the bot, then press Enter ")
+
+    update_ids = itertools.count(1)
+    id_lock = threading.Lock()
+
+    def operator(chat_id: int) -> None:
+        for _ in range(args.orders):
+            with id_lock:
+                updates = order_updates(update_ids, chat_id, chat_id)
+            # Posted back to back: the bot must keep them in order per chat
+            for update in updates:
+                post_update(args.webhook, update, args.secret)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=operator, args=(chat_id,)) for chat_id in range(1, args.chats + 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    posted = time.perf_counter() - started
+    total = args.chats * args.orders * len(ORDER_FLOW)
+    print(f"Posted {total} updates in {posted:.2f}s ({total / posted:.0f} updates/s)")
+
+    time.sleep(args.settle)
+    completed = sum(
+        sum('Order has been saved' in text for text in texts) for texts in api.sent_texts.values()
+    )
+    print(f"Orders confirmed by the bot: {completed}/{args.chats * args.orders}")
+    print(f"Bot API calls: {dict(api.calls)}")
+
+if __name__ == '__main__':
+    main()
@@ -1,40 +1,47 @@
 import os
+import sys
+import asyncio
+import argparse
 import logging
+from datetime import datetime
+from typing import Optional
+# Imported first: its clock measures the whole startup
+from bot.utils.startup import startup
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Bot, BotCommand, Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
-    Application, CommandHandler, CallbackQueryHandler, MessageHandler,
-    filters, ContextTypes, ConversationHandler
+    Application, CommandHandler, CallbackQueryHandler, MessageHandler, InlineQueryHandler,
+    TypeHandler, filters, ContextTypes, ConversationHandler
 )
-
-from bot.handlers.auth_handlers import check_auth
-from bot.handlers.order_handlers import (
-    command_new_order, handle_name, handle_location,
-    handle_product_selection, handle_quantity
-)
-from bot.handlers.stats_handlers import command_stats
 from bot.utils.constants import NAME, LOCATION, PRODUCT_SELECTION, QUANTITY, EMOJIS
-from bot.database.database import db
 
-# Load environment variables
+# The handlers, the database layer and their dependencies are imported where they are
+# first needed, so e.g. `migrate` or the sharded front don't load what they never use,
+# and modules reading settings at import see the .env loaded here
 load_dotenv()
 
 # Enable logging
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Menu commands, registered at startup unless already set
+BOT_COMMANDS = [
+    ('start', 'Start the bot'),
+    ('new_order', 'Add a new order'),
+    ('stats', 'Download statistics'),
+    ('history', "Show a client's orders")
+]
+
+# Only the update types the handlers below react to
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY, Update.INLINE_QUERY]
+
+startup.mark('imports')
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    from bot.handlers.auth_handlers import check_auth
     if not await check_auth(update):
         return ConversationHandler.END
         
-    # Set up menu commands
-    commands = [
-        ('start', 'Start the bot'),
-        ('new_order', 'Add a new order'),
-        ('stats', 'Download statistics')
-    ]
-    await context.bot.set_my_commands(commands)
-        
     keyboard = [
         [InlineKeyboardButton("➕ Add New Order", callback_data='new_order')],
         [InlineKeyboardButton("📊 Download Statistics", callback_data='export_orders')]
@@ -46,9 +53,123 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=reply_markup
     )
 
-def main() -> None:
-    # Create application
-    application = Application.builder().token(os.getenv('BOT_TOKEN')).build()
+async def register_commands(bot: Bot) -> None:
+    # One call to read them saves rewriting them on every start; when sharded, worker-0 does it
+    if os.getenv('SHARD_WORKER', 'worker-0') != 'worker-0':
+        return
+    commands = tuple(BotCommand(command, description) for command, description in BOT_COMMANDS)
+    if await bot.get_my_commands() != commands:
+        await bot.set_my_commands(commands)
+
+async def prepare_schema() -> None:
+    from bot.database.database import db
+    from bot.database.migrate import pending_migrations
+    pending = await pending_migrations(db.DATABASE_URL)
+    if pending:
+        logger.warning(f"{len(pending)} database migrations are pending, run `python bot.py migrate`")
+    else:
+        await db.ensure_order_partitions()
+
+async def post_init(application: Application) -> None:
+    from bot.database.database import db
+    from bot.database.order_queue import order_queue
+    from bot.utils.catalog import catalog
+    from bot.utils.client_index import client_index
+    from bot.utils.order_feed import order_feed
+    from bot.utils.metrics import registry, start_http_server
+    from bot.utils.instrumentation import seed_conversation_states
+    # Application.initialize: getMe, and loading persistence
+    startup.mark('initialize')
+    await seed_conversation_states(application)
+
+    # Prometheus and health endpoints, only served when METRICS_PORT is set; up first so
+    # /ready reports the warm-up below
+    metrics_port = os.getenv('METRICS_PORT')
+    if metrics_port:
+        application.bot_data['metrics_server'] = await start_http_server(
+            os.getenv('METRICS_HOST', '127.0.0.1'), int(metrics_port),
+            {
+                '/metrics': lambda: (200, registry.render()),
+                '/healthz': lambda: (200, "ok\n"),
+                '/ready': startup.readiness
+            }
+        )
+
+    # Everything the first update needs is warmed before updates are fetched: the pool
+    # (already open when persistence is loaded from Postgres), then the rest concurrently,
+    # which also opens a few more pooled connections
+    await startup.timed('database', db.open())
+    await asyncio.gather(
+        startup.timed('schema', prepare_schema()),
+        startup.timed('catalog', catalog.start()),
+        startup.timed('client index', client_index.start()),
+        startup.timed('order journal', order_queue.start(application.bot)),
+        startup.timed('bot commands', register_commands(application.bot))
+    )
+    startup.set_ready()
+
+    # One process announces new orders, the others only queue them
+    if os.getenv('SHARD_WORKER', 'worker-0') == 'worker-0':
+        await order_feed.start(application.bot)
+
+async def post_shutdown(application: Application) -> None:
+    from bot.database.database import db
+    from bot.database.order_queue import order_queue
+    from bot.utils.catalog import catalog
+    from bot.utils.client_index import client_index
+    from bot.utils.order_feed import order_feed
+    startup.ready = False
+    metrics_server = application.bot_data.pop('metrics_server', None)
+    if metrics_server:
+        metrics_server.close()
+        await metrics_server.wait_closed()
+    await order_feed.stop()
+    await order_queue.stop()
+    await client_index.stop()
+    await catalog.stop()
+    await db.close()
+
+def build_application(bot: Optional[Bot] = None) -> Application:
+    from bot.handlers.order_handlers import (
+        command_new_order, handle_name, handle_location, handle_client,
+        handle_product_selection, handle_quantity, handle_cart_entry, inline_search_clients,
+        handle_conversation_timeout
+    )
+    from bot.handlers.stats_handlers import command_stats, command_export, daily_statistics_job
+    from bot.handlers.import_handlers import command_import
+    from bot.handlers.history_handlers import command_history, handle_history_page
+    from bot.handlers.admin_handlers import command_reload_catalog, command_profile
+    from bot.database.persistence import create_persistence
+    from bot.utils.update_processor import PerChatUpdateProcessor
+    from bot.utils.instrumentation import instrument_application, InstrumentedRequest
+    from bot.utils.rate_limiter import create_rate_limiter
+
+    # Create application, optionally around a preconfigured bot (e.g. one with a stub transport)
+    builder = Application.builder()
+    if bot:
+        builder = builder.bot(bot)
+    else:
+        # Outbound Bot API calls are rate limited and timed per endpoint
+        builder = (
+            builder
+            .token(os.getenv('BOT_TOKEN'))
+            .request(InstrumentedRequest(connection_pool_size=256))
+            .rate_limiter(create_rate_limiter())
+        )
+    builder = (
+        builder
+        .concurrent_updates(PerChatUpdateProcessor(int(os.getenv('MAX_CONCURRENT_UPDATES', '16'))))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    persistence = create_persistence()
+    if persistence:
+        builder = builder.persistence(persistence)
+    # Point the bot at another Bot API server, e.g. a local fake for load tests
+    api_url = os.getenv('TELEGRAM_API_URL')
+    if api_url and not bot:
+        builder = builder.base_url(f'{api_url}/bot').base_file_url(f'{api_url}/file/bot')
+    application = builder.build()
 
     # Add conversation handler for order flow
     conv_handler = ConversationHandler(
@@ -58,26 +179,161 @@ def main() -> None:
         ],
         states={
             NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_name)],
-            LOCATION: [CallbackQueryHandler(handle_location, pattern='^[^:]+$')],
-            PRODUCT_SELECTION: [CallbackQueryHandler(handle_product_selection, pattern='^(input_quantity:[0-9]+|confirm_order)$')],
-            QUANTITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_quantity)]
+            LOCATION: [
+                CallbackQueryHandler(handle_location, pattern='^[^:]+$'),
+                CallbackQueryHandler(handle_client, pattern='^client:-?[0-9]+$'),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_cart_entry)
+            ],
+            PRODUCT_SELECTION: [
+                CallbackQueryHandler(handle_product_selection, pattern='^(input_quantity:[0-9]+|confirm_order)$'),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_cart_entry)
+            ],
+            QUANTITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_quantity)],
+            ConversationHandler.TIMEOUT: [TypeHandler(Update, handle_conversation_timeout)]
         },
         fallbacks=[
             CommandHandler('start', start),
             CallbackQueryHandler(command_new_order, pattern='^new_order$')  # Allow new_order at any time
         ],
         allow_reentry=True,  # Allow conversation to be restarted
-        per_chat=True  # Create separate conversation for each chat
+        per_chat=True,  # Create separate conversation for each chat
+        name='order_conversation',
+        persistent=persistence is not None,  # Survive restarts when persistence is configured
+        # Abandoned orders are discarded after this many seconds of inactivity (0 keeps them)
+        conversation_timeout=float(os.getenv('ORDER_CONVERSATION_TIMEOUT', '3600')) or None
     )
 
     # Add handlers
     application.add_handler(CommandHandler('start', start))
     application.add_handler(CommandHandler('stats', command_stats))
+    application.add_handler(CommandHandler('export', command_export))
+    application.add_handler(CommandHandler('history', command_history))
+    application.add_handler(CallbackQueryHandler(
+        handle_history_page, pattern='^history:[0-9]+(:[on]:[0-9]+:[0-9]+)?$'
+    ))
+    application.add_handler(CommandHandler('import', command_import))
+    application.add_handler(MessageHandler(
+        filters.Document.ALL & filters.CaptionRegex(r'^/import(@\w+)?(\s|$)'), command_import
+    ))
+    application.add_handler(CommandHandler('reload_catalog', command_reload_catalog))
+    application.add_handler(CommandHandler('profile', command_profile))
     application.add_handler(CallbackQueryHandler(command_stats, pattern='^export_orders$'))
+    application.add_handler(InlineQueryHandler(inline_search_clients))
     application.add_handler(conv_handler)
+    instrument_application(application)
+
+    # Precompute the statistics report and send the daily summary at DAILY_SUMMARY_TIME (server local time);
+    # when sharded, only the first worker does
+    daily_summary = os.getenv('SHARD_WORKER', 'worker-0') == 'worker-0'
+    if daily_summary and application.job_queue:
+        summary_time = datetime.strptime(os.getenv('DAILY_SUMMARY_TIME', '08:00'), '%H:%M').time()
+        application.job_queue.run_daily(
+            daily_statistics_job,
+            time=summary_time.replace(tzinfo=datetime.now().astimezone().tzinfo),
+            name='daily_statistics'
+        )
+    elif daily_summary:
+        logger.warning("JobQueue is not available, install python-telegram-bot[job-queue] for daily summaries")
+
+    startup.mark('build')
+    return application
+
+async def run_migrations(target: Optional[int]) -> None:
+    from bot.database.migrate import migrate
+    applied = await migrate(os.getenv('DATABASE_URL'), target)
+    logger.info(f"Applied {len(applied)} migrations" if applied else "Database schema is up to date")
+
+async def rebuild_stats() -> None:
+    from bot.database.database import db
+    await db.open()
+    try:
+        rows = await db.rebuild_statistics()
+        logger.info(f"Statistics rollup rebuilt ({rows} rows)")
+    finally:
+        await db.close()
+
+async def check_stats() -> bool:
+    from bot.database.database import db
+    await db.open()
+    try:
+        mismatches = await db.check_statistics()
+    finally:
+        await db.close()
+
+    for day, location, product_id, rollup, actual in mismatches:
+        logger.error(f"Rollup mismatch {day} {location} product {product_id}: rollup={rollup} orders={actual}")
+    if mismatches:
+        logger.error(f"{len(mismatches)} rollup rows are inconsistent, run `python bot.py rebuild-stats`")
+    else:
+        logger.info("Statistics rollup is consistent with orders")
+    return not mismatches
+
+def run_bot(mode: str, workers: int) -> None:
+    path = os.getenv('WEBHOOK_PATH', 'telegram')
+    webhook = dict(
+        listen=os.getenv('WEBHOOK_LISTEN', '0.0.0.0'),
+        port=int(os.getenv('WEBHOOK_PORT', os.getenv('PORT', '8443'))),
+        url_path=path,
+        webhook_url=f"{os.getenv('WEBHOOK_URL', '').rstrip('/')}/{path}",
+        secret_token=os.getenv('WEBHOOK_SECRET')
+    )
+    if mode == 'sharded':
+        # This process only receives the webhook; `bot.py worker` processes run the bot
+        from bot.utils.sharding import run_front
+        api_url = os.getenv('TELEGRAM_API_URL')
+        urls = dict(base_url=f'{api_url}/bot', base_file_url=f'{api_url}/file/bot') if api_url else {}
+        bot = Bot(os.getenv('BOT_TOKEN'), **urls)
+        asyncio.run(run_front(
+            worker_command=[sys.executable, os.path.abspath(__file__), 'worker'],
+            workers=workers,
+            socket_dir=os.getenv('SHARD_SOCKET_DIR', 'shards'),
+            bot=bot,
+            allowed_updates=ALLOWED_UPDATES,
+            **webhook
+        ))
+        return
+
+    application = build_application()
+    if mode == 'webhook':
+        application.run_webhook(allowed_updates=ALLOWED_UPDATES, **webhook)
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Order Management Telegram Bot')
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='run the bot (default)')
+    run_parser.add_argument(
+        '--mode', choices=['polling', 'webhook', 'sharded'], default=os.getenv('BOT_MODE', 'polling'),
+        help='how to receive updates (default: $BOT_MODE or polling); sharded is webhook mode with worker processes'
+    )
+    run_parser.add_argument(
+        '--workers', type=int, default=int(os.getenv('SHARD_WORKERS', os.cpu_count() or 1)),
+        help='worker processes in sharded mode (default: $SHARD_WORKERS or the number of CPUs)'
+    )
+    worker_parser = subparsers.add_parser('worker', help='run one worker of sharded mode (started by the front)')
+    worker_parser.add_argument('--socket', required=True, help='Unix socket to receive updates on')
+    migrate_parser = subparsers.add_parser('migrate', help='apply pending database migrations')
+    migrate_parser.add_argument('--to', type=int, dest='target', help='stop after this migration version')
+    subparsers.add_parser('rebuild-stats', help='recompute the statistics rollup from all orders')
+    subparsers.add_parser('check-stats', help='compare the statistics rollup with the orders table')
+    args = parser.parse_args()
 
-    # Start the bot
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if args.command == 'migrate':
+        asyncio.run(run_migrations(args.target))
+    elif args.command == 'rebuild-stats':
+        asyncio.run(rebuild_stats())
+    elif args.command == 'check-stats':
+        sys.exit(0 if asyncio.run(check_stats()) else 1)
+    elif args.command == 'worker':
+        from bot.utils.sharding import run_worker
+        asyncio.run(run_worker(build_application(), args.socket))
+    else:
+        # Start the bot
+        run_bot(
+            getattr(args, 'mode', os.getenv('BOT_MODE', 'polling')),
+            getattr(args, 'workers', int(os.getenv('SHARD_WORKERS', os.cpu_count() or 1)))
+        )
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
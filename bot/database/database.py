@@ -1,86 +1,461 @@
 import os
-from typing import Dict, List, Optional, Tuple
+import time
+import uuid
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import date
+from itertools import islice
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 import psycopg
-from psycopg import Error
-from ..models.models import Product, CartItem
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from ..models.models import Product, Cart, Order, from_minor_units
+from ..utils.metrics import timed, DB_LATENCY, DB_ERRORS, DB_REPORTING_READS
+from ..utils.constants import order_feed_chat_id
+from .storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# Records the submission key (so a replayed order is written at most once) and
+# bumps the order version in the same transaction, resolves the client, inserts all cart lines and adds them to the daily statistics rollup,
+# and queues the order for the order feed when it is enabled, in a single statement.
+_SAVE_ORDER_TEMPLATE = """
+    WITH submission AS (
+        INSERT INTO order_submissions (key)
+        VALUES (%(key)s::uuid)
+        ON CONFLICT (key) DO NOTHING
+        RETURNING key
+    ), version AS (
+        UPDATE order_version_slots SET value = value + 1
+        WHERE slot = pg_backend_pid() % 16 AND EXISTS (SELECT FROM submission)
+    ), client AS ({client}
+    ), inserted AS (
+        INSERT INTO orders (client_id, product_id, quantity, total_price)
+        SELECT client.id, line.product_id, line.quantity, line.total_price
+        FROM client, unnest(%(product_ids)s::int[], %(quantities)s::int[], %(totals)s::numeric[])
+            AS line(product_id, quantity, total_price)
+        RETURNING id, product_id, quantity, total_price, created_at
+    ), rollup AS (
+        INSERT INTO order_stats_daily AS s (day, location, product_id, quantity, revenue, cost)
+        SELECT i.created_at, client.location, i.product_id,
+               SUM(i.quantity), SUM(i.total_price), SUM(i.quantity * p.orig_price)
+        FROM inserted i
+        CROSS JOIN client
+        JOIN products p ON p.id = i.product_id
+        GROUP BY i.created_at, client.location, i.product_id
+        ON CONFLICT (day, location, product_id) DO UPDATE SET
+            quantity = s.quantity + EXCLUDED.quantity,
+            revenue = s.revenue + EXCLUDED.revenue,
+            cost = s.cost + EXCLUDED.cost
+    ), feed AS (
+        INSERT INTO order_feed (order_id, client_name, location, total)
+        SELECT max(i.id), %(name)s, client.location, sum(i.total_price)
+        FROM inserted i
+        CROSS JOIN client
+        WHERE %(feed)s
+        GROUP BY client.location
+    )
+    SELECT id FROM inserted
+"""
+
+# Upserts the client by name and location (the no-op update makes RETURNING yield existing rows too)
+SAVE_ORDER_SQL = _SAVE_ORDER_TEMPLATE.format(client="""
+        INSERT INTO clients (name, username, location)
+        SELECT %(name)s, %(username)s, %(location)s FROM submission
+        ON CONFLICT (name, location) DO UPDATE SET name = EXCLUDED.name
+        RETURNING id, location""")
+
+# For a client whose id is already known no clients row is looked up or touched
+SAVE_ORDER_FOR_CLIENT_SQL = _SAVE_ORDER_TEMPLATE.format(client="""
+        SELECT %(client_id)s::int AS id, %(location)s::varchar AS location FROM submission""")
+
+# Bulk import: rows are COPYed into this staging table, then clients and orders
+# (with their rollup) are inserted from it with one statement each
+IMPORT_COLUMNS = ('line', 'name', 'username', 'location', 'product_id', 'quantity', 'total_price', 'created_at')
+# Rows parsed per worker-thread hop while they are fed to COPY
+IMPORT_CHUNK_ROWS = 5000
+
+CREATE_IMPORT_TABLE_SQL = """
+    CREATE TEMP TABLE order_import (
+        line INTEGER NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        username VARCHAR(100),
+        location VARCHAR(50) NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        total_price DECIMAL(10, 2) NOT NULL,
+        created_at DATE NOT NULL
+    ) ON COMMIT DROP
+"""
+
+IMPORT_CLIENTS_SQL = """
+    INSERT INTO clients (name, username, location)
+    SELECT DISTINCT ON (name, location) name, username, location
+    FROM order_import
+    ORDER BY name, location, line
+    ON CONFLICT (name, location) DO NOTHING
+"""
+
+IMPORT_ORDERS_SQL = """
+    WITH inserted AS (
+        INSERT INTO orders (client_id, product_id, quantity, total_price, created_at)
+        SELECT c.id, i.product_id, i.quantity, i.total_price, i.created_at
+        FROM order_import i
+        JOIN clients c ON c.name = i.name AND c.location = i.location
+        ORDER BY i.line
+        RETURNING client_id, product_id, quantity, total_price, created_at
+    ), rollup AS (
+        INSERT INTO order_stats_daily AS s (day, location, product_id, quantity, revenue, cost)
+        SELECT i.created_at, c.location, i.product_id,
+               SUM(i.quantity), SUM(i.total_price), SUM(i.quantity * p.orig_price)
+        FROM inserted i
+        JOIN clients c ON c.id = i.client_id
+        JOIN products p ON p.id = i.product_id
+        GROUP BY i.created_at, c.location, i.product_id
+        ON CONFLICT (day, location, product_id) DO UPDATE SET
+            quantity = s.quantity + EXCLUDED.quantity,
+            revenue = s.revenue + EXCLUDED.revenue,
+            cost = s.cost + EXCLUDED.cost
+    ), version AS (
+        UPDATE order_version_slots SET value = value + 1 WHERE slot = pg_backend_pid() % 16
+    )
+    SELECT count(*) FROM inserted
+"""
+
+# The order version is the sum of per-backend counters (migration 0004), bumped
+# by every transaction that writes orders or the rollup
+BUMP_VERSION_SQL = "UPDATE order_version_slots SET value = value + 1 WHERE slot = pg_backend_pid() % 16"
+ORDER_VERSION_SQL = "SELECT sum(value)::bigint FROM order_version_slots"
+
+# Daily rollup recomputed from the orders table, used to rebuild and check it
+STATS_FROM_ORDERS_SQL = """
+    SELECT o.created_at, c.location, o.product_id,
+           SUM(o.quantity), SUM(o.total_price), SUM(o.quantity * p.orig_price)
+    FROM orders o
+    JOIN clients c ON o.client_id = c.id
+    JOIN products p ON o.product_id = p.id
+    GROUP BY o.created_at, c.location, o.product_id
+"""
+
+# Checked on the replica before each reporting query: its replay lag in seconds, and
+# whether it has replayed the given primary WAL position. A server that is not in
+# recovery (a stand-in primary) counts as current.
+REPLICA_STATUS_SQL = """
+    SELECT
+        CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+             ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END,
+        %(lsn)s::pg_lsn IS NULL OR NOT pg_is_in_recovery() OR pg_last_wal_replay_lsn() >= %(lsn)s::pg_lsn
+"""
+
+def _save_order_sql(order: Order) -> str:
+    return SAVE_ORDER_SQL if order.client_id is None else SAVE_ORDER_FOR_CLIENT_SQL
+
+def _order_params(order: Order) -> Dict:
+    product_ids, quantities, totals = [], [], []
+    for product_id, item in order.cart.items():
+        product_ids.append(int(product_id))
+        quantities.append(item.quantity)
+        totals.append(from_minor_units(item.subtotal))
+    return {
+        'key': order.key,
+        'client_id': order.client_id,
+        'name': order.client_name,
+        'username': order.username,
+        'location': order.location,
+        'product_ids': product_ids,
+        'quantities': quantities,
+        'totals': totals,
+        'feed': order_feed_chat_id() is not None
+    }
 
 class Database:
+    """Storage in Postgres (see storage.Storage).
+
+    With DATABASE_READ_URL set, the reporting queries (statistics, exports, daily
+    summaries) run on that replica through a pool of their own, so they don't
+    compete with order writes. Writes and everything that must see them stay on
+    the primary.
+    """
+
+    notifies = True
+    on_feed = None
+
     def __init__(self):
-        self.DATABASE_URL = os.getenv('DATABASE_URL')
-        if not self.DATABASE_URL:
-            raise ValueError("DATABASE_URL environment variable is not set")
-
-    def get_connection(self) -> psycopg.Connection:
-        return psycopg.connect(
-            self.DATABASE_URL,
-            connect_timeout=30,
-            application_name='chip_order_bot'
+        # The pool is built by open(), from the application lifecycle, so importing
+        # this module neither needs DATABASE_URL nor touches the network
+        self.DATABASE_URL: Optional[str] = None
+        self.DATABASE_READ_URL: Optional[str] = None
+        self.pool: Optional[AsyncConnectionPool] = None
+        self.read_pool: Optional[AsyncConnectionPool] = None
+        # Replication lag up to which the replica still answers reporting queries
+        self.read_max_lag = float(os.getenv('DB_READ_MAX_LAG', '30'))
+        # How long the replica is skipped after it failed or lagged behind
+        self.read_retry_interval = float(os.getenv('DB_READ_RETRY_INTERVAL', '30'))
+        self._replica_skipped_until = 0.0
+
+    def _create_pool(self, url: str, name: str, prefix: str) -> AsyncConnectionPool:
+        # Connections run in autocommit mode: single statements are atomic on their
+        # own and multi-statement work opens an explicit transaction.
+        return AsyncConnectionPool(
+            url,
+            min_size=int(os.getenv(f'{prefix}_MIN_SIZE', '1')),
+            max_size=int(os.getenv(f'{prefix}_MAX_SIZE', '10')),
+            max_idle=float(os.getenv(f'{prefix}_MAX_IDLE', '300')),
+            timeout=float(os.getenv(f'{prefix}_TIMEOUT', '30')),
+            kwargs={'connect_timeout': 30, 'application_name': name, 'autocommit': True},
+            check=AsyncConnectionPool.check_connection,
+            name=name,
+            open=False
         )
 
-    def get_products(self) -> List[Product]:
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id, name, price FROM products ORDER BY name")
-                return [Product(id=id, name=name, price=price) for id, name, price in cur.fetchall()]
-
-    def save_order(self, client_name: str, username: Optional[str], location: str, cart: Dict[str, CartItem]) -> None:
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                # First try to find existing client
-                cur.execute(
-                    "SELECT id FROM clients WHERE name = %s AND location = %s",
-                    (client_name, location)
+    async def open(self) -> None:
+        """Open the pool, waiting until its first DB_POOL_MIN_SIZE connections are established.
+
+        The replica pool connects in the background: an unreachable replica only
+        sends reporting queries to the primary, it doesn't hold up the start.
+        """
+        if self.pool is None:
+            self.DATABASE_URL = os.getenv('DATABASE_URL')
+            if not self.DATABASE_URL:
+                raise ValueError("DATABASE_URL environment variable is not set")
+            self.pool = self._create_pool(self.DATABASE_URL, 'chip_order_bot', 'DB_POOL')
+            self.DATABASE_READ_URL = os.getenv('DATABASE_READ_URL') or None
+            if self.DATABASE_READ_URL:
+                self.read_pool = self._create_pool(self.DATABASE_READ_URL, 'chip_order_bot_read', 'DB_READ_POOL')
+        if self.pool.closed:
+            await self.pool.open(wait=True)
+        if self.read_pool is not None and self.read_pool.closed:
+            await self.read_pool.open(wait=False)
+
+    async def close(self) -> None:
+        if self.read_pool is not None:
+            await self.read_pool.close()
+        if self.pool is not None:
+            await self.pool.close()
+
+    def _skip_replica(self, reason: str) -> None:
+        if time.monotonic() >= self._replica_skipped_until:
+            logger.warning(f"Read replica {reason}; reporting queries go to the primary "
+                           f"for the next {self.read_retry_interval:g}s")
+        self._replica_skipped_until = time.monotonic() + self.read_retry_interval
+
+    async def _replica_connection(self, after_lsn: Optional[str]) -> Optional[psycopg.AsyncConnection]:
+        """A replica connection if the replica is reachable, within read_max_lag and past `after_lsn`."""
+        if self.read_pool is None or time.monotonic() < self._replica_skipped_until:
+            return None
+        try:
+            conn = await self.read_pool.getconn(timeout=float(os.getenv('DB_READ_CONNECT_TIMEOUT', '2')))
+        except (PoolTimeout, psycopg.OperationalError) as e:
+            self._skip_replica(f"unavailable ({e})")
+            return None
+        usable = False
+        try:
+            cur = await conn.execute(REPLICA_STATUS_SQL, {'lsn': after_lsn})
+            lag, replayed = await cur.fetchone()
+            if lag > self.read_max_lag:
+                self._skip_replica(f"lags {lag:.1f}s behind")
+            # Unless replayed, only this read needs newer data than the replica has so far
+            usable = lag <= self.read_max_lag and replayed
+        except psycopg.OperationalError as e:
+            self._skip_replica(f"unavailable ({e})")
+        finally:
+            # Any other error propagates, but the connection still goes back to the pool
+            if not usable:
+                await self.read_pool.putconn(conn)
+        return conn if usable else None
+
+    @asynccontextmanager
+    async def reporting_connection(self, after_lsn: Optional[str] = None) -> AsyncIterator[psycopg.AsyncConnection]:
+        """Borrow a connection for a reporting query: from the replica when it is
+        usable (see _replica_connection), from the primary otherwise."""
+        conn = await self._replica_connection(after_lsn)
+        if conn is None:
+            if self.read_pool is not None:
+                DB_REPORTING_READS.inc('primary')
+            async with self.pool.connection() as conn:
+                yield conn
+            return
+        DB_REPORTING_READS.inc('replica')
+        try:
+            yield conn
+        except psycopg.OperationalError as e:
+            self._skip_replica(f"failed ({e})")
+            raise
+        finally:
+            await self.read_pool.putconn(conn)
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def health_check(self) -> bool:
+        try:
+            async with self.pool.connection() as conn:
+                await conn.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def ensure_order_partitions(self, months_ahead: int = 3) -> None:
+        """Create monthly orders partitions up to `months_ahead` months from now.
+
+        A failure is logged rather than raised: until the partitions exist new
+        orders go to orders_default, which is no reason not to start.
+        """
+        try:
+            async with self.get_connection() as conn:
+                await conn.execute(
+                    "SELECT create_orders_partitions(CURRENT_DATE, (CURRENT_DATE + make_interval(months => %s))::date)",
+                    (months_ahead,)
                 )
-                result = cur.fetchone()
-                
-                if result:
-                    # Use existing client
-                    client_id = result[0]
-                else:
-                    # Create new client
-                    cur.execute(
-                        "INSERT INTO clients (name, username, location) VALUES (%s, %s, %s) RETURNING id",
-                        (client_name, username, location)
-                    )
-                    client_id = cur.fetchone()[0]
-                
-                # Save each order
-                for product_id, item in cart.items():
-                    cur.execute(
-                        "INSERT INTO orders (client_id, product_id, quantity, total_price) VALUES (%s, %s, %s, %s)",
-                        (client_id, int(product_id), item.quantity, item.quantity * item.price)
-                    )
-                conn.commit()
-
-    def get_statistics(self) -> Tuple[List[Tuple], float, float, float, float, List[Tuple]]:
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                # Get product statistics
-                cur.execute("""
-                    SELECT 
+        except psycopg.Error as e:
+            logger.error(f"Could not create orders partitions: {e}")
+
+    def get_connection(self):
+        """Borrow a connection from the pool (use with `async with`)."""
+        return self.pool.connection()
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def get_products(self) -> List[Product]:
+        async with self.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT id, name, price FROM products ORDER BY name")
+                return [Product(id=id, name=name, price=price) for id, name, price in await cur.fetchall()]
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def get_clients(self, after_id: int = 0, recent: bool = False) -> List[Tuple[int, str, Optional[str], str]]:
+        """Clients with an id above `after_id`, and with `recent` also those created since yesterday."""
+        async with self.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT id, name, username, location FROM clients "
+                    "WHERE id > %s OR (%s AND created_at >= CURRENT_DATE - 1) ORDER BY id",
+                    (after_id, recent)
+                )
+                return await cur.fetchall()
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def save_order(self, client_name: str, username: Optional[str], location: str,
+                         cart: Cart, key: Optional[str] = None,
+                         client_id: Optional[int] = None) -> List[int]:
+        order = Order(key or str(uuid.uuid4()), client_name, username, location, cart, client_id)
+        async with self.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(_save_order_sql(order), _order_params(order))
+                return sorted(order_id for order_id, in await cur.fetchall())
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def save_orders(self, orders: List[Order]) -> None:
+        """Write a batch of orders in one pipelined transaction."""
+        async with self.get_connection() as conn:
+            async with conn.transaction():
+                async with conn.cursor() as cur:
+                    for sql in (SAVE_ORDER_SQL, SAVE_ORDER_FOR_CLIENT_SQL):
+                        params = [_order_params(order) for order in orders if _save_order_sql(order) is sql]
+                        if params:
+                            await cur.executemany(sql, params)
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def get_order_version(self) -> Tuple[int, Optional[str]]:
+        """Current order version, which changes whenever orders or the rollup change,
+        and the primary WAL position it was read at.
+
+        Read on the primary, so it covers every committed write; passing the WAL
+        position to get_statistics keeps it off a replica that is behind it.
+        """
+        async with self.get_connection() as conn:
+            cur = await conn.execute(f"SELECT ({ORDER_VERSION_SQL}), pg_current_wal_lsn()::text")
+            return await cur.fetchone()
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def get_client_orders(self, client_id: int, cursor: Optional[Tuple[date, int]] = None,
+                                newer: bool = False, limit: int = 10) -> List[Tuple]:
+        """Up to `limit` of a client's order lines, newest first, as (id, created_at, product_name, quantity, total_price).
+
+        Pages are keyed by (created_at, id): the lines right after `cursor`, or with
+        `newer` the ones right before it, read from the (client_id, created_at, id)
+        index so that deep pages cost the same as the first one.
+        """
+        conditions, params = ["o.client_id = %(client_id)s"], {'client_id': client_id, 'limit': limit}
+        if cursor is not None:
+            conditions.append(f"(o.created_at, o.id) {'>' if newer else '<'} (%(day)s, %(id)s)")
+            params['day'], params['id'] = cursor
+        direction = "ASC" if newer else "DESC"
+        # On the primary: an order that was just written should show up
+        async with self.get_connection() as conn:
+            cur = await conn.execute(f"""
+                SELECT o.id, o.created_at, p.name, o.quantity, o.total_price
+                FROM orders o
+                JOIN products p ON p.id = o.product_id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY o.created_at {direction}, o.id {direction}
+                LIMIT %(limit)s
+            """, params)
+            rows = await cur.fetchall()
+            return rows[::-1] if newer else rows
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def get_order_feed(self) -> List[Tuple]:
+        """Orders not yet announced by the order feed, as (feed id, order_id, client_name, location, total)."""
+        async with self.get_connection() as conn:
+            cur = await conn.execute("SELECT id, order_id, client_name, location, total FROM order_feed ORDER BY id")
+            return await cur.fetchall()
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def ack_order_feed(self, feed_ids: List[int]) -> None:
+        """Drop order feed entries whose digest has been sent."""
+        async with self.get_connection() as conn:
+            await conn.execute("DELETE FROM order_feed WHERE id = ANY(%s)", (feed_ids,))
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def get_daily_summary(self, day: date) -> List[Tuple]:
+        """Quantity, revenue and profit per location for one day."""
+        async with self.reporting_connection() as conn:
+            cur = await conn.execute("""
+                SELECT location, SUM(quantity), SUM(revenue), SUM(revenue) - SUM(cost)
+                FROM order_stats_daily
+                WHERE day = %s
+                GROUP BY location
+                ORDER BY location
+            """, (day,))
+            return await cur.fetchall()
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def get_statistics(self, after_lsn: Optional[str] = None) -> Tuple[int, List[Tuple], float, float, float, float, List[Tuple]]:
+        """Statistics at least as recent as the primary WAL position `after_lsn` (see
+        get_order_version), preceded by the order version of their snapshot."""
+        async with self.reporting_connection(after_lsn) as conn, conn.transaction():
+            async with conn.cursor() as cur:
+                # One snapshot for the version and both queries
+                await cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                await cur.execute(ORDER_VERSION_SQL)
+                version, = await cur.fetchone()
+
+                # Get product statistics from the daily rollup
+                await cur.execute("""
+                    SELECT
                         p.name as product_name,
-                        SUM(o.quantity) as total_quantity,
-                        SUM(o.total_price) as total_revenue,
-                        p.orig_price * SUM(o.quantity) as total_cost,
-                        SUM(o.total_price) - (p.orig_price * SUM(o.quantity)) as profit
-                    FROM orders o
-                    JOIN products p ON o.product_id = p.id
-                    GROUP BY p.name, p.orig_price
+                        SUM(s.quantity) as total_quantity,
+                        SUM(s.revenue) as total_revenue,
+                        SUM(s.cost) as total_cost,
+                        SUM(s.revenue) - SUM(s.cost) as profit
+                    FROM order_stats_daily s
+                    JOIN products p ON s.product_id = p.id
+                    GROUP BY p.name
                     ORDER BY profit DESC
                 """)
-                rows = cur.fetchall()
-                
+                rows = await cur.fetchall()
+
                 if not rows:
-                    return [], 0, 0, 0, 0, []
-                
+                    return version, [], 0, 0, 0, 0, []
+
                 total_quantity = sum(row[1] for row in rows)
                 total_revenue = sum(row[2] for row in rows)
                 total_cost = sum(row[3] for row in rows)
                 total_profit = sum(row[4] for row in rows)
-                
+
                 # Get recent client orders
-                cur.execute("""
-                    SELECT 
+                await cur.execute("""
+                    SELECT
                         c.name as client_name,
                         c.location,
                         p.name as product_name,
@@ -93,9 +468,115 @@ class Database:
                     ORDER BY o.created_at DESC, o.id DESC
                     LIMIT 5
                 """)
-                recent_orders = cur.fetchall()
-                
-                return rows, total_quantity, total_revenue, total_cost, total_profit, recent_orders
+                recent_orders = await cur.fetchall()
+
+                return version, rows, total_quantity, total_revenue, total_cost, total_profit, recent_orders
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def iter_orders(self, start: Optional[date] = None, end: Optional[date] = None,
+                          location: Optional[str] = None, batch_size: int = 2000) -> AsyncIterator[Tuple]:
+        """Stream order lines oldest first through a server-side cursor."""
+        conditions, params = [], {}
+        if start:
+            conditions.append("o.created_at >= %(start)s")
+            params['start'] = start
+        if end:
+            conditions.append("o.created_at <= %(end)s")
+            params['end'] = end
+        if location:
+            conditions.append("c.location = %(location)s")
+            params['location'] = location
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        async with self.reporting_connection() as conn:
+            # Named cursors only live inside a transaction
+            async with conn.transaction():
+                async with conn.cursor(name='orders_export') as cur:
+                    cur.itersize = batch_size
+                    await cur.execute(f"""
+                        SELECT
+                            o.id,
+                            o.created_at,
+                            c.name as client_name,
+                            c.username,
+                            c.location,
+                            p.name as product_name,
+                            o.quantity,
+                            o.total_price
+                        FROM orders o
+                        JOIN clients c ON o.client_id = c.id
+                        JOIN products p ON o.product_id = p.id
+                        {where}
+                        ORDER BY o.created_at, o.id
+                    """, params)
+                    async for row in cur:
+                        yield row
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def import_orders(self, rows: Iterable[Tuple]) -> Tuple[int, int]:
+        """Import validated rows (see IMPORT_COLUMNS) in one transaction.
+
+        Returns the number of orders and of new clients created.
+        """
+        async with self.get_connection() as conn:
+            async with conn.transaction():
+                async with conn.cursor() as cur:
+                    await cur.execute(CREATE_IMPORT_TABLE_SQL)
+                    async with cur.copy(f"COPY order_import ({', '.join(IMPORT_COLUMNS)}) FROM STDIN") as copy:
+                        # Rows may be parsed lazily, so they are pulled in chunks off the event loop
+                        rows = iter(rows)
+                        while chunk := await asyncio.to_thread(list, islice(rows, IMPORT_CHUNK_ROWS)):
+                            for row in chunk:
+                                await copy.write_row(row)
+                    await cur.execute(IMPORT_CLIENTS_SQL)
+                    clients = cur.rowcount
+                    await cur.execute(IMPORT_ORDERS_SQL)
+                    orders, = await cur.fetchone()
+                    return orders, clients
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def rebuild_statistics(self) -> int:
+        """Recompute the daily statistics rollup from the orders table."""
+        async with self.get_connection() as conn:
+            async with conn.transaction():
+                # Blocks concurrent save_order rollup updates until the rebuild commits
+                await conn.execute("LOCK TABLE order_stats_daily IN EXCLUSIVE MODE")
+                await conn.execute("DELETE FROM order_stats_daily")
+                await conn.execute(BUMP_VERSION_SQL)
+                cur = await conn.execute(
+                    "INSERT INTO order_stats_daily (day, location, product_id, quantity, revenue, cost) "
+                    + STATS_FROM_ORDERS_SQL
+                )
+                return cur.rowcount
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def check_statistics(self) -> List[Tuple]:
+        """Rollup rows that disagree with the orders table, as (day, location, product_id, rollup, actual)."""
+        async with self.get_connection() as conn:
+            cur = await conn.execute(f"""
+                WITH actual (day, location, product_id, quantity, revenue, cost) AS (
+                    {STATS_FROM_ORDERS_SQL}
+                )
+                SELECT
+                    COALESCE(s.day, a.day),
+                    COALESCE(s.location, a.location),
+                    COALESCE(s.product_id, a.product_id),
+                    (s.quantity, s.revenue, s.cost),
+                    (a.quantity, a.revenue, a.cost)
+                FROM order_stats_daily s
+                FULL JOIN actual a USING (day, location, product_id)
+                WHERE (s.quantity, s.revenue, s.cost) IS DISTINCT FROM (a.quantity, a.revenue, a.cost)
+                ORDER BY 1, 2, 3
+            """)
+            return await cur.fetchall()
+
+def create_database() -> Storage:
+    """Storage backend for DATABASE_URL: `sqlite:///path` is an embedded SQLite file, anything else Postgres."""
+    url = os.getenv('DATABASE_URL', '')
+    if url.startswith('sqlite:///'):
+        from .sqlite import SQLiteDatabase
+        return SQLiteDatabase(url[len('sqlite:///'):])
+    return Database()
 
 # Initialize database instance
-db = Database() 
\ No newline at end of file
+db = create_database()
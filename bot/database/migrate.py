@@ -0,0 +1,82 @@
+import re
+import logging
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+import psycopg
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / 'migrations'
+
+# Arbitrary key for the advisory lock held while migrating
+MIGRATION_LOCK_ID = 7_010_420
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: Path
+
+def load_migrations() -> List[Migration]:
+    """Migrations on disk, named like `0002_partition_orders.sql`, in version order."""
+    migrations = []
+    for path in MIGRATIONS_DIR.glob('*.sql'):
+        match = re.match(r'^(\d+)_(\w+)\.sql$', path.name)
+        if not match:
+            raise ValueError(f"Invalid migration file name: {path.name}")
+        migrations.append(Migration(int(match.group(1)), match.group(2), path))
+    migrations.sort()
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError("Duplicate migration versions")
+    return migrations
+
+async def _ensure_version_table(conn: psycopg.AsyncConnection) -> None:
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+
+async def applied_versions(conn: psycopg.AsyncConnection) -> List[int]:
+    await _ensure_version_table(conn)
+    cur = await conn.execute("SELECT version FROM schema_version ORDER BY version")
+    return [version for version, in await cur.fetchall()]
+
+async def pending_migrations(conninfo: str) -> List[Migration]:
+    if conninfo.startswith('sqlite:'):
+        # The SQLite backend applies its schema (sqlite_schema.sql) whenever it is opened
+        return []
+    async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as conn:
+        applied = set(await applied_versions(conn))
+    return [migration for migration in load_migrations() if migration.version not in applied]
+
+async def migrate(conninfo: str, target: Optional[int] = None) -> List[Migration]:
+    """Apply pending migrations up to `target` (default: all), each in its own transaction."""
+    if conninfo.startswith('sqlite:'):
+        from .sqlite import SQLiteDatabase
+        database = SQLiteDatabase(conninfo[len('sqlite:///'):])
+        await database.open()
+        await database.close()
+        return []
+    async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as conn:
+        # Serialize concurrent runs, e.g. several instances starting at once
+        await conn.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            applied = set(await applied_versions(conn))
+            done = []
+            for migration in load_migrations():
+                if migration.version in applied or (target is not None and migration.version > target):
+                    continue
+                logger.info(f"Applying migration {migration.version:04d} {migration.name}")
+                async with conn.transaction():
+                    await conn.execute(migration.path.read_text())
+                    await conn.execute(
+                        "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                        (migration.version, migration.name)
+                    )
+                done.append(migration)
+            return done
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
@@ -0,0 +1,82 @@
+-- Baseline schema (formerly init_db.sql). Written to be a no-op on databases
+-- that were created from init_db.sql before migrations existed.
+
+-- Create clients table
+CREATE TABLE IF NOT EXISTS clients (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    username VARCHAR(100) DEFAULT NULL,
+    location VARCHAR(50) NOT NULL,
+    created_at DATE DEFAULT CURRENT_DATE,
+    UNIQUE(name, location)
+);
+
+-- Create products table
+CREATE TABLE IF NOT EXISTS products (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    type VARCHAR(50) CHECK (type IN ('plastic', 'leather', 'bracelet')) NOT NULL,
+    price DECIMAL(10, 2) NOT NULL,
+    orig_price DECIMAL(10, 2) NOT NULL
+);
+
+-- Notify the bot's catalog cache whenever products change
+CREATE OR REPLACE FUNCTION notify_products_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('products_changed', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS products_changed ON products;
+CREATE TRIGGER products_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON products
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_products_changed();
+
+-- Create orders table
+CREATE TABLE IF NOT EXISTS orders (
+    id SERIAL PRIMARY KEY,
+    client_id INTEGER REFERENCES clients(id),
+    product_id INTEGER REFERENCES products(id),
+    quantity INTEGER NOT NULL,
+    total_price DECIMAL(10, 2) NOT NULL,
+    created_at DATE DEFAULT CURRENT_DATE
+);
+
+-- Daily statistics rollup, maintained by the bot in the same statement that saves an order
+CREATE TABLE IF NOT EXISTS order_stats_daily (
+    day DATE NOT NULL,
+    location VARCHAR(50) NOT NULL,
+    product_id INTEGER REFERENCES products(id),
+    quantity BIGINT NOT NULL,
+    revenue DECIMAL(14, 2) NOT NULL,
+    cost DECIMAL(14, 2) NOT NULL,
+    PRIMARY KEY (day, location, product_id)
+);
+
+-- Fill the rollup from the orders a database already has when it is upgraded,
+-- so statistics are complete without running rebuild-stats first
+INSERT INTO order_stats_daily (day, location, product_id, quantity, revenue, cost)
+SELECT o.created_at, c.location, o.product_id,
+       SUM(o.quantity), SUM(o.total_price), SUM(o.quantity * p.orig_price)
+FROM orders o
+JOIN clients c ON o.client_id = c.id
+JOIN products p ON o.product_id = p.id
+WHERE o.created_at IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM order_stats_daily)
+GROUP BY o.created_at, c.location, o.product_id;
+
+-- Keys of orders already written, so replaying the bot's order journal is idempotent
+CREATE TABLE IF NOT EXISTS order_submissions (
+    key UUID PRIMARY KEY,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+
+-- Insert sample products
+INSERT INTO products (name, type, price, orig_price)
+SELECT * FROM (VALUES
+    ('Plastic', 'plastic', 100.00, 10.00),
+    ('Leather', 'leather', 300.00, 150.00),
+    ('Bracelet', 'bracelet', 200.00, 100.00)
+) AS sample (name, type, price, orig_price)
+WHERE NOT EXISTS (SELECT 1 FROM products);
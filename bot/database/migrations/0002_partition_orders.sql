@@ -0,0 +1,70 @@
+-- Range-partition orders by month. The bot keeps partitions ahead of the current
+-- month by calling create_orders_partitions() at startup; anything outside the
+-- existing partitions lands in orders_default.
+
+-- Creates one partition per month from the month of from_date to the month of to_date.
+-- A month that already has rows in orders_default (CREATE ... PARTITION OF would
+-- fail on them) is created as a plain table, its rows are moved out of the
+-- default partition, and then it is attached; attaching adds the indexes and
+-- foreign keys of orders.
+CREATE OR REPLACE FUNCTION create_orders_partitions(from_date DATE, to_date DATE) RETURNS void AS $$
+DECLARE
+    month DATE := date_trunc('month', from_date)::date;
+    partition TEXT;
+BEGIN
+    WHILE month <= to_date LOOP
+        partition := 'orders_' || to_char(month, 'YYYY_MM');
+        IF to_regclass(quote_ident(partition)) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE orders INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM orders_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                month, (month + interval '1 month')::date, partition
+            );
+            EXECUTE format(
+                'ALTER TABLE orders ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                partition, month, (month + interval '1 month')::date
+            );
+        END IF;
+        month := (month + interval '1 month')::date;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Keep the id sequence when the old table goes away
+ALTER TABLE orders RENAME TO orders_unpartitioned;
+ALTER INDEX orders_pkey RENAME TO orders_unpartitioned_pkey;
+ALTER SEQUENCE orders_id_seq OWNED BY NONE;
+
+CREATE TABLE orders (
+    id INTEGER NOT NULL DEFAULT nextval('orders_id_seq'),
+    client_id INTEGER REFERENCES clients(id),
+    product_id INTEGER REFERENCES products(id),
+    quantity INTEGER NOT NULL,
+    total_price DECIMAL(10, 2) NOT NULL,
+    created_at DATE NOT NULL DEFAULT CURRENT_DATE,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE orders_id_seq OWNED BY orders.id;
+
+CREATE TABLE orders_default PARTITION OF orders DEFAULT;
+
+SELECT create_orders_partitions(
+    COALESCE((SELECT min(created_at) FROM orders_unpartitioned), CURRENT_DATE),
+    (CURRENT_DATE + interval '12 months')::date
+);
+
+-- Orders never had a NULL date in practice; should one exist it goes to the default partition
+INSERT INTO orders (id, client_id, product_id, quantity, total_price, created_at)
+SELECT id, client_id, product_id, quantity, total_price, COALESCE(created_at, DATE '1970-01-01')
+FROM orders_unpartitioned;
+
+DROP TABLE orders_unpartitioned;
+
+-- Indexes are created after the copy and cascade to every partition. Recent
+-- orders are read newest first (get_statistics, exports); the foreign keys are
+-- used by the joins in reporting queries.
+CREATE INDEX orders_created_at_id_idx ON orders (created_at DESC, id DESC);
+CREATE INDEX orders_client_id_idx ON orders (client_id);
+CREATE INDEX orders_product_id_idx ON orders (product_id);
@@ -0,0 +1,15 @@
+-- Conversation state and user_data of the bot, written by DatabasePersistence
+
+CREATE TABLE IF NOT EXISTS bot_user_data (
+    user_id BIGINT PRIMARY KEY,
+    data JSONB NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS bot_conversations (
+    name VARCHAR(100) NOT NULL,
+    key TEXT NOT NULL,
+    state INTEGER NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (name, key)
+);
@@ -0,0 +1,13 @@
+-- Version of the order data, which cached statistics reports are keyed by. It is
+-- the sum of these counters. Every transaction that writes orders or the rollup
+-- bumps one of them, so the version is read in the same snapshot as the
+-- statistics and changes only when the rows do (a sequence's nextval() would
+-- be visible before the write commits). A writer bumps the slot of its
+-- backend, so concurrent writers rarely wait on the same row.
+CREATE TABLE IF NOT EXISTS order_version_slots (
+    slot SMALLINT PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO order_version_slots (slot)
+SELECT g FROM generate_series(0, 15) g
+ON CONFLICT (slot) DO NOTHING;
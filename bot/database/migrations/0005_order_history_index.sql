@@ -0,0 +1,4 @@
+-- A client's orders newest first (/history), paged by keyset on (created_at, id).
+-- The index also serves the client_id joins, so it replaces the single-column one.
+CREATE INDEX IF NOT EXISTS orders_client_created_at_id_idx ON orders (client_id, created_at DESC, id DESC);
+DROP INDEX IF EXISTS orders_client_id_idx;
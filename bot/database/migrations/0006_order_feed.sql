@@ -0,0 +1,26 @@
+-- Orders still to be announced in the order feed chat (bot/utils/order_feed.py).
+-- save_order adds a row per submission while the feed is enabled and the feed
+-- deletes rows once their digest has been sent, so after a restart the table
+-- holds exactly what is left to send.
+CREATE TABLE IF NOT EXISTS order_feed (
+    id BIGSERIAL PRIMARY KEY,
+    -- Last order line of the submission
+    order_id INTEGER NOT NULL,
+    client_name VARCHAR(100) NOT NULL,
+    location VARCHAR(50) NOT NULL,
+    total DECIMAL(10, 2) NOT NULL
+);
+
+-- Notify the order feed of every new row; the row is the payload, so the feed
+-- needs no query per order
+CREATE OR REPLACE FUNCTION notify_order_feed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('order_feed', json_build_array(NEW.id, NEW.order_id, NEW.client_name, NEW.location, NEW.total)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS order_feed_notify ON order_feed;
+CREATE TRIGGER order_feed_notify
+    AFTER INSERT ON order_feed
+    FOR EACH ROW EXECUTE FUNCTION notify_order_feed();
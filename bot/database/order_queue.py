@@ -0,0 +1,211 @@
+import os
+import json
+import uuid
+import asyncio
+import logging
+import sqlite3
+from typing import Dict, List, Optional
+import psycopg
+from telegram import Bot
+from ..models.models import Cart, Order, format_money
+from ..utils.constants import EMOJIS, admin_users
+from .database import db
+from .storage import Storage
+
+logger = logging.getLogger(__name__)
+
+def _encode_order(order: Order) -> str:
+    return json.dumps({
+        'op': 'order',
+        'key': order.key,
+        'client_name': order.client_name,
+        'username': order.username,
+        'location': order.location,
+        'client_id': order.client_id,
+        'chat_id': order.chat_id,
+        'cart': order.cart.encode()
+    }, ensure_ascii=False)
+
+def _decode_order(record: Dict) -> Order:
+    return Order(
+        key=record['key'],
+        client_name=record['client_name'],
+        username=record['username'],
+        location=record['location'],
+        cart=Cart.decode(record['cart']),
+        client_id=record.get('client_id'),
+        chat_id=record.get('chat_id')
+    )
+
+class OrderQueue:
+    """Write-behind queue for confirmed orders.
+
+    Orders are appended to a local journal (fsync'd) before they are acknowledged,
+    then written to the database in batches by a background task. Orders that were
+    journaled but never written are replayed on the next start. An order the
+    database refuses is set aside in `<journal>.rejected`, and its operator and
+    the admins are told.
+    """
+
+    def __init__(self, database: Storage, journal_path: str, batch_size: int, max_retry_delay: float):
+        self.db = database
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.max_retry_delay = max_retry_delay
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._unwritten: Dict[str, Order] = {}
+        self._journal = None
+        self._journal_lock = asyncio.Lock()
+        self._worker: Optional[asyncio.Task] = None
+        self.bot: Optional[Bot] = None
+
+    def _replay(self) -> List[Order]:
+        pending: Dict[str, Order] = {}
+        if not os.path.exists(self.journal_path):
+            return []
+        with open(self.journal_path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn write at the end of the file, the order was never acknowledged
+                    logger.warning("Skipping unreadable order journal entry")
+                    continue
+                if record['op'] == 'order':
+                    pending[record['key']] = _decode_order(record)
+                elif record['op'] == 'done':
+                    for key in record['keys']:
+                        pending.pop(key, None)
+        return list(pending.values())
+
+    def _append(self, lines: List[str], compact: bool = False) -> None:
+        if compact:
+            self._journal.truncate(0)
+        self._journal.write(''.join(line + '\n' for line in lines))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    async def _write_journal(self, lines: List[str], compact: bool = False) -> None:
+        async with self._journal_lock:
+            await asyncio.to_thread(self._append, lines, compact)
+
+    async def _write_done(self, keys: List[str]) -> None:
+        async with self._journal_lock:
+            # Once everything is written the journal can start over. Checked under the
+            # lock so an order journaled concurrently is never truncated away.
+            await asyncio.to_thread(
+                self._append, [json.dumps({'op': 'done', 'keys': keys})], not self._unwritten
+            )
+
+    async def start(self, bot: Optional[Bot] = None) -> None:
+        self.bot = bot
+        pending = await asyncio.to_thread(self._replay)
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        if pending:
+            logger.info(f"Replaying {len(pending)} unwritten orders from {self.journal_path}")
+        # Rewrite the journal with only the orders still outstanding (this also drops
+        # a torn entry left by a crash mid-write)
+        await self._write_journal([_encode_order(order) for order in pending], compact=True)
+        for order in pending:
+            self._unwritten[order.key] = order
+            self._queue.put_nowait(order)
+        self._worker = asyncio.create_task(self._drain())
+
+    async def submit(self, client_name: str, username: Optional[str], location: str, cart: Cart,
+                     client_id: Optional[int] = None, chat_id: Optional[int] = None) -> str:
+        """Durably record an order and schedule it for writing. Returns the order key."""
+        order = Order(str(uuid.uuid4()), client_name, username, location, cart.copy(), client_id, chat_id)
+        self._unwritten[order.key] = order
+        try:
+            await self._write_journal([_encode_order(order)])
+        except Exception:
+            del self._unwritten[order.key]
+            raise
+        self._queue.put_nowait(order)
+        return order.key
+
+    async def _save(self, batch: List[Order]) -> None:
+        """Write a batch, retrying with exponential backoff while the database is unavailable."""
+        attempt = 0
+        while True:
+            try:
+                await self.db.save_orders(batch)
+                return
+            except (psycopg.errors.IntegrityError, psycopg.errors.DataError, sqlite3.IntegrityError) as e:
+                if len(batch) > 1:
+                    # Isolate the offending order so the rest of the batch still goes through
+                    for order in batch:
+                        await self._save([order])
+                    return
+                # Retrying will not help, keep the order out of the way for manual recovery
+                logger.error(f"Rejected order {batch[0].key}, moved to {self.journal_path}.rejected: {e}")
+                await asyncio.to_thread(self._reject, batch[0])
+                await self._notify_rejected(batch[0], e)
+                return
+            except Exception as e:
+                delay = min(self.max_retry_delay, 2 ** attempt)
+                attempt += 1
+                logger.error(f"Failed to write {len(batch)} orders (attempt {attempt}), retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+
+    def _reject(self, order: Order) -> None:
+        with open(f'{self.journal_path}.rejected', 'a', encoding='utf-8') as rejected:
+            rejected.write(_encode_order(order) + '\n')
+            rejected.flush()
+            os.fsync(rejected.fileno())
+
+    async def _notify_rejected(self, order: Order, error: Exception) -> None:
+        """Tell the operator who confirmed the order, and the admins, that it was not saved."""
+        if self.bot is None:
+            return
+        text = (
+            f"{EMOJIS['ERROR']} The order for {order.client_name} ({order.location}, "
+            f"₴{format_money(order.cart.total)}) could not be saved and was set aside in "
+            f"{self.journal_path}.rejected: {error}"
+        )
+        for chat_id in dict.fromkeys([order.chat_id, *sorted(admin_users()[0])]):
+            if chat_id is None:
+                continue
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text)
+            except Exception as e:
+                logger.warning(f"Could not report rejected order {order.key} to {chat_id}: {e}")
+
+    async def _drain(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            await self._save(batch)
+
+            for order in batch:
+                self._unwritten.pop(order.key, None)
+            await self._write_done([order.key for order in batch])
+            for order in batch:
+                self._queue.task_done()
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Give the worker a chance to flush the queue, then stop it."""
+        if self._worker:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"{len(self._unwritten)} orders left in the journal for the next start")
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+
+# Initialize order queue instance
+order_queue = OrderQueue(
+    db,
+    journal_path=os.getenv('ORDER_JOURNAL_PATH', 'orders.journal'),
+    batch_size=int(os.getenv('ORDER_BATCH_SIZE', '50')),
+    max_retry_delay=float(os.getenv('ORDER_RETRY_MAX_DELAY', '60'))
+)
@@ -0,0 +1,268 @@
+import os
+import json
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from telegram.ext import BasePersistence, PersistenceInput
+from ..models.models import Cart
+from .database import Database, db
+from .sqlite import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+ConversationKey = Tuple[str, str]
+
+def encode_user_data(data: Dict) -> str:
+    """Serialize user_data to JSON, storing the cart in its compact form (see Cart.encode)."""
+    data = dict(data)
+    if 'cart' in data:
+        data['cart'] = data['cart'].encode()
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str)
+
+def decode_user_data(raw: str) -> Dict:
+    data = json.loads(raw)
+    if 'cart' in data:
+        data['cart'] = Cart.decode(data['cart'])
+    return data
+
+class PostgresStore:
+    """Persistence tables in the bot's Postgres database (see migration 0003)."""
+
+    def __init__(self, database: Database):
+        self.db = database
+
+    async def open(self) -> None:
+        # PTB loads persistence before post_init, so the pool may not be open yet
+        await self.db.open()
+
+    async def close(self) -> None:
+        pass
+
+    async def load_user(self, user_id: int) -> Optional[str]:
+        async with self.db.get_connection() as conn:
+            cur = await conn.execute("SELECT data::text FROM bot_user_data WHERE user_id = %s", (user_id,))
+            row = await cur.fetchone()
+            return row[0] if row else None
+
+    async def load_conversations(self, name: str) -> List[Tuple[str, int]]:
+        async with self.db.get_connection() as conn:
+            cur = await conn.execute("SELECT key, state FROM bot_conversations WHERE name = %s", (name,))
+            return await cur.fetchall()
+
+    async def write(self, users: Dict[int, Optional[str]], conversations: Dict[ConversationKey, Optional[int]]) -> None:
+        upsert_users = {user_id: data for user_id, data in users.items() if data is not None}
+        drop_users = [user_id for user_id, data in users.items() if data is None]
+        upsert_states = {key: state for key, state in conversations.items() if state is not None}
+        drop_states = [key for key, state in conversations.items() if state is None]
+
+        async with self.db.get_connection() as conn:
+            async with conn.transaction():
+                if upsert_users:
+                    await conn.execute("""
+                        INSERT INTO bot_user_data (user_id, data)
+                        SELECT * FROM unnest(%s::bigint[], %s::jsonb[])
+                        ON CONFLICT (user_id) DO UPDATE SET data = EXCLUDED.data, updated_at = now()
+                    """, (list(upsert_users), list(upsert_users.values())))
+                if drop_users:
+                    await conn.execute("DELETE FROM bot_user_data WHERE user_id = ANY(%s)", (drop_users,))
+                if upsert_states:
+                    await conn.execute("""
+                        INSERT INTO bot_conversations (name, key, state)
+                        SELECT * FROM unnest(%s::varchar[], %s::text[], %s::int[])
+                        ON CONFLICT (name, key) DO UPDATE SET state = EXCLUDED.state, updated_at = now()
+                    """, (
+                        [name for name, _ in upsert_states],
+                        [key for _, key in upsert_states],
+                        list(upsert_states.values())
+                    ))
+                if drop_states:
+                    await conn.execute(
+                        "DELETE FROM bot_conversations WHERE (name, key) IN (SELECT * FROM unnest(%s::varchar[], %s::text[]))",
+                        ([name for name, _ in drop_states], [key for _, key in drop_states])
+                    )
+
+class SQLiteStore:
+    """Persistence tables in a local SQLite file, accessed from a worker thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _run(self, fn, *args):
+        with self._lock:
+            return fn(self._conn, *args)
+
+    async def open(self) -> None:
+        if self._conn is not None:
+            return
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        await asyncio.to_thread(self._run, lambda conn: conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS bot_user_data (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS bot_conversations (
+                name TEXT NOT NULL, key TEXT NOT NULL, state INTEGER NOT NULL, PRIMARY KEY (name, key)
+            );
+        """))
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await asyncio.to_thread(self._run, lambda conn: conn.close())
+            self._conn = None
+
+    async def load_user(self, user_id: int) -> Optional[str]:
+        row = await asyncio.to_thread(self._run, lambda conn: conn.execute(
+            "SELECT data FROM bot_user_data WHERE user_id = ?", (user_id,)
+        ).fetchone())
+        return row[0] if row else None
+
+    async def load_conversations(self, name: str) -> List[Tuple[str, int]]:
+        return await asyncio.to_thread(self._run, lambda conn: conn.execute(
+            "SELECT key, state FROM bot_conversations WHERE name = ?", (name,)
+        ).fetchall())
+
+    async def write(self, users: Dict[int, Optional[str]], conversations: Dict[ConversationKey, Optional[int]]) -> None:
+        def write(conn: sqlite3.Connection) -> None:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO bot_user_data (user_id, data) VALUES (?, ?) "
+                    "ON CONFLICT (user_id) DO UPDATE SET data = excluded.data",
+                    [(user_id, data) for user_id, data in users.items() if data is not None]
+                )
+                conn.executemany(
+                    "DELETE FROM bot_user_data WHERE user_id = ?",
+                    [(user_id,) for user_id, data in users.items() if data is None]
+                )
+                conn.executemany(
+                    "INSERT INTO bot_conversations (name, key, state) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name, key) DO UPDATE SET state = excluded.state",
+                    [(name, key, state) for (name, key), state in conversations.items() if state is not None]
+                )
+                conn.executemany(
+                    "DELETE FROM bot_conversations WHERE name = ? AND key = ?",
+                    [(name, key) for (name, key), state in conversations.items() if state is None]
+                )
+        await asyncio.to_thread(self._run, write)
+
+class DatabasePersistence(BasePersistence):
+    """Persists user_data and conversation states in Postgres or SQLite.
+
+    PTB hands over only the users and conversations touched since its last run;
+    those are buffered and written in one batched transaction. A user's data is
+    loaded lazily the first time one of their updates is processed.
+    """
+
+    def __init__(self, store, update_interval: float):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.store = store
+        self._loaded_users: Set[int] = set()
+        self._dirty_users: Dict[int, Optional[str]] = {}
+        self._dirty_conversations: Dict[ConversationKey, Optional[int]] = {}
+        self._writer: Optional[asyncio.Task] = None
+
+    def _schedule_write(self) -> None:
+        # PTB calls the update_* methods for one run concurrently; the writer task
+        # starts after all of them and writes the whole run as one batch.
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write())
+
+    async def _write(self) -> None:
+        while self._dirty_users or self._dirty_conversations:
+            users, self._dirty_users = self._dirty_users, {}
+            conversations, self._dirty_conversations = self._dirty_conversations, {}
+            try:
+                await self.store.write(users, conversations)
+            except Exception as e:
+                logger.error(f"Failed to write persistence ({len(users)} users, {len(conversations)} conversations): {e}")
+                # Keep the data for the next run unless something newer has arrived
+                for user_id, data in users.items():
+                    self._dirty_users.setdefault(user_id, data)
+                for key, state in conversations.items():
+                    self._dirty_conversations.setdefault(key, state)
+                return
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        # Users are loaded lazily in refresh_user_data
+        await self.store.open()
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        await self.store.open()
+        return {
+            tuple(json.loads(key)): state
+            for key, state in await self.store.load_conversations(name)
+        }
+
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]) -> None:
+        self._dirty_conversations[(name, json.dumps(list(key)))] = new_state
+        self._schedule_write()
+
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        self._dirty_users[user_id] = encode_user_data(data) if data else None
+        self._schedule_write()
+
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: object) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._dirty_users[user_id] = None
+        self._loaded_users.discard(user_id)
+        self._schedule_write()
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        if user_id in self._loaded_users:
+            return
+        raw = await self.store.load_user(user_id)
+        if raw is not None:
+            user_data.update(decode_user_data(raw))
+        self._loaded_users.add(user_id)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict) -> None:
+        pass
+
+    async def sync(self) -> None:
+        """Wait until everything handed over by PTB so far is written."""
+        if self._writer is not None:
+            await self._writer
+        await self._write()
+
+    async def flush(self) -> None:
+        await self.sync()
+        await self.store.close()
+
+def create_persistence() -> Optional[DatabasePersistence]:
+    """Create the persistence selected by PERSISTENCE_URL."""
+    # Unset: the bot's database, `sqlite:///path`: a local file, `none`: disabled
+    url = os.getenv('PERSISTENCE_URL', '') or (db.DATABASE_URL if isinstance(db, SQLiteDatabase) else '')
+    interval = float(os.getenv('PERSISTENCE_INTERVAL', '5'))
+    if url == 'none':
+        return None
+    if url.startswith('sqlite:///'):
+        return DatabasePersistence(SQLiteStore(url[len('sqlite:///'):]), interval)
+    return DatabasePersistence(PostgresStore(db), interval)
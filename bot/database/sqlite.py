@@ -0,0 +1,376 @@
+import uuid
+import asyncio
+import sqlite3
+import threading
+from datetime import date
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+from ..models.models import Product, Cart, Order, to_minor_units, from_minor_units
+from ..utils.metrics import timed, DB_LATENCY, DB_ERRORS
+from ..utils.constants import order_feed_chat_id
+
+T = TypeVar('T')
+
+SCHEMA_PATH = Path(__file__).parent / 'sqlite_schema.sql'
+
+# Statements are constant strings, so each is compiled once and then reused from
+# the connection's statement cache
+INSERT_SUBMISSION_SQL = "INSERT OR IGNORE INTO order_submissions (key) VALUES (?)"
+BUMP_VERSION_SQL = "UPDATE order_version SET value = value + 1"
+INSERT_CLIENT_SQL = "INSERT OR IGNORE INTO clients (name, username, location) VALUES (?, ?, ?)"
+SELECT_CLIENT_SQL = "SELECT id FROM clients WHERE name = ? AND location = ?"
+INSERT_ORDER_SQL = (
+    "INSERT INTO orders (client_id, product_id, quantity, total_price, created_at) VALUES (?, ?, ?, ?, ?)"
+)
+INSERT_FEED_SQL = "INSERT INTO order_feed (order_id, client_name, location, total) VALUES (?, ?, ?, ?)"
+UPSERT_ROLLUP_SQL = """
+    INSERT INTO order_stats_daily (day, location, product_id, quantity, revenue, cost)
+    SELECT ?, ?, id, ?, ?, ? * orig_price FROM products WHERE id = ?
+    ON CONFLICT (day, location, product_id) DO UPDATE SET
+        quantity = quantity + excluded.quantity,
+        revenue = revenue + excluded.revenue,
+        cost = cost + excluded.cost
+"""
+STATS_FROM_ORDERS_SQL = """
+    SELECT o.created_at, c.location, o.product_id,
+           SUM(o.quantity), SUM(o.total_price), SUM(o.quantity * p.orig_price)
+    FROM orders o
+    JOIN clients c ON o.client_id = c.id
+    JOIN products p ON o.product_id = p.id
+    GROUP BY o.created_at, c.location, o.product_id
+"""
+
+def _money(kopecks: Optional[int]):
+    return from_minor_units(kopecks) if kopecks is not None else None
+
+class SQLiteDatabase:
+    """Storage in an embedded SQLite file (`DATABASE_URL=sqlite:///path`), for
+    single-location deployments and running without any services.
+
+    One connection in WAL mode is used from worker threads. Writes run in
+    IMMEDIATE transactions, so a batch of orders is a single commit.
+    """
+
+    notifies = False
+
+    def __init__(self, path: str):
+        self.path = path
+        self.DATABASE_URL: Optional[str] = f'sqlite:///{path}'
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # There is no NOTIFY: called once orders queued for the order feed are committed
+        self.on_feed: Optional[Callable[[], None]] = None
+
+    def _run(self, fn: Callable[..., T], *args) -> T:
+        with self._lock:
+            return fn(self._conn, *args)
+
+    async def _read(self, fn: Callable[..., T], *args) -> T:
+        return await asyncio.to_thread(self._run, fn, *args)
+
+    async def _write(self, fn: Callable[..., T], *args) -> T:
+        def transaction(conn: sqlite3.Connection) -> T:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn, *args)
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            return result
+        return await asyncio.to_thread(self._run, transaction)
+
+    async def open(self) -> None:
+        if self._conn is not None:
+            return
+        # Autocommit mode: transactions are opened explicitly by _write
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        await self._read(lambda conn: conn.executescript(
+            "PRAGMA journal_mode = WAL; PRAGMA foreign_keys = ON;" + SCHEMA_PATH.read_text()
+        ))
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._read(lambda conn: conn.close())
+            self._conn = None
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def health_check(self) -> bool:
+        try:
+            await self._read(lambda conn: conn.execute("SELECT 1").fetchone())
+            return True
+        except Exception:
+            return False
+
+    async def ensure_order_partitions(self, months_ahead: int = 3) -> None:
+        """Orders are not partitioned in SQLite."""
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def get_products(self) -> List[Product]:
+        rows = await self._read(lambda conn: conn.execute("SELECT id, name, price FROM products ORDER BY name").fetchall())
+        return [Product(id=id, name=name, price=from_minor_units(price)) for id, name, price in rows]
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def get_clients(self, after_id: int = 0, recent: bool = False) -> List[Tuple[int, str, Optional[str], str]]:
+        return await self._read(lambda conn: conn.execute(
+            "SELECT id, name, username, location FROM clients "
+            "WHERE id > ? OR (? AND created_at >= date('now', '-1 day')) ORDER BY id",
+            (after_id, recent)
+        ).fetchall())
+
+    @staticmethod
+    def _save_order(conn: sqlite3.Connection, order: Order, day: str) -> List[int]:
+        # Already written by an earlier attempt (e.g. a replayed journal entry)
+        if not conn.execute(INSERT_SUBMISSION_SQL, (order.key,)).rowcount:
+            return []
+        conn.execute(BUMP_VERSION_SQL)
+        client_id = order.client_id
+        if client_id is None:
+            conn.execute(INSERT_CLIENT_SQL, (order.client_name, order.username, order.location))
+            client_id, = conn.execute(SELECT_CLIENT_SQL, (order.client_name, order.location)).fetchone()
+        order_ids = []
+        for product_id, item in order.cart.items():
+            order_ids.append(conn.execute(
+                INSERT_ORDER_SQL, (client_id, int(product_id), item.quantity, item.subtotal, day)
+            ).lastrowid)
+        conn.executemany(UPSERT_ROLLUP_SQL, [
+            (day, order.location, item.quantity, item.subtotal, item.quantity, int(product_id))
+            for product_id, item in order.cart.items()
+        ])
+        if order_ids and order_feed_chat_id() is not None:
+            conn.execute(INSERT_FEED_SQL, (max(order_ids), order.client_name, order.location, order.cart.total))
+        return order_ids
+
+    def _notify_feed(self) -> None:
+        if self.on_feed is not None and order_feed_chat_id() is not None:
+            self.on_feed()
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def save_order(self, client_name: str, username: Optional[str], location: str,
+                         cart: Cart, key: Optional[str] = None,
+                         client_id: Optional[int] = None) -> List[int]:
+        order = Order(key or str(uuid.uuid4()), client_name, username, location, cart, client_id)
+        order_ids = await self._write(self._save_order, order, date.today().isoformat())
+        self._notify_feed()
+        return sorted(order_ids)
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def save_orders(self, orders: List[Order]) -> None:
+        """Write a batch of orders in one transaction."""
+        def save(conn: sqlite3.Connection) -> None:
+            day = date.today().isoformat()
+            for order in orders:
+                self._save_order(conn, order, day)
+        await self._write(save)
+        self._notify_feed()
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def get_order_version(self) -> Tuple[int, Optional[str]]:
+        """Current order version; it changes whenever orders or the rollup change. There is no WAL position."""
+        row = await self._read(lambda conn: conn.execute("SELECT value FROM order_version").fetchone())
+        return row[0], None
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def get_client_orders(self, client_id: int, cursor: Optional[Tuple[date, int]] = None,
+                                newer: bool = False, limit: int = 10) -> List[Tuple]:
+        """Up to `limit` of a client's order lines, newest first, after (or with `newer` before) `cursor`."""
+        conditions, params = ["o.client_id = :client_id"], {'client_id': client_id, 'limit': limit}
+        if cursor is not None:
+            conditions.append(f"(o.created_at, o.id) {'>' if newer else '<'} (:day, :id)")
+            params['day'], params['id'] = cursor[0].isoformat(), cursor[1]
+        direction = "ASC" if newer else "DESC"
+        rows = await self._read(lambda conn: conn.execute(f"""
+            SELECT o.id, o.created_at, p.name, o.quantity, o.total_price
+            FROM orders o
+            JOIN products p ON p.id = o.product_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY o.created_at {direction}, o.id {direction}
+            LIMIT :limit
+        """, params).fetchall())
+        rows = [
+            (id, date.fromisoformat(created_at), product_name, quantity, _money(total_price))
+            for id, created_at, product_name, quantity, total_price in rows
+        ]
+        return rows[::-1] if newer else rows
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def get_order_feed(self) -> List[Tuple]:
+        """Orders not yet announced by the order feed, as (feed id, order_id, client_name, location, total)."""
+        rows = await self._read(lambda conn: conn.execute(
+            "SELECT id, order_id, client_name, location, total FROM order_feed ORDER BY id"
+        ).fetchall())
+        return [(id, order_id, client_name, location, _money(total)) for id, order_id, client_name, location, total in rows]
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def ack_order_feed(self, feed_ids: List[int]) -> None:
+        """Drop order feed entries whose digest has been sent."""
+        await self._write(lambda conn: conn.executemany(
+            "DELETE FROM order_feed WHERE id = ?", [(feed_id,) for feed_id in feed_ids]
+        ))
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def get_daily_summary(self, day: date) -> List[Tuple]:
+        """Quantity, revenue and profit per location for one day."""
+        rows = await self._read(lambda conn: conn.execute("""
+            SELECT location, SUM(quantity), SUM(revenue), SUM(revenue) - SUM(cost)
+            FROM order_stats_daily
+            WHERE day = ?
+            GROUP BY location
+            ORDER BY location
+        """, (day.isoformat(),)).fetchall())
+        return [(location, quantity, _money(revenue), _money(profit)) for location, quantity, revenue, profit in rows]
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def get_statistics(self, after_lsn: Optional[str] = None) -> Tuple[int, List[Tuple], float, float, float, float, List[Tuple]]:
+        # Writes take the same lock, so the version and both queries see the same data
+        def query(conn: sqlite3.Connection) -> Tuple[int, List[Tuple], List[Tuple]]:
+            version, = conn.execute("SELECT value FROM order_version").fetchone()
+            rows = conn.execute("""
+                SELECT
+                    p.name as product_name,
+                    SUM(s.quantity) as total_quantity,
+                    SUM(s.revenue) as total_revenue,
+                    SUM(s.cost) as total_cost,
+                    SUM(s.revenue) - SUM(s.cost) as profit
+                FROM order_stats_daily s
+                JOIN products p ON s.product_id = p.id
+                GROUP BY p.name
+                ORDER BY profit DESC
+            """).fetchall()
+            recent_orders = conn.execute("""
+                SELECT c.name, c.location, p.name, o.quantity, o.total_price, o.created_at
+                FROM orders o
+                JOIN clients c ON o.client_id = c.id
+                JOIN products p ON o.product_id = p.id
+                ORDER BY o.created_at DESC, o.id DESC
+                LIMIT 5
+            """).fetchall() if rows else []
+            return version, rows, recent_orders
+
+        version, rows, recent_orders = await self._read(query)
+        if not rows:
+            return version, [], 0, 0, 0, 0, []
+        rows = [
+            (name, quantity, _money(revenue), _money(cost), _money(profit))
+            for name, quantity, revenue, cost, profit in rows
+        ]
+        recent_orders = [
+            (client_name, location, product_name, quantity, _money(total_price), date.fromisoformat(created_at))
+            for client_name, location, product_name, quantity, total_price, created_at in recent_orders
+        ]
+        return (
+            version,
+            rows,
+            sum(row[1] for row in rows),
+            sum(row[2] for row in rows),
+            sum(row[3] for row in rows),
+            sum(row[4] for row in rows),
+            recent_orders
+        )
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def iter_orders(self, start: Optional[date] = None, end: Optional[date] = None,
+                          location: Optional[str] = None, batch_size: int = 2000) -> AsyncIterator[Tuple]:
+        """Stream order lines oldest first, a batch per query, continuing after the last (day, id) seen."""
+        conditions, params = [], {}
+        if start:
+            conditions.append("o.created_at >= :start")
+            params['start'] = start.isoformat()
+        if end:
+            conditions.append("o.created_at <= :end")
+            params['end'] = end.isoformat()
+        if location:
+            conditions.append("c.location = :location")
+            params['location'] = location
+        conditions.append("(o.created_at, o.id) > (:after_day, :after_id)")
+        sql = f"""
+            SELECT o.id, o.created_at, c.name, c.username, c.location, p.name, o.quantity, o.total_price
+            FROM orders o
+            JOIN clients c ON o.client_id = c.id
+            JOIN products p ON o.product_id = p.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY o.created_at, o.id
+            LIMIT {int(batch_size)}
+        """
+        after_day, after_id = '', 0
+        while True:
+            batch = await self._read(lambda conn: conn.execute(
+                sql, {**params, 'after_day': after_day, 'after_id': after_id}
+            ).fetchall())
+            for id, created_at, client_name, username, location, product_name, quantity, total_price in batch:
+                yield (
+                    id, date.fromisoformat(created_at), client_name, username, location,
+                    product_name, quantity, _money(total_price)
+                )
+            if len(batch) < batch_size:
+                return
+            after_id, after_day = batch[-1][0], batch[-1][1]
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def import_orders(self, rows: Iterable[Tuple]) -> Tuple[int, int]:
+        """Import validated rows (see IMPORT_COLUMNS) in one transaction.
+
+        Returns the number of orders and of new clients created.
+        """
+        def load(conn: sqlite3.Connection) -> Tuple[int, int]:
+            client_ids: Dict[Tuple[str, str], int] = {}
+            rollup: Dict[Tuple[str, str, int], List[int]] = {}
+            orders = clients = 0
+            for _, name, username, location, product_id, quantity, total_price, created_at in rows:
+                client_id = client_ids.get((name, location))
+                if client_id is None:
+                    clients += conn.execute(INSERT_CLIENT_SQL, (name, username, location)).rowcount
+                    client_id = client_ids[name, location] = conn.execute(SELECT_CLIENT_SQL, (name, location)).fetchone()[0]
+                total = to_minor_units(total_price)
+                day = created_at.isoformat()
+                conn.execute(INSERT_ORDER_SQL, (client_id, product_id, quantity, total, day))
+                sums = rollup.setdefault((day, location, product_id), [0, 0])
+                sums[0] += quantity
+                sums[1] += total
+                orders += 1
+            conn.executemany(UPSERT_ROLLUP_SQL, [
+                (day, location, quantity, revenue, quantity, product_id)
+                for (day, location, product_id), (quantity, revenue) in rollup.items()
+            ])
+            conn.execute(BUMP_VERSION_SQL)
+            return orders, clients
+        return await self._write(load)
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def rebuild_statistics(self) -> int:
+        """Recompute the daily statistics rollup from the orders table."""
+        def rebuild(conn: sqlite3.Connection) -> int:
+            conn.execute("DELETE FROM order_stats_daily")
+            conn.execute(BUMP_VERSION_SQL)
+            return conn.execute(
+                "INSERT INTO order_stats_daily (day, location, product_id, quantity, revenue, cost) "
+                + STATS_FROM_ORDERS_SQL
+            ).rowcount
+        return await self._write(rebuild)
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    async def check_statistics(self) -> List[Tuple]:
+        """Rollup rows that disagree with the orders table, as (day, location, product_id, rollup, actual)."""
+        def query(conn: sqlite3.Connection) -> Tuple[List[Tuple], List[Tuple]]:
+            return (
+                conn.execute("SELECT day, location, product_id, quantity, revenue, cost FROM order_stats_daily").fetchall(),
+                conn.execute(STATS_FROM_ORDERS_SQL).fetchall()
+            )
+
+        def by_key(rows: List[Tuple]) -> Dict[Tuple, Tuple]:
+            return {
+                (day, location, product_id): (quantity, _money(revenue), _money(cost))
+                for day, location, product_id, quantity, revenue, cost in rows
+            }
+
+        stored, computed = await self._read(query)
+        rollup, actual = by_key(stored), by_key(computed)
+        mismatches = []
+        for day, location, product_id in sorted(rollup.keys() | actual.keys()):
+            key = (day, location, product_id)
+            if rollup.get(key) != actual.get(key):
+                missing = (None, None, None)
+                mismatches.append((
+                    date.fromisoformat(day), location, product_id, rollup.get(key, missing), actual.get(key, missing)
+                ))
+        return mismatches
@@ -0,0 +1,74 @@
+-- Schema of the embedded SQLite backend, the equivalent of the Postgres migrations.
+-- Applied on every open, so every statement is idempotent. Amounts are integer
+-- kopecks and days are ISO dates ('YYYY-MM-DD').
+
+CREATE TABLE IF NOT EXISTS clients (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    username TEXT DEFAULT NULL,
+    location TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_DATE,
+    UNIQUE (name, location)
+);
+
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL CHECK (type IN ('plastic', 'leather', 'bracelet')),
+    price INTEGER NOT NULL,
+    orig_price INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY,
+    client_id INTEGER REFERENCES clients(id),
+    product_id INTEGER REFERENCES products(id),
+    quantity INTEGER NOT NULL,
+    total_price INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS orders_created_at_id_idx ON orders (created_at DESC, id DESC);
+-- Serves /history pages as well as the client_id joins (0006_order_history_index.sql)
+DROP INDEX IF EXISTS orders_client_id_idx;
+CREATE INDEX IF NOT EXISTS orders_client_created_at_id_idx ON orders (client_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS orders_product_id_idx ON orders (product_id);
+
+CREATE TABLE IF NOT EXISTS order_stats_daily (
+    day TEXT NOT NULL,
+    location TEXT NOT NULL,
+    product_id INTEGER REFERENCES products(id),
+    quantity INTEGER NOT NULL,
+    revenue INTEGER NOT NULL,
+    cost INTEGER NOT NULL,
+    PRIMARY KEY (day, location, product_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS order_submissions (
+    key TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+
+-- Orders still to be announced by the order feed (0007_order_feed.sql)
+CREATE TABLE IF NOT EXISTS order_feed (
+    id INTEGER PRIMARY KEY,
+    order_id INTEGER NOT NULL,
+    client_name TEXT NOT NULL,
+    location TEXT NOT NULL,
+    total INTEGER NOT NULL
+);
+
+-- Single-row order version counter (order_version_slots in Postgres)
+CREATE TABLE IF NOT EXISTS order_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO order_version (id, value) VALUES (1, 1);
+
+INSERT INTO products (name, type, price, orig_price)
+SELECT * FROM (VALUES
+    ('Plastic', 'plastic', 10000, 1000),
+    ('Leather', 'leather', 30000, 15000),
+    ('Bracelet', 'bracelet', 20000, 10000)
+)
+WHERE NOT EXISTS (SELECT 1 FROM products);
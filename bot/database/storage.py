@@ -0,0 +1,56 @@
+from datetime import date
+from typing import AsyncIterator, Callable, Iterable, List, Optional, Protocol, Tuple
+from ..models.models import Cart, Order, Product
+
+class Storage(Protocol):
+    """What the bot needs from its database; implemented by Database (Postgres) and
+    SQLiteDatabase (an embedded file), selected by the scheme of DATABASE_URL.
+
+    Amounts are returned as Decimal hryvnias and days as dates by every backend.
+    """
+
+    DATABASE_URL: Optional[str]
+    # Whether product changes and order feed entries are pushed (LISTEN/NOTIFY); otherwise
+    # the catalog relies on its TTL and the order feed on on_feed
+    notifies: bool
+    on_feed: Optional[Callable[[], None]]
+
+    async def open(self) -> None: ...
+
+    async def close(self) -> None: ...
+
+    async def health_check(self) -> bool: ...
+
+    async def ensure_order_partitions(self, months_ahead: int = 3) -> None: ...
+
+    async def get_products(self) -> List[Product]: ...
+
+    async def get_clients(self, after_id: int = 0, recent: bool = False) -> List[Tuple[int, str, Optional[str], str]]: ...
+
+    async def save_order(self, client_name: str, username: Optional[str], location: str,
+                         cart: Cart, key: Optional[str] = None,
+                         client_id: Optional[int] = None) -> List[int]: ...
+
+    async def save_orders(self, orders: List[Order]) -> None: ...
+
+    async def get_order_version(self) -> Tuple[int, Optional[str]]: ...
+
+    async def get_client_orders(self, client_id: int, cursor: Optional[Tuple[date, int]] = None,
+                                newer: bool = False, limit: int = 10) -> List[Tuple]: ...
+
+    async def get_order_feed(self) -> List[Tuple]: ...
+
+    async def ack_order_feed(self, feed_ids: List[int]) -> None: ...
+
+    async def get_daily_summary(self, day: date) -> List[Tuple]: ...
+
+    async def get_statistics(self, after_lsn: Optional[str] = None) -> Tuple[int, List[Tuple], float, float, float, float, List[Tuple]]: ...
+
+    def iter_orders(self, start: Optional[date] = None, end: Optional[date] = None,
+                    location: Optional[str] = None, batch_size: int = 2000) -> AsyncIterator[Tuple]: ...
+
+    async def import_orders(self, rows: Iterable[Tuple]) -> Tuple[int, int]: ...
+
+    async def rebuild_statistics(self) -> int: ...
+
+    async def check_statistics(self) -> List[Tuple]: ...
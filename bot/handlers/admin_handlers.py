@@ -0,0 +1,36 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from ..utils.constants import EMOJIS
+from ..utils.catalog import catalog
+
+async def command_reload_catalog(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    from .auth_handlers import check_admin
+    if not await check_admin(update):
+        return
+
+    await catalog.reload()
+    await update.message.reply_text(
+        f"{EMOJIS['CONFIRM']} Product catalog reloaded ({len(catalog.products)} products)."
+    )
+
+async def command_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    from .auth_handlers import check_admin
+    from ..utils.instrumentation import profiler
+    if not await check_admin(update):
+        return
+
+    # /profile N: profile the handlers of the next N updates (default 50)
+    try:
+        updates = int(context.args[0]) if context.args else 50
+    except ValueError:
+        updates = 0
+    if not 1 <= updates <= 10000:
+        await update.message.reply_text(f"{EMOJIS['WARNING']} Usage: /profile N, with N between 1 and 10000.")
+        return
+
+    if not profiler.start(updates, update.effective_chat.id):
+        await update.message.reply_text(f"{EMOJIS['WARNING']} A profile is already being recorded.")
+        return
+    await update.message.reply_text(
+        f"{EMOJIS['STATS']} Profiling the next {updates} updates, the report will be sent here."
+    )
@@ -1,16 +1,31 @@
-from telegram import Update
+from typing import Set, Tuple
+from telegram import Update, User
 from telegram.ext import ConversationHandler
-from ..utils.constants import AUTHORIZED_USERS_IDS, AUTHORIZED_USERS_USERNAMES
+from ..utils.constants import authorized_users, admin_users
 
-async def check_auth(update: Update) -> bool:
-    user_id = update.effective_user.id
-    username = update.effective_user.username
-    
-    if user_id in AUTHORIZED_USERS_IDS:
+def _is_listed(user: User, users: Tuple[Set[int], Set[str]]) -> bool:
+    ids, usernames = users
+    if user.id in ids:
         return True
-    
-    if username and f"@{username.lower()}" in AUTHORIZED_USERS_USERNAMES:
+
+    return bool(user.username and f"@{user.username.lower()}" in usernames)
+
+def is_authorized(user: User) -> bool:
+    return _is_listed(user, authorized_users())
+
+def is_admin(user: User) -> bool:
+    return _is_listed(user, admin_users())
+
+async def check_auth(update: Update) -> bool:
+    if is_authorized(update.effective_user):
         return True
         
     await update.message.reply_text("Sorry, you are not authorized to use this bot.")
-    return False 
\ No newline at end of file
+    return False 
+
+async def check_admin(update: Update) -> bool:
+    if is_admin(update.effective_user):
+        return True
+
+    await update.message.reply_text("Sorry, this command is only available to admins.")
+    return False
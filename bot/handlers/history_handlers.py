@@ -0,0 +1,114 @@
+import os
+import logging
+from datetime import date
+from typing import Optional, Tuple
+from telegram import Update
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+from ..utils.constants import EMOJIS
+from ..utils.formatters import format_client_history
+from ..utils.keyboards import create_history_clients_keyboard, create_history_keyboard
+from ..utils.client_index import client_index, normalize_name
+from ..database.database import db
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '10'))
+
+Cursor = Tuple[date, int]
+
+def encode_history_cursor(client_id: int, newer: bool, cursor: Cursor) -> str:
+    """callback_data for the page after (or with `newer` before) an order line.
+
+    The day is stored as its ordinal, so the worst case
+    'history:2147483647:o:3652059:2147483647' stays within Telegram's 64 bytes.
+    """
+    day, order_id = cursor
+    return f"history:{client_id}:{'n' if newer else 'o'}:{day.toordinal()}:{order_id}"
+
+def decode_history_cursor(data: str) -> Tuple[int, Optional[Cursor], bool]:
+    """Client id, cursor and direction from 'history:CLIENT' or encode_history_cursor()."""
+    parts = data.split(':')
+    if len(parts) == 2:
+        return int(parts[1]), None, False
+    _, client_id, direction, day, order_id = parts
+    return int(client_id), (date.fromordinal(int(day)), int(order_id)), direction == 'n'
+
+async def _history_page(client_id: int, cursor: Optional[Cursor], newer: bool):
+    """Text and keyboard of one history page, read with one index range scan."""
+    # One line more than shown tells whether there is a page beyond this one
+    rows = await db.get_client_orders(client_id, cursor, newer, HISTORY_PAGE_SIZE + 1)
+    if newer and len(rows) <= HISTORY_PAGE_SIZE:
+        # Back at the newest orders: show a full first page
+        cursor, newer = None, False
+        rows = await db.get_client_orders(client_id, None, False, HISTORY_PAGE_SIZE + 1)
+
+    if newer:
+        rows, has_newer, has_older = rows[1:], True, True
+    else:
+        has_older = len(rows) > HISTORY_PAGE_SIZE
+        rows, has_newer = rows[:HISTORY_PAGE_SIZE], cursor is not None
+
+    client = client_index.get(client_id)
+    text = format_client_history(client.name if client else f'Client {client_id}',
+                                 client.location if client else '?', rows)
+    # Rows start with (id, created_at), cursors are (created_at, id)
+    keyboard = create_history_keyboard(
+        encode_history_cursor(client_id, True, (rows[0][1], rows[0][0])) if has_newer and rows else None,
+        encode_history_cursor(client_id, False, (rows[-1][1], rows[-1][0])) if has_older else None
+    )
+    return text, keyboard
+
+async def command_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show a client's orders newest first, e.g. `/history Ivan Petrenko`."""
+    from .auth_handlers import check_auth
+    if not await check_auth(update):
+        return
+
+    name = ' '.join(context.args)
+    if not name:
+        await update.message.reply_text(f"{EMOJIS['ERROR']} Usage: /history CLIENT NAME")
+        return
+
+    # Provisional entries (negative ids) have no rows to page through yet
+    clients = [client for client in client_index.search(name, limit=8) if client.id > 0]
+    exact = [client for client in clients if normalize_name(client.name) == normalize_name(name)]
+    clients = exact or clients
+    if not clients:
+        await update.message.reply_text(f"{EMOJIS['ERROR']} No client found matching \"{name}\".")
+        return
+    if len(clients) > 1:
+        await update.message.reply_text(
+            "Whose order history?", reply_markup=create_history_clients_keyboard(clients)
+        )
+        return
+
+    try:
+        text, keyboard = await _history_page(clients[0].id, None, False)
+    except Exception as e:
+        logger.error(f"Error loading order history: {e}")
+        await update.message.reply_text(f"{EMOJIS['ERROR']} Sorry, there was an error loading the order history.")
+        return
+    await update.message.reply_text(text, reply_markup=keyboard)
+
+async def handle_history_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    from .auth_handlers import is_authorized
+    query = update.callback_query
+    if not is_authorized(query.from_user):
+        await query.answer("Sorry, you are not authorized to use this bot.", show_alert=True)
+        return
+
+    client_id, cursor, newer = decode_history_cursor(query.data)
+    try:
+        text, keyboard = await _history_page(client_id, cursor, newer)
+    except Exception as e:
+        logger.error(f"Error loading order history: {e}")
+        await query.answer(f"{EMOJIS['ERROR']} Could not load the order history.", show_alert=True)
+        return
+    await query.answer()
+    try:
+        await query.edit_message_text(text, reply_markup=keyboard)
+    except BadRequest as e:
+        # Pressing a button again when nothing changed
+        if 'not modified' not in str(e):
+            raise
@@ -0,0 +1,212 @@
+import io
+import csv
+import time
+import asyncio
+import logging
+import tempfile
+from datetime import date
+from typing import Dict, IO, Iterator, List, Tuple, Union
+from telegram import Update
+from telegram.ext import ContextTypes
+from ..utils.constants import EMOJIS, BUILDINGS
+from ..utils.catalog import catalog
+from ..utils.client_index import client_index
+from ..database.database import db
+from ..models.models import Product
+
+logger = logging.getLogger(__name__)
+
+# Bots can only download files of up to 20 MB
+MAX_IMPORT_SIZE = 20 * 1024 * 1024
+# Uploads larger than this are spooled to disk
+IMPORT_SPOOL_SIZE = 8 * 1024 * 1024
+# Errors listed in the reply; all of them are in the attached report
+ERRORS_IN_REPLY = 10
+
+# Accepted header titles (lowercase, spaces as underscores) for each column
+COLUMN_ALIASES = {
+    'name': 'name', 'client': 'name', 'client_name': 'name', 'customer': 'name', 'customer_name': 'name',
+    'username': 'username',
+    'location': 'location',
+    'product': 'product',
+    'quantity': 'quantity', 'qty': 'quantity',
+    'date': 'date'
+}
+REQUIRED_COLUMNS = ('name', 'location', 'product', 'quantity')
+
+IMPORT_USAGE = (
+    "Send a CSV file with the caption /import, or reply /import to one.\n"
+    "Columns: Name, Username (optional), Location, Product, Quantity, Date (optional, YYYY-MM-DD, not in the future)"
+)
+
+def _parse_header(header: List[str]) -> Dict[str, int]:
+    columns = {}
+    for index, title in enumerate(header):
+        column = COLUMN_ALIASES.get('_'.join(title.strip().lower().split()))
+        if column and column not in columns:
+            columns[column] = index
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    return columns
+
+def parse_import(text: IO[str], products: List[Product]) -> Iterator[Tuple[int, Union[Tuple, str]]]:
+    """Parse an import CSV row by row.
+
+    Yields (line, row) for valid rows, with row laid out as IMPORT_COLUMNS, and
+    (line, error message) for invalid ones. Raises ValueError for a bad header.
+    """
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(text, dialect)
+    header = next(reader, None)
+    if header is None:
+        raise ValueError("The file is empty.")
+    columns = _parse_header(header)
+
+    by_name = {product.name.lower(): product for product in products}
+    by_id = {str(product.id): product for product in products}
+    locations = {name.lower(): name for name in BUILDINGS}
+    today = date.today()
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        line = reader.line_num
+        cells = {column: row[index].strip() if index < len(row) else '' for column, index in columns.items()}
+
+        name = cells['name']
+        if not name or len(name) > 100:
+            yield line, "Name is missing or longer than 100 characters"
+            continue
+        username = cells.get('username', '').lstrip('@')
+        username = f"@{username}" if username else None
+
+        location = locations.get(cells['location'].lower())
+        if location is None:
+            yield line, f"Unknown location: {cells['location']!r}"
+            continue
+
+        product = by_name.get(cells['product'].lower()) or by_id.get(cells['product'])
+        if product is None:
+            yield line, f"Unknown product: {cells['product']!r}"
+            continue
+
+        try:
+            quantity = int(cells['quantity'])
+            if quantity <= 0:
+                raise ValueError
+        except ValueError:
+            yield line, f"Quantity must be a positive number: {cells['quantity']!r}"
+            continue
+
+        created_at = today
+        if cells.get('date'):
+            try:
+                created_at = date.fromisoformat(cells['date'])
+            except ValueError:
+                yield line, f"Date must be YYYY-MM-DD: {cells['date']!r}"
+                continue
+            # No order is placed in the future; such a date is a typo
+            if created_at > today:
+                yield line, f"Date is in the future: {cells['date']!r}"
+                continue
+
+        yield line, (line, name, username, location, product.id, quantity, quantity * product.price, created_at)
+
+def _validate(upload: IO[bytes], products: List[Product], report: IO[bytes]) -> Tuple[int, int, List[str]]:
+    """First pass over the upload: count valid rows and write every error to the report."""
+    text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+    report_text = io.TextIOWrapper(report, encoding='utf-8', newline='')
+    writer = csv.writer(report_text)
+    writer.writerow(['Line', 'Error'])
+    valid, errors, first_errors = 0, 0, []
+    try:
+        for line, row in parse_import(text, products):
+            if isinstance(row, str):
+                errors += 1
+                writer.writerow([line, row])
+                if len(first_errors) < ERRORS_IN_REPLY:
+                    first_errors.append(f"Line {line}: {row}")
+            else:
+                valid += 1
+    finally:
+        report_text.flush()
+        report_text.detach()
+        text.detach()
+    return valid, errors, first_errors
+
+async def command_import(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Import orders from a CSV document; nothing is imported unless every row is valid."""
+    from .auth_handlers import check_auth
+    if not await check_auth(update):
+        return
+
+    message = update.message
+    document = message.document or (message.reply_to_message.document if message.reply_to_message else None)
+    if document is None:
+        await message.reply_text(f"{EMOJIS['PACKAGE']} {IMPORT_USAGE}")
+        return
+    if document.file_size and document.file_size > MAX_IMPORT_SIZE:
+        await message.reply_text(f"{EMOJIS['ERROR']} The file is too large, the limit is 20 MB.")
+        return
+
+    started = time.perf_counter()
+    upload = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_SIZE)
+    report = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_SIZE)
+    try:
+        file = await document.get_file()
+        await file.download_to_memory(upload)
+        await catalog.ensure_fresh()
+        products = catalog.products
+
+        # Parsing is CPU bound, so the validation pass runs off the event loop
+        upload.seek(0)
+        try:
+            valid, errors, first_errors = await asyncio.to_thread(_validate, upload, products, report)
+        except (ValueError, UnicodeDecodeError) as e:
+            await message.reply_text(f"{EMOJIS['ERROR']} Cannot read the file: {e}\n{IMPORT_USAGE}")
+            return
+
+        if errors:
+            await message.reply_text(
+                f"{EMOJIS['ERROR']} Nothing was imported: {errors} of {valid + errors} rows have errors.\n\n"
+                + '\n'.join(first_errors)
+                + ("\n\nThe full report is attached." if errors > ERRORS_IN_REPLY else "")
+            )
+            if errors > ERRORS_IN_REPLY:
+                report.seek(0)
+                await context.bot.send_document(
+                    chat_id=update.effective_chat.id,
+                    document=report,
+                    filename=f'import_errors_{int(time.time())}.csv'
+                )
+            return
+        if not valid:
+            await message.reply_text(f"{EMOJIS['ERROR']} The file has no orders.")
+            return
+
+        # Second pass streams the rows into COPY; import_orders parses them in
+        # chunks off the event loop, so the file is never held as Python objects
+        upload.seek(0)
+        text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+        try:
+            orders, clients = await db.import_orders(row for _, row in parse_import(text, products))
+        finally:
+            text.detach()
+        await client_index.sync()
+
+        await message.reply_text(
+            f"{EMOJIS['CONFIRM']} Imported {orders} orders ({clients} new clients) "
+            f"in {time.perf_counter() - started:.2f}s."
+        )
+    except Exception as e:
+        logger.error(f"Error importing orders: {e}")
+        await message.reply_text(f"{EMOJIS['ERROR']} Sorry, there was an error importing orders.")
+    finally:
+        upload.close()
+        report.close()
@@ -1,10 +1,16 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import (
+    Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
+)
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes, ConversationHandler
 from ..utils.constants import NAME, LOCATION, PRODUCT_SELECTION, QUANTITY, EMOJIS
-from ..utils.keyboards import create_product_keyboard, create_location_keyboard, create_main_menu_keyboard
-from ..utils.formatters import format_cart_text
-from ..database.database import db
-from ..models.models import CartItem
+from ..utils.keyboards import create_location_keyboard, create_main_menu_keyboard
+from ..utils.formatters import format_cart_text, format_cart_lines
+from ..utils.catalog import catalog
+from ..utils.client_index import client_index
+from ..utils.product_matcher import parse_cart_entry
+from ..database.order_queue import order_queue
+from ..models.models import Cart, to_minor_units
 
 async def command_new_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
     from .auth_handlers import check_auth
@@ -41,65 +47,139 @@ async def handle_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data['name'] = text.strip()
         context.user_data['username'] = None
     
+    # Offer existing clients whose name starts with the text entered
+    suggestions = client_index.search(context.user_data['name'], limit=5)
+    prompt = "Please select the delivery location, or an existing client" if suggestions else "Please select the delivery location"
     await update.message.reply_text(
-        f"{EMOJIS['LOCATION']} Please select the delivery location:",
-        reply_markup=create_location_keyboard()
+        f"{EMOJIS['LOCATION']} {prompt}:",
+        reply_markup=create_location_keyboard(suggestions)
     )
     return LOCATION
 
+async def _ask_for_products(query, context: ContextTypes.DEFAULT_TYPE):
+    cart = context.user_data.get('cart')
+    # The location prompt becomes the cart message, which is edited in place from now on
+    if cart:
+        # Typed in one message before the location was picked (see handle_cart_entry)
+        cart_text, _ = format_cart_text(cart)
+        message = await query.edit_message_text(
+            f"{EMOJIS['LOCATION']} {context.user_data['location']}\n{cart_text}",
+            reply_markup=await catalog.get_keyboard(show_confirm=True)
+        )
+    else:
+        context.user_data['cart'] = Cart()
+        message = await query.edit_message_text(
+            f"{EMOJIS['LOCATION']} {context.user_data['location']}\n"
+            f"{EMOJIS['SHOPPING']} Please select products to order, or type them all at once, "
+            "e.g. Plastic 3, Leather x2:",
+            reply_markup=await catalog.get_keyboard()
+        )
+    context.user_data['cart_message_id'] = message.message_id
+    return PRODUCT_SELECTION
+
+async def _show_cart(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, reply_markup) -> None:
+    """Edit the cart message, or send a new one if it can no longer be edited."""
+    message_id = context.user_data.get('cart_message_id')
+    if message_id:
+        try:
+            await context.bot.edit_message_text(
+                text, chat_id=update.effective_chat.id, message_id=message_id, reply_markup=reply_markup
+            )
+            return
+        except BadRequest as e:
+            if 'not modified' in str(e):
+                return
+    message = await update.effective_message.reply_text(text, reply_markup=reply_markup)
+    context.user_data['cart_message_id'] = message.message_id
+
 async def handle_location(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
     location = query.data.replace('location:', '')
     context.user_data['location'] = location
-    context.user_data['cart'] = {}
+    # A known client's id lets the order skip the clients upsert
+    client = client_index.find(context.user_data['name'], location)
+    context.user_data['client_id'] = client.id if client and client.id > 0 else None
+    return await _ask_for_products(query, context)
+
+async def handle_client(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
     
-    products = db.get_products()
-    keyboard = create_product_keyboard(products)
+    client = client_index.get(int(query.data.split(':')[1]))
+    if client is None:
+        await query.message.reply_text(f"{EMOJIS['WARNING']} This client is no longer available, select a location.")
+        return LOCATION
     
-    await query.message.reply_text(
-        f"{EMOJIS['SHOPPING']} Please select products to order:",
-        reply_markup=keyboard
-    )
-    return PRODUCT_SELECTION
+    context.user_data['name'] = client.name
+    context.user_data['username'] = client.username
+    context.user_data['location'] = client.location
+    context.user_data['client_id'] = client.id if client.id > 0 else None
+    return await _ask_for_products(query, context)
+
+async def inline_search_clients(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    from .auth_handlers import is_authorized
+    query = update.inline_query
+    if not is_authorized(query.from_user):
+        await query.answer([], cache_time=0, is_personal=True)
+        return
+    
+    # Picking a result sends "Name @username", which handle_name parses as usual
+    results = [
+        InlineQueryResultArticle(
+            id=str(client.id),
+            title=client.name,
+            description=' · '.join(filter(None, [client.username, client.location])),
+            input_message_content=InputTextMessageContent(
+                f"{client.name} {client.username}" if client.username else client.name
+            )
+        )
+        for client in client_index.search(query.query, limit=20)
+    ]
+    await query.answer(results, cache_time=0, is_personal=True)
 
 async def handle_product_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
     
     if query.data == 'confirm_order':
-        cart = context.user_data.get('cart', {})
+        cart = context.user_data.get('cart')
         if not cart:
-            await query.message.reply_text(f"{EMOJIS['WARNING']} Cart is empty!")
+            await query.answer(f"{EMOJIS['WARNING']} Cart is empty!", show_alert=True)
             return PRODUCT_SELECTION
+        await query.answer()
         
-        cart_text, total = format_cart_text(cart)
-        await query.message.reply_text(
-            f"{EMOJIS['PACKAGE']} Order Summary:\n\n"
-            f"👤 Customer: {context.user_data['name']}\n"
-            f"📍 Location: {context.user_data['location']}\n\n"
-            f"{cart_text}\n\n"
-            "Order has been saved! ✅"
-        )
-        
-        # Save order to database
-        db.save_order(
+        # Journal the order; it is written to the database in the background
+        await order_queue.submit(
             client_name=context.user_data['name'],
             username=context.user_data.get('username'),
             location=context.user_data['location'],
-            cart=cart
+            cart=cart,
+            client_id=context.user_data.get('client_id'),
+            chat_id=update.effective_chat.id
         )
-        
-        # Show main menu after order completion
-        await query.message.reply_text(
+        client_index.note_order(
+            context.user_data['name'], context.user_data.get('username'), context.user_data['location']
+        )
+
+        # The cart message turns into the order summary with the main menu
+        cart_lines, _ = format_cart_lines(cart)
+        await _show_cart(
+            update, context,
+            f"{EMOJIS['PACKAGE']} Order Summary:\n\n"
+            f"👤 Customer: {context.user_data['name']}\n"
+            f"📍 Location: {context.user_data['location']}\n\n"
+            f"{cart_lines}\n\n"
+            "Order has been saved! ✅\n\n"
             f"{EMOJIS['ARROW']} What would you like to do next?",
-            reply_markup=create_main_menu_keyboard()
+            create_main_menu_keyboard()
         )
         return ConversationHandler.END
     
     product_id = query.data.split(':')[1]
-    await query.message.reply_text(f"{EMOJIS['PLUS']} Enter quantity:")
+    product = await catalog.get_product(product_id)
+    # A notification instead of a new message; the quantity is typed next
+    await query.answer(f"{EMOJIS['PLUS']} Enter the quantity of {product.name if product else 'this product'}")
     context.user_data['current_product'] = product_id
     return QUANTITY
 
@@ -113,22 +193,70 @@ async def handle_quantity(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return QUANTITY
     
     product_id = context.user_data['current_product']
-    products = db.get_products()
-    product = next(p for p in products if str(p.id) == product_id)
+    product = await catalog.get_product(product_id)
+    if product is None:
+        await update.message.reply_text(
+            f"{EMOJIS['WARNING']} This product is no longer available.",
+            reply_markup=await catalog.get_keyboard(show_confirm=bool(context.user_data.get('cart')))
+        )
+        return PRODUCT_SELECTION
     
-    cart = context.user_data.get('cart', {})
-    cart[product_id] = CartItem(
-        name=product.name,
-        price=product.price,
-        quantity=quantity
-    )
-    context.user_data['cart'] = cart
+    cart = context.user_data.setdefault('cart', Cart())
+    # Checked before the order is confirmed: the database would refuse it later
+    if not cart.fits(product_id, to_minor_units(product.price), quantity):
+        await update.message.reply_text(f"{EMOJIS['ERROR']} This quantity is too large for one order, enter a smaller one.")
+        return QUANTITY
+    cart.set(product_id, product.name, to_minor_units(product.price), quantity)
     
     cart_text, _ = format_cart_text(cart)
-    keyboard = create_product_keyboard(products, show_confirm=True)
+    keyboard = await catalog.get_keyboard(show_confirm=True)
     
-    await update.message.reply_text(
-        f"{cart_text}",
-        reply_markup=keyboard
+    await _show_cart(update, context, cart_text, keyboard)
+    return PRODUCT_SELECTION 
+
+async def handle_cart_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Fill the cart from one typed message, e.g. `Plastic 3, Leather x2, brac 1`.
+
+    Accepted while products are selected and, before that, while the location is
+    still to be picked. Nothing is added unless every entry is understood.
+    """
+    state = PRODUCT_SELECTION if 'location' in context.user_data else LOCATION
+    items, errors = parse_cart_entry(update.message.text, await catalog.get_matcher())
+    if errors or not items:
+        await update.message.reply_text(
+            f"{EMOJIS['ERROR']} Nothing was added to the cart:\n" + '\n'.join(errors or ["no products given"])
+            + "\n\nType the products with their quantities, e.g. Plastic 3, Leather x2"
+        )
+        return state
+
+    cart = context.user_data.setdefault('cart', Cart()).copy()
+    for product, quantity in items:
+        if not cart.fits(str(product.id), to_minor_units(product.price), quantity):
+            await update.message.reply_text(
+                f"{EMOJIS['ERROR']} Nothing was added to the cart: the total is too large for one order."
+            )
+            return state
+        cart.set(str(product.id), product.name, to_minor_units(product.price), quantity)
+    context.user_data['cart'] = cart
+
+    if state == LOCATION:
+        cart_lines, _ = format_cart_lines(cart)
+        suggestions = client_index.search(context.user_data['name'], limit=5)
+        await update.message.reply_text(
+            f"{cart_lines}\n\n{EMOJIS['LOCATION']} Please select the delivery location:",
+            reply_markup=create_location_keyboard(suggestions)
+        )
+        return LOCATION
+    cart_text, _ = format_cart_text(cart)
+    await _show_cart(update, context, cart_text, await catalog.get_keyboard(show_confirm=True))
+    return PRODUCT_SELECTION
+
+async def handle_conversation_timeout(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # The unfinished order is dropped; the cart lives in user_data
+    context.user_data.clear()
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=f"{EMOJIS['WARNING']} The unfinished order timed out and was discarded.",
+        reply_markup=create_main_menu_keyboard()
     )
-    return PRODUCT_SELECTION 
\ No newline at end of file
+    return ConversationHandler.END
@@ -1,99 +1,260 @@
 import io
+import os
 import csv
+import gzip
 import time
+import asyncio
 import logging
-from telegram import Update
+import tempfile
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+from telegram import Bot, Update
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
-from ..utils.constants import EMOJIS
+from ..utils.constants import EMOJIS, BUILDINGS, daily_summary_chat_ids
+from ..utils.formatters import format_statistics_caption, format_daily_summary
 from ..database.database import db
 
 logger = logging.getLogger(__name__)
 
+# Exports larger than this are spooled to disk while they are generated
+EXPORT_SPOOL_SIZE = int(os.getenv('EXPORT_SPOOL_SIZE', str(8 * 1024 * 1024)))
+# Rows fetched per batch; each batch is encoded and written in a worker thread
+EXPORT_CHUNK_ROWS = 2000
+
+@dataclass
+class StatisticsReport:
+    version: int
+    data: bytes
+    filename: str
+    caption: str
+    # Telegram file_id of the first upload, re-sent instead of uploading again
+    file_id: Optional[str] = None
+
+class StatisticsCache:
+    """The rendered statistics report, rebuilt only when the order version changes."""
+
+    def __init__(self):
+        self.report: Optional[StatisticsReport] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> Optional[StatisticsReport]:
+        async with self._lock:
+            # A cheap check of the committed version; the report is cached under the
+            # version of the snapshot it was built from, so it can't outlive a write
+            current, lsn = await db.get_order_version()
+            if self.report is None or self.report.version != current:
+                version, *statistics = await db.get_statistics(lsn)
+                rows, total_quantity, total_revenue, total_cost, total_profit, recent_orders = statistics
+                if not rows:
+                    return None
+                self.report = StatisticsReport(
+                    version=version,
+                    data=render_statistics_csv(rows, total_quantity, total_revenue, total_cost, total_profit, recent_orders),
+                    filename=f'orders_statistics_{int(time.time())}.csv',
+                    caption=format_statistics_caption(total_revenue, total_cost, total_profit)
+                )
+            return self.report
+
+statistics_cache = StatisticsCache()
+
+def render_statistics_csv(rows: List[Tuple], total_quantity, total_revenue, total_cost, total_profit,
+                          recent_orders: List[Tuple]) -> bytes:
+    # Create CSV in memory, encoding straight into the buffer that gets uploaded
+    output = io.BytesIO()
+    text = io.TextIOWrapper(output, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text)
+    
+    # Write product statistics
+    writer.writerow([
+        'Product Statistics',
+        '', '', '', ''  # Empty columns for alignment
+    ])
+    writer.writerow([
+        'Product Name',
+        'Total Quantity',
+        'Total Revenue (₴)',
+        'Total Cost (₴)',
+        'Profit (₴)'
+    ])
+    writer.writerows(rows)
+    
+    # Add totals row
+    writer.writerow([''])  # Empty row for spacing
+    writer.writerow([
+        'TOTAL',
+        total_quantity,
+        f'{total_revenue:.2f}',
+        f'{total_cost:.2f}',
+        f'{total_profit:.2f}'
+    ])
+    
+    # Add recent orders section
+    writer.writerow([''])  # Empty row for spacing
+    writer.writerow([''])  # Empty row for spacing
+    writer.writerow([
+        'Recent Orders',
+        '', '', '', ''  # Empty columns for alignment
+    ])
+    writer.writerow([
+        'Client Name',
+        'Location',
+        'Product',
+        'Quantity',
+        'Total Price (₴)',
+        'Date'
+    ])
+    for order in recent_orders:
+        writer.writerow([
+            order[0],  # client_name
+            order[1],  # location
+            order[2],  # product_name
+            order[3],  # quantity
+            f'{order[4]:.2f}',  # total_price
+            order[5].strftime('%Y-%m-%d')  # created_at
+        ])
+    
+    text.detach()
+    return output.getvalue()
+
+async def send_statistics_report(bot: Bot, chat_id: int, report: StatisticsReport, caption: Optional[str] = None) -> None:
+    """Send the report, by file_id when it has been uploaded before."""
+    caption = caption or report.caption
+    if report.file_id:
+        try:
+            await bot.send_document(chat_id=chat_id, document=report.file_id, caption=caption)
+            return
+        except BadRequest as e:
+            logger.warning(f"Re-sending the statistics file_id failed, uploading again: {e}")
+            report.file_id = None
+    message = await bot.send_document(chat_id=chat_id, document=report.data, filename=report.filename, caption=caption)
+    report.file_id = message.document.file_id
+
 async def command_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     from .auth_handlers import check_auth
     if not await check_auth(update):
         return
+    if update.callback_query:
+        await update.callback_query.answer()
     
     try:
-        # Get statistics using Database class
-        rows, total_quantity, total_revenue, total_cost, total_profit, recent_orders = db.get_statistics()
-        
-        if not rows:
-            await update.message.reply_text(f"{EMOJIS['ERROR']} No orders found.")
+        report = await statistics_cache.get()
+        if report is None:
+            await update.effective_message.reply_text(f"{EMOJIS['ERROR']} No orders found.")
             return
+        await send_statistics_report(context.bot, update.effective_chat.id, report)
         
-        # Create CSV in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write product statistics
-        writer.writerow([
-            'Product Statistics',
-            '', '', '', ''  # Empty columns for alignment
-        ])
-        writer.writerow([
-            'Product Name',
-            'Total Quantity',
-            'Total Revenue (₴)',
-            'Total Cost (₴)',
-            'Profit (₴)'
-        ])
-        writer.writerows(rows)
-        
-        # Add totals row
-        writer.writerow([''])  # Empty row for spacing
-        writer.writerow([
-            'TOTAL',
-            total_quantity,
-            f'{total_revenue:.2f}',
-            f'{total_cost:.2f}',
-            f'{total_profit:.2f}'
-        ])
-        
-        # Add recent orders section
-        writer.writerow([''])  # Empty row for spacing
-        writer.writerow([''])  # Empty row for spacing
-        writer.writerow([
-            'Recent Orders',
-            '', '', '', ''  # Empty columns for alignment
-        ])
+    except Exception as e:
+        logger.error(f"Error exporting orders: {e}")
+        await update.effective_message.reply_text(
+            f"{EMOJIS['ERROR']} Sorry, there was an error downloading statistics."
+        )
+
+async def daily_statistics_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Precompute the statistics report and send yesterday's summary with it."""
+    report = await statistics_cache.get()
+    yesterday = date.today() - timedelta(days=1)
+    summary = format_daily_summary(yesterday, await db.get_daily_summary(yesterday))
+    for chat_id in daily_summary_chat_ids():
+        try:
+            if report:
+                await send_statistics_report(context.bot, chat_id, report, caption=summary)
+            else:
+                await context.bot.send_message(chat_id=chat_id, text=summary)
+        except Exception as e:
+            logger.warning(f"Could not send the daily summary to {chat_id}: {e}")
+
+async def command_export(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Export full order history, e.g. `/export 2026-09-01 2026-09-30 Omega gz`."""
+    from .auth_handlers import check_auth
+    if not await check_auth(update):
+        return
+
+    try:
+        start, end, location, compress = _parse_export_args(context.args)
+    except ValueError as e:
+        await update.message.reply_text(
+            f"{EMOJIS['ERROR']} {e}\n"
+            "Usage: /export [FROM [TO]] [LOCATION] [gz]\n"
+            "Dates are YYYY-MM-DD, e.g. /export 2026-09-01 2026-09-30 Omega"
+        )
+        return
+
+    started = time.perf_counter()
+    # Rows are streamed into a temp file that only stays in memory while it is small
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    try:
+        raw = gzip.GzipFile(fileobj=spool, mode='wb') if compress else spool
+        text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        writer = csv.writer(text)
         writer.writerow([
-            'Client Name',
-            'Location',
-            'Product',
-            'Quantity',
-            'Total Price (₴)',
-            'Date'
+            'Order ID', 'Date', 'Client Name', 'Username', 'Location',
+            'Product', 'Quantity', 'Total Price (₴)'
         ])
-        for order in recent_orders:
-            writer.writerow([
-                order[0],  # client_name
-                order[1],  # location
-                order[2],  # product_name
-                order[3],  # quantity
-                f'{order[4]:.2f}',  # total_price
-                order[5].strftime('%Y-%m-%d')  # created_at
-            ])
-        
-        # Convert to bytes
-        output.seek(0)
-        bytes_output = output.getvalue().encode()
-        
-        # Send file
+
+        # CSV encoding, gzip and spilling the spool to disk all block, so they
+        # run in a worker thread while the event loop keeps serving updates
+        row_count, batch = 0, []
+        async for row in db.iter_orders(start, end, location):
+            batch.append(row)
+            if len(batch) >= EXPORT_CHUNK_ROWS:
+                await asyncio.to_thread(writer.writerows, batch)
+                row_count += len(batch)
+                batch = []
+        row_count += len(batch)
+
+        def finish() -> None:
+            writer.writerows(batch)
+            text.flush()
+            text.detach()
+            if compress:
+                raw.close()
+        await asyncio.to_thread(finish)
+
+        if not row_count:
+            await update.message.reply_text(f"{EMOJIS['ERROR']} No orders found.")
+            return
+
+        elapsed = time.perf_counter() - started
+        spool.seek(0)
+        applied = ' '.join(str(value) for value in (start, end, location) if value)
         await context.bot.send_document(
             chat_id=update.effective_chat.id,
-            document=io.BytesIO(bytes_output),
-            filename=f'orders_statistics_{int(time.time())}.csv',
+            document=spool,
+            filename=f'orders_export_{int(time.time())}.csv' + ('.gz' if compress else ''),
             caption=(
-                f'Statistics Summary:\n'
-                f'{EMOJIS["MONEY"]} Total Revenue: ₴{total_revenue:.2f}\n'
-                f'{EMOJIS["SHOPPING"]} Total Cost: ₴{total_cost:.2f}\n'
-                f'{EMOJIS["STATS"]} Total Profit: ₴{total_profit:.2f}'
+                f'{EMOJIS["STATS"]} Order export{" (" + applied + ")" if applied else ""}\n'
+                f'Rows: {row_count}\n'
+                f'Generated in {elapsed:.2f}s'
             )
         )
-        
     except Exception as e:
-        logger.error(f"Error exporting orders: {e}")
+        logger.error(f"Error exporting order history: {e}")
         await update.message.reply_text(
-            f"{EMOJIS['ERROR']} Sorry, there was an error downloading statistics."
-        ) 
\ No newline at end of file
+            f"{EMOJIS['ERROR']} Sorry, there was an error exporting orders."
+        )
+    finally:
+        spool.close()
+
+def _parse_export_args(args: List[str]) -> Tuple[Optional[date], Optional[date], Optional[str], bool]:
+    dates, location, compress = [], None, False
+    locations = {name.lower(): name for name in BUILDINGS}
+    for arg in args:
+        if arg.lower() in ('gz', 'gzip'):
+            compress = True
+        elif arg.lower() in locations:
+            location = locations[arg.lower()]
+        else:
+            try:
+                dates.append(date.fromisoformat(arg))
+            except ValueError:
+                raise ValueError(f"Unknown date or location: {arg}")
+    if len(dates) > 2:
+        raise ValueError("At most two dates can be given.")
+    start = dates[0] if dates else None
+    end = dates[1] if len(dates) > 1 else None
+    if start and end and start > end:
+        raise ValueError("The start date is after the end date.")
+    return start, end, location, compress
+
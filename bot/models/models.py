@@ -1,4 +1,22 @@
 from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterator, List, Optional, Union
+
+# Largest values the orders table can store: quantity is INTEGER, total_price
+# (and the order feed's total of a whole order) DECIMAL(10, 2)
+MAX_QUANTITY = 2 ** 31 - 1
+MAX_TOTAL = 10 ** 10 - 1  # kopecks
+
+def to_minor_units(amount: Union[Decimal, float, int, str]) -> int:
+    """Convert a price in hryvnias (e.g. Decimal('12.50') from the database) to kopecks."""
+    return int((Decimal(str(amount)) * 100).to_integral_value(ROUND_HALF_UP))
+
+def from_minor_units(kopecks: int) -> Decimal:
+    """Exact hryvnia amount of a number of kopecks, e.g. for numeric columns."""
+    return Decimal(kopecks).scaleb(-2)
+
+def format_money(kopecks: int) -> str:
+    return f"{kopecks // 100}.{kopecks % 100:02d}" if kopecks >= 0 else f"-{format_money(-kopecks)}"
 
 @dataclass
 class Product:
@@ -6,8 +24,121 @@ class Product:
     name: str
     price: float
 
+@dataclass
+class Client:
+    id: int  # negative for a client whose first order is not written yet
+    name: str
+    username: Optional[str]
+    location: str
+
 @dataclass
 class CartItem:
+    __slots__ = ('name', 'price', 'quantity')
     name: str
-    price: float
-    quantity: int 
\ No newline at end of file
+    price: int  # kopecks
+    quantity: int
+
+    @property
+    def subtotal(self) -> int:
+        return self.price * self.quantity
+
+class Cart:
+    """Cart of an order being entered: CartItems by product id (as a string).
+
+    Prices are integer kopecks, so amounts are exact, and the total is adjusted as
+    lines are set or removed rather than summed again. The rendered text of each
+    line is cached until that line changes.
+    """
+
+    __slots__ = ('_items', '_lines', 'total')
+
+    def __init__(self):
+        self._items: Dict[str, CartItem] = {}
+        self._lines: Dict[str, str] = {}
+        self.total = 0
+
+    def set(self, product_id: str, name: str, price: int, quantity: int) -> None:
+        """Add a product, or replace its line (keeping its place) if it is already in the cart."""
+        old = self._items.get(product_id)
+        if old is not None:
+            self.total -= old.subtotal
+            self._lines.pop(product_id, None)
+        item = self._items[product_id] = CartItem(name, price, quantity)
+        self.total += item.subtotal
+
+    def fits(self, product_id: str, price: int, quantity: int) -> bool:
+        """Whether the line, and the cart with it set, can still be saved (see MAX_QUANTITY, MAX_TOTAL)."""
+        old = self._items.get(product_id)
+        total = self.total - (old.subtotal if old else 0) + price * quantity
+        return quantity <= MAX_QUANTITY and price * quantity <= MAX_TOTAL and total <= MAX_TOTAL
+
+    def remove(self, product_id: str) -> None:
+        item = self._items.pop(product_id, None)
+        if item is not None:
+            self.total -= item.subtotal
+            self._lines.pop(product_id, None)
+
+    def get(self, product_id: str) -> Optional[CartItem]:
+        return self._items.get(product_id)
+
+    def items(self):
+        return self._items.items()
+
+    def values(self):
+        return self._items.values()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._items)
+
+    def __contains__(self, product_id: object) -> bool:
+        return product_id in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Cart) and self._items == other._items
+
+    def lines(self) -> List[str]:
+        """Rendered lines in the order the products were added."""
+        lines = self._lines
+        for product_id, item in self._items.items():
+            if product_id not in lines:
+                lines[product_id] = (
+                    f"• {item.name}: {item.quantity} × ₴{format_money(item.price)} = ₴{format_money(item.subtotal)}"
+                )
+        return [lines[product_id] for product_id in self._items]
+
+    def copy(self) -> 'Cart':
+        cart = Cart()
+        cart._items = {product_id: CartItem(item.name, item.price, item.quantity) for product_id, item in self._items.items()}
+        cart._lines = dict(self._lines)
+        cart.total = self.total
+        return cart
+
+    def encode(self) -> List[list]:
+        """Compact JSON-ready form: [[product_id, name, price, quantity], ...]."""
+        return [[product_id, item.name, item.price, item.quantity] for product_id, item in self._items.items()]
+
+    @classmethod
+    def decode(cls, data: Union[List[list], Dict[str, list]]) -> 'Cart':
+        """Inverse of encode(); also reads the older {product_id: [name, "price", quantity]} form."""
+        cart = cls()
+        if isinstance(data, dict):
+            for product_id, (name, price, quantity) in data.items():
+                cart.set(product_id, name, to_minor_units(price), quantity)
+        else:
+            for product_id, name, price, quantity in data:
+                cart.set(product_id, name, price, quantity)
+        return cart
+
+@dataclass
+class Order:
+    key: str
+    client_name: str
+    username: Optional[str]
+    location: str
+    cart: Cart
+    client_id: Optional[int] = None
+    # Chat of the operator who entered the order, told if it can't be written
+    chat_id: Optional[int] = None
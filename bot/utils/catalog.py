@@ -0,0 +1,102 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+import psycopg
+from telegram import InlineKeyboardMarkup
+from ..models.models import Product
+from ..database.database import db
+from ..database.storage import Storage
+from .keyboards import create_product_keyboard
+from .product_matcher import ProductMatcher
+
+logger = logging.getLogger(__name__)
+
+# Channel notified by the products trigger (migration 0001)
+CATALOG_CHANNEL = 'products_changed'
+
+class Catalog:
+    """In-memory product catalog with prebuilt keyboards and name matcher."""
+
+    def __init__(self, database: Storage, ttl: float):
+        self.db = database
+        self.ttl = ttl
+        self.products: List[Product] = []
+        self.by_id: Dict[str, Product] = {}
+        self.keyboard: Optional[InlineKeyboardMarkup] = None
+        self.confirm_keyboard: Optional[InlineKeyboardMarkup] = None
+        self.matcher = ProductMatcher([])
+        self.loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+
+    def _index(self, products: List[Product]) -> None:
+        self.products = products
+        self.by_id = {str(product.id): product for product in products}
+        self.keyboard = create_product_keyboard(products)
+        self.confirm_keyboard = create_product_keyboard(products, show_confirm=True)
+        self.matcher = ProductMatcher(products)
+        self.loaded_at = time.monotonic()
+
+    async def reload(self) -> None:
+        """Fetch products from the database and rebuild the index."""
+        async with self._lock:
+            self._index(await self.db.get_products())
+        logger.info(f"Product catalog loaded ({len(self.products)} products)")
+
+    async def ensure_fresh(self) -> None:
+        """Reload if the catalog was never loaded or its TTL expired."""
+        if self.keyboard is None or time.monotonic() - self.loaded_at > self.ttl:
+            await self.reload()
+
+    async def get_product(self, product_id: str) -> Optional[Product]:
+        await self.ensure_fresh()
+        return self.by_id.get(product_id)
+
+    async def get_keyboard(self, show_confirm: bool = False) -> InlineKeyboardMarkup:
+        await self.ensure_fresh()
+        return self.confirm_keyboard if show_confirm else self.keyboard
+
+    async def get_matcher(self) -> ProductMatcher:
+        await self.ensure_fresh()
+        return self.matcher
+
+    async def start(self) -> None:
+        await self.reload()
+        if self.db.notifies:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self) -> None:
+        """Reload the catalog whenever the products table changes."""
+        reconnecting = False
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    self.db.DATABASE_URL, autocommit=True, application_name='chip_order_bot_catalog'
+                ) as conn:
+                    await conn.execute(f"LISTEN {CATALOG_CHANNEL}")
+                    # Changes may have been missed while disconnected
+                    if reconnecting:
+                        await self.reload()
+                    reconnecting = True
+                    async for _ in conn.notifies():
+                        await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Catalog listener disconnected: {e}")
+                reconnecting = True
+                await asyncio.sleep(5)
+
+# Initialize catalog instance
+catalog = Catalog(db, ttl=float(os.getenv('CATALOG_TTL', '300')))
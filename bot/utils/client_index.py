@@ -0,0 +1,115 @@
+import os
+import asyncio
+import logging
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+from ..models.models import Client
+from ..database.database import db
+from ..database.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+def normalize_name(name: str) -> str:
+    return ' '.join(name.casefold().split())
+
+class ClientIndex:
+    """In-memory index of clients for prefix autocomplete.
+
+    Clients are kept in a list sorted by (normalized name, location), so a prefix
+    search is a binary search followed by a short scan.
+    """
+
+    def __init__(self, database: Storage, sync_interval: float):
+        self.db = database
+        self.sync_interval = sync_interval
+        self._keys: List[Tuple[str, str]] = []
+        self._clients: Dict[Tuple[str, str], Client] = {}
+        self._by_id: Dict[int, Client] = {}
+        self._last_id = 0
+        self._provisional_ids = 0
+        self._syncer: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _put(self, client: Client) -> bool:
+        """Store a client, returning whether its key is new to the sorted list."""
+        key = (normalize_name(client.name), client.location)
+        previous = self._clients.get(key)
+        # A provisional entry is replaced once the client's row is synced, and
+        # its negative id is dropped with it
+        if previous is not None and previous.id < 0 < client.id:
+            del self._by_id[previous.id]
+        self._clients[key] = client
+        self._by_id[client.id] = client
+        self._last_id = max(self._last_id, client.id)
+        return previous is None
+
+    def add(self, client: Client) -> None:
+        if self._put(client):
+            insort(self._keys, (normalize_name(client.name), client.location))
+
+    def note_order(self, name: str, username: Optional[str], location: str) -> None:
+        """Make a new client suggestible as soon as their first order is confirmed."""
+        if self.find(name, location) is None:
+            self._provisional_ids -= 1
+            self.add(Client(self._provisional_ids, name, username, location))
+
+    def find(self, name: str, location: str) -> Optional[Client]:
+        return self._clients.get((normalize_name(name), location))
+
+    def get(self, client_id: int) -> Optional[Client]:
+        return self._by_id.get(client_id)
+
+    def search(self, prefix: str, limit: int = 8) -> List[Client]:
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return []
+        matches = []
+        index = bisect_left(self._keys, (prefix, ''))
+        while index < len(self._keys) and len(matches) < limit:
+            key = self._keys[index]
+            if not key[0].startswith(prefix):
+                break
+            matches.append(self._clients[key])
+            index += 1
+        return matches
+
+    async def sync(self) -> int:
+        """Add clients created since the last sync, by this or any other process.
+
+        Client ids are not committed in order (concurrent workers, imports), so a
+        client can appear with an id below the highest one seen. Clients created
+        since yesterday are therefore read again on every sync.
+        """
+        clients = await self.db.get_clients(after_id=self._last_id, recent=self._last_id > 0)
+        new = [self._put(Client(*row)) for row in clients]
+        # One sort is far cheaper than an insort per client on the initial load
+        if any(new):
+            self._keys = sorted(self._clients)
+        return sum(new)
+
+    async def start(self) -> None:
+        loaded = await self.sync()
+        logger.info(f"Client index loaded ({loaded} clients)")
+        self._syncer = asyncio.create_task(self._sync_periodically())
+
+    async def stop(self) -> None:
+        if self._syncer:
+            self._syncer.cancel()
+            try:
+                await self._syncer
+            except asyncio.CancelledError:
+                pass
+            self._syncer = None
+
+    async def _sync_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning(f"Client index sync failed: {e}")
+
+# Initialize client index instance
+client_index = ClientIndex(db, sync_interval=float(os.getenv('CLIENT_SYNC_INTERVAL', '60')))
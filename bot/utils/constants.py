@@ -1,7 +1,10 @@
 import os
+from functools import lru_cache
+from typing import List, Optional, Set, Tuple
 
 # Conversation states
 NAME, LOCATION, PRODUCT_SELECTION, QUANTITY = range(4)
+STATE_NAMES = {NAME: 'NAME', LOCATION: 'LOCATION', PRODUCT_SELECTION: 'PRODUCT_SELECTION', QUANTITY: 'QUANTITY'}
 
 # Emojis for UI elements
 EMOJIS = {
@@ -29,13 +32,39 @@ BUILDINGS = {
     'Genuez': '🏡'
 }
 
-# Initialize authorized users from environment variables
-AUTHORIZED_USERS_IDS = set()
-AUTHORIZED_USERS_USERNAMES = set()
+def _parse_users(value: str):
+    """Split a comma separated list into numeric ids and @usernames."""
+    ids, usernames = set(), set()
+    for user in value.split(','):
+        user = user.strip()
+        if user.startswith('@'):
+            usernames.add(user.lower())
+        elif user.isdigit():
+            ids.add(int(user))
+    return ids, usernames
 
-for user in os.getenv('AUTHORIZED_USERS', '').split(','):
-    user = user.strip()
-    if user.startswith('@'):
-        AUTHORIZED_USERS_USERNAMES.add(user.lower())
-    elif user.isdigit():
-        AUTHORIZED_USERS_IDS.add(int(user)) 
\ No newline at end of file
+# Access lists are read from the environment on first use rather than at import,
+# so importing the bot doesn't depend on the environment being loaded yet
+
+@lru_cache(maxsize=None)
+def authorized_users() -> Tuple[Set[int], Set[str]]:
+    """Ids and @usernames of the users in AUTHORIZED_USERS."""
+    return _parse_users(os.getenv('AUTHORIZED_USERS', ''))
+
+@lru_cache(maxsize=None)
+def admin_users() -> Tuple[Set[int], Set[str]]:
+    """Ids and @usernames of the users in ADMIN_USERS, who may run maintenance commands such as /reload_catalog."""
+    return _parse_users(os.getenv('ADMIN_USERS', ''))
+
+@lru_cache(maxsize=None)
+def daily_summary_chat_ids() -> List[int]:
+    """Chats receiving the daily summary (group ids are negative); defaults to the admins."""
+    return [
+        int(chat_id) for chat_id in os.getenv('DAILY_SUMMARY_CHAT_IDS', '').split(',') if chat_id.strip()
+    ] or sorted(admin_users()[0])
+
+@lru_cache(maxsize=None)
+def order_feed_chat_id() -> Optional[int]:
+    """Chat receiving the digests of new orders (ORDER_FEED_CHAT_ID); None disables the feed."""
+    chat_id = os.getenv('ORDER_FEED_CHAT_ID', '').strip()
+    return int(chat_id) if chat_id else None
@@ -1,24 +1,23 @@
-from typing import Dict, Tuple
-from ..models.models import CartItem
+from datetime import date
+from decimal import Decimal
+from typing import List, Tuple
+from ..models.models import Cart, from_minor_units, format_money
 from .constants import EMOJIS
 
-def format_cart_text(cart: Dict[str, CartItem]) -> Tuple[str, float]:
+def format_cart_lines(cart: Cart) -> Tuple[str, Decimal]:
+    """Format cart contents and total, without a call to action."""
+    cart_text = f"{EMOJIS['CART']} Cart:\n" + "\n".join(cart.lines())
+    cart_text += f"\n\n{EMOJIS['MONEY']} Total: ₴{format_money(cart.total)}"
+    return cart_text, from_minor_units(cart.total)
+
+def format_cart_text(cart: Cart) -> Tuple[str, Decimal]:
     """Format cart contents and calculate total."""
-    total = 0
-    cart_lines = []
-    
-    for item in cart.values():
-        subtotal = item.quantity * item.price
-        total += subtotal
-        cart_lines.append(f"• {item.name}: {item.quantity} × ₴{item.price} = ₴{subtotal}")
-    
-    cart_text = f"{EMOJIS['CART']} Cart:\n" + "\n".join(cart_lines)
-    cart_text += f"\n\n{EMOJIS['MONEY']} Total: ₴{total:.2f}"
+    cart_text, total = format_cart_lines(cart)
     cart_text += f"\n\n{EMOJIS['ARROW']} Select more products or confirm order:"
     
     return cart_text, total
 
-def format_order_confirmation(client_name: str, location: str, cart: Dict[str, CartItem]) -> str:
+def format_order_confirmation(client_name: str, location: str, cart: Cart) -> str:
     """Format order confirmation message."""
     cart_text, total_price = format_cart_text(cart)
     return (
@@ -37,4 +36,35 @@ def format_statistics_caption(total_revenue: float, total_cost: float, total_pro
         f'{EMOJIS["MONEY"]} Total Revenue: ₴{total_revenue:.2f}\n'
         f'{EMOJIS["SHOPPING"]} Total Cost: ₴{total_cost:.2f}\n'
         f'{EMOJIS["STATS"]} Total Profit: ₴{total_profit:.2f}'
-    ) 
\ No newline at end of file
+    )
+
+
+def format_daily_summary(day: date, rows: List[Tuple]) -> str:
+    """Format the per-location summary of one day."""
+    if not rows:
+        return f"{EMOJIS['STATS']} Daily summary for {day:%Y-%m-%d}: no orders."
+    lines = [f"{EMOJIS['STATS']} Daily summary for {day:%Y-%m-%d}:"]
+    for location, quantity, revenue, profit in rows:
+        lines.append(f"{EMOJIS['LOCATION']} {location}: {quantity} pcs, ₴{revenue:.2f} revenue, ₴{profit:.2f} profit")
+    lines.append(
+        f"{EMOJIS['MONEY']} Total: {sum(row[1] for row in rows)} pcs, "
+        f"₴{sum(row[2] for row in rows):.2f} revenue, ₴{sum(row[3] for row in rows):.2f} profit"
+    )
+    return '\n'.join(lines)
+
+def format_client_history(client_name: str, location: str, rows: List[Tuple]) -> str:
+    """Format one page of a client's order lines."""
+    lines = [f"{EMOJIS['PERSON']} {client_name} · {location}"]
+    if not rows:
+        lines.append(f"{EMOJIS['PACKAGE']} No orders yet.")
+    for order_id, created_at, product_name, quantity, total_price in rows:
+        lines.append(f"{created_at:%Y-%m-%d} #{order_id}: {product_name} × {quantity} = ₴{total_price:.2f}")
+    return '\n'.join(lines)
+
+def format_order_digest(entries: List[Tuple]) -> str:
+    """Format a batch of new orders for the order feed chat."""
+    lines = [f"{EMOJIS['SHOPPING']} {len(entries)} new order{'s' if len(entries) != 1 else ''}:"]
+    for order_id, client_name, location, total in entries:
+        lines.append(f"#{order_id} {client_name} · {location}: ₴{total:.2f}")
+    lines.append(f"{EMOJIS['MONEY']} Total: ₴{sum(entry[3] for entry in entries):.2f}")
+    return '\n'.join(lines)
@@ -0,0 +1,151 @@
+import io
+import time
+import cProfile
+import pstats
+import functools
+from typing import Dict, Optional, Tuple
+from telegram import Bot, Update
+from telegram.ext import Application, BaseHandler, ConversationHandler
+from telegram.request import HTTPXRequest
+from .constants import STATE_NAMES
+from .metrics import registry, Gauge, HANDLER_LATENCY, HANDLER_ERRORS, API_LATENCY, API_ERRORS
+
+# Current state of every order conversation, keyed like the ConversationHandler (chat, user)
+_conversation_states: Dict[Tuple[int, int], object] = {}
+
+def _conversations_by_state() -> Dict[str, int]:
+    counts = {name: 0 for name in STATE_NAMES.values()}
+    for state in _conversation_states.values():
+        if state in STATE_NAMES:
+            counts[STATE_NAMES[state]] += 1
+    return counts
+
+registry.register(Gauge(
+    'bot_conversations_in_flight', 'Order conversations currently in each state.', 'state', _conversations_by_state))
+
+class Profiler:
+    """cProfile session covering the handlers of the next N updates."""
+
+    def __init__(self):
+        self._profile: Optional[cProfile.Profile] = None
+        self._remaining = 0
+        self._active = 0
+        self._chat_id: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._profile is not None
+
+    def start(self, updates: int, chat_id: int) -> bool:
+        if self.running:
+            return False
+        self._profile = cProfile.Profile()
+        self._remaining = updates
+        self._active = 0
+        self._chat_id = chat_id
+        return True
+
+    def enter(self) -> Optional[cProfile.Profile]:
+        if self._profile is None:
+            return None
+        # Handlers interleave on the event loop; profile while any of them is running
+        if self._active == 0:
+            self._profile.enable()
+        self._active += 1
+        return self._profile
+
+    async def exit(self, profile: cProfile.Profile, bot: Bot) -> None:
+        if profile is not self._profile:
+            return
+        self._active -= 1
+        if self._active == 0:
+            profile.disable()
+        self._remaining -= 1
+        if self._remaining > 0:
+            return
+
+        if self._active:
+            profile.disable()
+        chat_id, self._profile, self._chat_id = self._chat_id, None, None
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(60)
+        await bot.send_document(
+            chat_id=chat_id,
+            document=output.getvalue().encode(),
+            filename=f'profile_{int(time.time())}.txt',
+            caption='Profile of the last updates, sorted by cumulative time'
+        )
+
+profiler = Profiler()
+
+async def seed_conversation_states(application: Application) -> None:
+    """Count the conversations restored from persistence, which no handler has returned yet."""
+    if not application.persistence:
+        return
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler) and handler.persistent:
+                conversations = await application.persistence.get_conversations(handler.name)
+                _conversation_states.update(conversations)
+
+def _instrument_handler(handler: BaseHandler, conversation: bool, timeout: bool = False) -> None:
+    callback = handler.callback
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update: object, context):
+        profile = profiler.enter()
+        started = time.perf_counter()
+        try:
+            result = await callback(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(name, time.perf_counter() - started)
+            if profile:
+                await profiler.exit(profile, context.bot)
+
+        if conversation and isinstance(update, Update) and update.effective_chat and update.effective_user:
+            key = (update.effective_chat.id, update.effective_user.id)
+            # A timed out conversation ends whatever its timeout handler returns
+            if timeout or result == ConversationHandler.END:
+                _conversation_states.pop(key, None)
+            elif result is not None:
+                _conversation_states[key] = result
+        return result
+
+    handler.callback = wrapper
+
+def instrument_application(application: Application) -> None:
+    """Record latency and errors of every registered handler callback."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                nested = list(handler.entry_points) + list(handler.fallbacks)
+                for state, state_handlers in handler.states.items():
+                    if state != ConversationHandler.TIMEOUT:
+                        nested.extend(state_handlers)
+                for conversation_handler in nested:
+                    _instrument_handler(conversation_handler, conversation=True)
+                for timeout_handler in handler.states.get(ConversationHandler.TIMEOUT, []):
+                    _instrument_handler(timeout_handler, conversation=True, timeout=True)
+            else:
+                _instrument_handler(handler, conversation=False)
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest recording the latency and failures of each Bot API endpoint."""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        endpoint = url.rstrip('/').rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            API_ERRORS.inc(endpoint)
+            raise
+        finally:
+            API_LATENCY.observe(endpoint, time.perf_counter() - started)
+        if code >= 400:
+            API_ERRORS.inc(endpoint)
+        return code, payload
@@ -1,6 +1,6 @@
-from typing import List
+from typing import List, Optional, Sequence
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from ..models.models import Product
+from ..models.models import Client, Product
 from .constants import EMOJIS, BUILDINGS
 
 def create_product_keyboard(products: List[Product], show_confirm: bool = False) -> InlineKeyboardMarkup:
@@ -20,9 +20,16 @@ def create_product_keyboard(products: List[Product], show_confirm: bool = False)
     
     return InlineKeyboardMarkup(keyboard)
 
-def create_location_keyboard() -> InlineKeyboardMarkup:
-    """Create a keyboard with location buttons."""
+def create_location_keyboard(clients: Sequence[Client] = ()) -> InlineKeyboardMarkup:
+    """Create a keyboard with location buttons, preceded by matching existing clients."""
     keyboard = [
+        [InlineKeyboardButton(
+            f"{EMOJIS['PERSON']} {client.name}{f' {client.username}' if client.username else ''} · {client.location}",
+            callback_data=f'client:{client.id}'
+        )]
+        for client in clients
+    ]
+    keyboard += [
         [InlineKeyboardButton(
             f"{BUILDINGS[location]} {location}",
             callback_data=location
@@ -31,6 +38,25 @@ def create_location_keyboard() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
+def create_history_clients_keyboard(clients: Sequence[Client]) -> InlineKeyboardMarkup:
+    """Create a keyboard to pick whose order history to show."""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(
+            f"{EMOJIS['PERSON']} {client.name}{f' {client.username}' if client.username else ''} · {client.location}",
+            callback_data=f'history:{client.id}'
+        )]
+        for client in clients
+    ])
+
+def create_history_keyboard(newer: Optional[str], older: Optional[str]) -> Optional[InlineKeyboardMarkup]:
+    """Create the paging buttons of an order history page from their callback data."""
+    buttons = []
+    if newer:
+        buttons.append(InlineKeyboardButton("◀️ Newer", callback_data=newer))
+    if older:
+        buttons.append(InlineKeyboardButton("Older ▶️", callback_data=older))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
 def create_main_menu_keyboard() -> InlineKeyboardMarkup:
     """Create the main menu keyboard."""
     keyboard = [
@@ -0,0 +1,169 @@
+import time
+import asyncio
+import inspect
+import logging
+import functools
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Histogram:
+    def __init__(self, name: str, help: str, label: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        # label value -> (per-bucket counts, sum, count)
+        self._series: Dict[str, List] = {}
+
+    def observe(self, label_value: str, value: float) -> None:
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_value, (counts, total, count) in sorted(self._series.items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label}}} {total}')
+            lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+class Counter:
+    def __init__(self, name: str, help: str, label: str):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values: Dict[str, float] = {}
+
+    def inc(self, label_value: str, amount: float = 1) -> None:
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for label_value, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{{{self.label}="{_escape(label_value)}"}} {value}')
+        return lines
+
+class Gauge:
+    """Gauge whose values are computed by a callback at scrape time."""
+
+    def __init__(self, name: str, help: str, label: str, collect: Callable[[], Dict[str, float]]):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        for label_value, value in sorted(self.collect().items()):
+            lines.append(f'{self.name}{{{self.label}="{_escape(label_value)}"}} {value}')
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics: List = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+registry = Registry()
+
+HANDLER_LATENCY = registry.register(Histogram(
+    'bot_handler_duration_seconds', 'Time spent in update handlers.', 'handler'))
+HANDLER_ERRORS = registry.register(Counter(
+    'bot_handler_errors_total', 'Exceptions raised by update handlers.', 'handler'))
+DB_LATENCY = registry.register(Histogram(
+    'bot_db_query_duration_seconds', 'Time spent in Database methods.', 'method'))
+DB_ERRORS = registry.register(Counter(
+    'bot_db_errors_total', 'Exceptions raised by Database methods.', 'method'))
+DB_REPORTING_READS = registry.register(Counter(
+    'bot_db_reporting_reads_total', 'Reporting queries by the server that ran them, with a read replica configured.', 'server'))
+API_LATENCY = registry.register(Histogram(
+    'bot_api_request_duration_seconds', 'Time spent in outbound Bot API requests.', 'endpoint'))
+API_ERRORS = registry.register(Counter(
+    'bot_api_errors_total', 'Failed outbound Bot API requests.', 'endpoint'))
+
+def timed(histogram: Histogram, errors: Counter, label: Optional[str] = None):
+    """Decorator recording the latency and errors of a coroutine or async generator function."""
+    def decorator(fn):
+        name = label or fn.__name__
+
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    async for item in fn(*args, **kwargs):
+                        yield item
+                except Exception:
+                    errors.inc(name)
+                    raise
+                finally:
+                    histogram.observe(name, time.perf_counter() - started)
+            return wrapper
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                errors.inc(name)
+                raise
+            finally:
+                histogram.observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+async def _handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                       routes: Dict[str, Callable[[], Tuple[int, str]]]) -> None:
+    try:
+        request_line = await reader.readline()
+        # Skip the headers, nothing in them is needed
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        parts = request_line.decode('latin-1').split()
+        path = parts[1].split('?')[0] if len(parts) > 1 else '/'
+        route = routes.get(path)
+        status, body = route() if route else (404, 'not found\n')
+        payload = body.encode()
+        reason = {200: 'OK', 404: 'Not Found', 503: 'Service Unavailable'}.get(status, 'OK')
+        writer.write(
+            f'HTTP/1.1 {status} {reason}\r\n'
+            f'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+            f'Content-Length: {len(payload)}\r\n'
+            f'Connection: close\r\n\r\n'.encode() + payload
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.warning(f"Error serving metrics request: {e}")
+    finally:
+        writer.close()
+
+async def start_http_server(host: str, port: int, routes: Dict[str, Callable[[], Tuple[int, str]]]) -> asyncio.AbstractServer:
+    """Serve plain-text GET endpoints, e.g. {'/metrics': lambda: (200, registry.render())}."""
+    server = await asyncio.start_server(lambda r, w: _handle_http(r, w, routes), host, port)
+    logger.info(f"Serving {', '.join(routes)} on http://{host}:{port}")
+    return server
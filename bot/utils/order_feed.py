@@ -0,0 +1,163 @@
+import os
+import json
+import asyncio
+import logging
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import psycopg
+from telegram import Bot
+from ..database.database import db
+from ..database.storage import Storage
+from .constants import order_feed_chat_id
+from .formatters import format_order_digest
+
+logger = logging.getLogger(__name__)
+
+# Channel notified by the order_feed trigger (migration 0006)
+FEED_CHANNEL = 'order_feed'
+
+class OrderFeed:
+    """Announces new orders in a chat, as digests of up to `max_orders` orders
+    sent at most `interval` seconds after the first of them arrived.
+
+    save_order queues each order in the order_feed table, whose trigger NOTIFYs
+    the row. An entry is deleted once its digest has been sent, so whatever is
+    left in the table on (re)connect, including after a restart, is sent next.
+    Delivery is at least once: a digest whose entries could not be deleted
+    (the bot died or the database failed right after sending) is sent again.
+    """
+
+    def __init__(self, database: Storage, interval: float, max_orders: int):
+        self.db = database
+        self.interval = interval
+        self.max_orders = max_orders
+        self.chat_id: Optional[int] = None
+        self.bot: Optional[Bot] = None
+        # Entries waiting for a digest, by feed id
+        self._pending: Dict[int, Tuple] = {}
+        # Sent, but not yet deleted from the table
+        self._sent: Set[int] = set()
+        # Ids read by the last load whose notification may still be on its way
+        self._loaded: Set[int] = set()
+        self._reload = False
+        # A load never overlaps a flush, so it can't re-queue entries being acknowledged
+        self._lock = asyncio.Lock()
+        self._arrived = asyncio.Event()
+        self._full = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def add(self, entries: Iterable[Tuple]) -> None:
+        """Queue (feed id, order_id, client_name, location, total) entries, once each."""
+        for feed_id, *entry in entries:
+            if feed_id not in self._sent:
+                self._pending.setdefault(feed_id, tuple(entry))
+        if self._pending:
+            self._arrived.set()
+        if len(self._pending) >= self.max_orders:
+            self._full.set()
+
+    def _wake(self) -> None:
+        # Backends without NOTIFY only signal that entries were queued
+        self._reload = True
+        self._arrived.set()
+
+    async def load(self) -> None:
+        """Queue the entries left in the table."""
+        async with self._lock:
+            entries = await self.db.get_order_feed()
+            self._loaded = {entry[0] for entry in entries}
+            self.add(entries)
+
+    async def _notified(self, entry: Tuple) -> None:
+        async with self._lock:
+            # A row committed between LISTEN and the load is both loaded and
+            # notified; by now it may have been sent and deleted already
+            if entry[0] in self._loaded:
+                self._loaded.discard(entry[0])
+                return
+            self.add([entry])
+
+    async def start(self, bot: Bot) -> None:
+        self.chat_id = order_feed_chat_id()
+        if self.chat_id is None:
+            return
+        self.bot = bot
+        if self.db.notifies:
+            self._tasks.append(asyncio.create_task(self._listen()))
+        else:
+            self.db.on_feed = self._wake
+            await self.load()
+        self._tasks.append(asyncio.create_task(self._send_digests()))
+
+    async def stop(self) -> None:
+        # Entries not sent yet stay in the table for the next start
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def _listen(self) -> None:
+        """Queue every entry NOTIFYed by the order_feed trigger."""
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    self.db.DATABASE_URL, autocommit=True, application_name='chip_order_bot_feed'
+                ) as conn:
+                    await conn.execute(f"LISTEN {FEED_CHANNEL}")
+                    # Entries queued while nobody was listening; anything newer is notified
+                    await self.load()
+                    async for notify in conn.notifies():
+                        await self._notified(json.loads(notify.payload, parse_float=Decimal))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Order feed listener disconnected: {e}")
+                await asyncio.sleep(5)
+
+    async def _send_digests(self) -> None:
+        while True:
+            await self._arrived.wait()
+            # Give more orders until the interval is over to join this digest
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Order feed flush failed, retrying in {self.interval:g}s: {e}")
+                self._arrived.set()
+                await asyncio.sleep(self.interval)
+
+    async def flush(self) -> None:
+        """Send everything pending, max_orders per message, then drop it from the table."""
+        async with self._lock:
+            if self._reload:
+                self._reload = False
+                self.add(await self.db.get_order_feed())
+            self._arrived.clear()
+            self._full.clear()
+            while self._pending:
+                feed_ids = sorted(self._pending)[:self.max_orders]
+                await self.bot.send_message(
+                    chat_id=self.chat_id, text=format_order_digest([self._pending[feed_id] for feed_id in feed_ids])
+                )
+                for feed_id in feed_ids:
+                    del self._pending[feed_id]
+                self._sent.update(feed_ids)
+            if self._sent:
+                sent = sorted(self._sent)
+                await self.db.ack_order_feed(sent)
+                self._sent.difference_update(sent)
+
+order_feed = OrderFeed(
+    db,
+    interval=float(os.getenv('ORDER_FEED_INTERVAL', '10')),
+    max_orders=int(os.getenv('ORDER_FEED_MAX_ORDERS', '25'))
+)
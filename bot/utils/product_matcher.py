@@ -0,0 +1,114 @@
+import re
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Set, Tuple
+from ..models.models import Product, MAX_QUANTITY
+
+# A quantity word: "3", "x3", "3x" ("×" and "*" are rewritten to "x" first)
+QUANTITY_WORD = re.compile(r'^(?:x?(\d+)|(\d+)x)$')
+ENTRY_SEPARATORS = re.compile(r'[,;\n]+')
+# Shorter names are only matched exactly or by prefix, a typo would match too much
+MIN_TYPO_LENGTH = 4
+
+def normalize(text: str) -> str:
+    return ' '.join(text.casefold().split())
+
+def _deletions(word: str) -> Set[str]:
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+def _one_edit_apart(a: str, b: str) -> bool:
+    """Whether a and b differ by one insertion, deletion, substitution or swap of neighbours."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    start = 0
+    while start < min(len(a), len(b)) and a[start] == b[start]:
+        start += 1
+    if len(a) == len(b):
+        return (a[start + 1:] == b[start + 1:]
+                or (a[start:start + 2] == b[start:start + 2][::-1] and a[start + 2:] == b[start + 2:]))
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    return shorter[start:] == longer[start + 1:]
+
+class ProductMatcher:
+    """Resolves typed product names against the catalog: by exact name, by an
+    unambiguous prefix, or else by a name one typo away.
+
+    Built once per catalog load. Prefixes are a binary search over the sorted
+    names; typos are looked up by the names' one-letter deletions, so matching
+    never compares against every product.
+    """
+
+    def __init__(self, products: Sequence[Product]):
+        self._exact: Dict[str, Product] = {}
+        self._deletions: Dict[str, List[Tuple[str, Product]]] = {}
+        for product in products:
+            name = normalize(product.name)
+            self._exact[name] = product
+            for variant in _deletions(name) | {name}:
+                self._deletions.setdefault(variant, []).append((name, product))
+        self._names = sorted(self._exact)
+
+    def match(self, text: str) -> List[Product]:
+        """Candidates for a typed name: one when it resolves, several when it is ambiguous."""
+        name = normalize(text)
+        if not name:
+            return []
+        if name in self._exact:
+            return [self._exact[name]]
+
+        index = bisect_left(self._names, name)
+        prefixed = []
+        while index < len(self._names) and self._names[index].startswith(name):
+            prefixed.append(self._exact[self._names[index]])
+            index += 1
+        if prefixed or len(name) < MIN_TYPO_LENGTH:
+            return prefixed
+
+        candidates = {}
+        for variant in _deletions(name) | {name}:
+            for product_name, product in self._deletions.get(variant, ()):
+                if _one_edit_apart(name, product_name):
+                    candidates[product.id] = product
+        return list(candidates.values())
+
+def parse_cart_entry(text: str, matcher: ProductMatcher) -> Tuple[List[Tuple[Product, int]], List[str]]:
+    """Parse a whole cart typed as one message, e.g. `Plastic 3, Leather x2, brac 1`.
+
+    Entries are separated by commas, semicolons or new lines; the quantity comes
+    before or after the name and defaults to 1. Returns the products with their
+    quantities (repeated products added up), or the problem with each entry that
+    could not be used.
+    """
+    quantities: Dict[int, Tuple[Product, int]] = {}
+    errors = []
+    for entry in ENTRY_SEPARATORS.split(text):
+        words = entry.casefold().replace('×', ' x').replace('*', ' x').split()
+        if not words:
+            continue
+        quantity = 1
+        for position in (-1, 0):
+            found = QUANTITY_WORD.match(words[position])
+            if found:
+                quantity = int(found.group(1) or found.group(2))
+                del words[position]
+                # "Leather x 2", "2 x Leather"
+                if words and words[position] == 'x':
+                    del words[position]
+                break
+
+        entry = entry.strip()
+        candidates = matcher.match(' '.join(words))
+        if not words:
+            errors.append(f"\"{entry}\": which product?")
+        elif not candidates:
+            errors.append(f"\"{entry}\": unknown product")
+        elif len(candidates) > 1:
+            errors.append(f"\"{entry}\": did you mean {' or '.join(product.name for product in candidates)}?")
+        elif quantity <= 0:
+            errors.append(f"\"{entry}\": the quantity must be positive")
+        elif quantity > MAX_QUANTITY:
+            errors.append(f"\"{entry}\": the quantity is too large")
+        else:
+            product = candidates[0]
+            previous = quantities.get(product.id, (product, 0))[1]
+            quantities[product.id] = (product, previous + quantity)
+    return list(quantities.values()), errors
@@ -0,0 +1,180 @@
+import os
+import time
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Edits that fully replace what an earlier edit of the same message would set
+MERGEABLE_ENDPOINTS = {'editMessageText', 'editMessageReplyMarkup', 'editMessageCaption'}
+# How often chat buckets that have refilled completely are dropped
+BUCKET_SWEEP_INTERVAL = 60.0
+
+class TokenBucket:
+    """Token bucket handing out reservations: a caller waits for its token instead of polling."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token, returning how long to wait until it is available."""
+        self._refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Push all later reservations back by `seconds`."""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    def full(self, now: float) -> bool:
+        """Whether the bucket has refilled completely, so a new one would behave the same."""
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+class OutboundScheduler(BaseRateLimiter[int]):
+    """Rate limiter for every outbound Bot API call of the application.
+
+    Messages addressed to a chat wait for a token from a global bucket and from
+    the chat's bucket (private chats and groups have separate limits). Edits only
+    wait for the global bucket, and calls without a chat such as callback answers
+    are not limited at all. A newer edit of a message whose previous edit is still
+    waiting for its turn replaces that edit, and both callers get the result of
+    the one call made. Chat buckets that have refilled are dropped. RetryAfter pauses
+    the chat (or all chats, for calls without one) and retries up to
+    `max_retries` times, which can be overridden per call through
+    `rate_limit_args`.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float,
+                 group_rate: float, group_burst: float, max_retries: int):
+        self.global_bucket = TokenBucket(global_rate, burst=global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.stats: Counter = Counter()
+        self._chat_buckets: Dict[Union[int, str], TokenBucket] = {}
+        self._swept = time.monotonic()
+        # (endpoint, chat, message) -> [newest pending edit call, future of its result]
+        self._edits: Dict[Tuple, List] = {}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Negative ids are groups and channels, which have a much lower limit
+            is_group = not isinstance(chat_id, int) or chat_id < 0
+            if is_group:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        if now - self._swept < BUCKET_SWEEP_INTERVAL:
+            return
+        self._swept = now
+        for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items() if bucket.full(now)]:
+            del self._chat_buckets[chat_id]
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict, List[Dict]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict, List[Dict]]:
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            # Callback answers, inline results, getMe, ...: not subject to message limits
+            return await self._call(callback, args, kwargs, endpoint, None, rate_limit_args)
+
+        self._sweep()
+        bucket = self._chat_bucket(chat_id)
+        key = (endpoint, chat_id, data.get('message_id')) if endpoint in MERGEABLE_ENDPOINTS else None
+        if key is None:
+            await self._wait(self.global_bucket, bucket)
+            return await self._call(callback, args, kwargs, endpoint, bucket, rate_limit_args)
+
+        entry = self._edits.get(key)
+        if entry is not None:
+            # An edit of this message is still waiting for its turn: send this one in its place
+            entry[0] = (callback, args, kwargs, rate_limit_args)
+            self.stats['merged'] += 1
+            return await asyncio.shield(entry[1])
+
+        entry = self._edits[key] = [(callback, args, kwargs, rate_limit_args), asyncio.get_running_loop().create_future()]
+        try:
+            # Edits do not count against the chat's message limit
+            await self._wait(self.global_bucket)
+            del self._edits[key]
+            callback, args, kwargs, rate_limit_args = entry[0]
+            result = await self._call(callback, args, kwargs, endpoint, bucket, rate_limit_args)
+        except BaseException as e:
+            if self._edits.get(key) is entry:
+                del self._edits[key]
+            entry[1].set_exception(e)
+            # Mark the exception as retrieved in case no merged edit is waiting
+            entry[1].exception()
+            raise
+        entry[1].set_result(result)
+        return result
+
+    async def _wait(self, *buckets: TokenBucket) -> None:
+        delay = max(bucket.reserve() for bucket in buckets)
+        if delay:
+            self.stats['delayed'] += 1
+            await asyncio.sleep(delay)
+
+    async def _call(self, callback, args, kwargs, endpoint: str, bucket: Optional[TokenBucket],
+                    rate_limit_args: Optional[int]):
+        max_retries = self.max_retries if rate_limit_args is None else rate_limit_args
+        attempt = 0
+        while True:
+            try:
+                self.stats['sent'] += 1
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt >= max_retries:
+                    raise
+                attempt += 1
+                self.stats['retried'] += 1
+                retry_after = float(e.retry_after)
+                logger.warning(f"Flood limit hit on {endpoint}, retrying in {retry_after}s (attempt {attempt})")
+                (bucket or self.global_bucket).pause(retry_after)
+                await asyncio.sleep(retry_after)
+
+def create_rate_limiter() -> OutboundScheduler:
+    # Defaults follow Telegram's documented limits: about 30 messages/s overall,
+    # 1 message/s per private chat on average with short bursts allowed, and
+    # 20 messages/minute per group
+    return OutboundScheduler(
+        global_rate=float(os.getenv('OUTBOUND_GLOBAL_RATE', '30')),
+        chat_rate=float(os.getenv('OUTBOUND_CHAT_RATE', '1')),
+        chat_burst=float(os.getenv('OUTBOUND_CHAT_BURST', '10')),
+        group_rate=float(os.getenv('OUTBOUND_GROUP_RATE', str(20 / 60))),
+        group_burst=float(os.getenv('OUTBOUND_GROUP_BURST', '20')),
+        max_retries=int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))
+    )
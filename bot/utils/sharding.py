@@ -0,0 +1,357 @@
+"""
+Multi-process deployment: a front process receives the webhook and forwards each
+update over a Unix socket to one of N worker processes, each running the full
+bot. Updates are routed by consistent hashing, so a user's conversation always
+lives in the same worker.
+
+Frames on the sockets are a 4-byte big-endian length followed by JSON:
+{"update": {...}} and {"drain": n} from the front, {"drained": n} from a worker.
+"""
+import os
+import json
+import struct
+import signal
+import asyncio
+import hashlib
+import logging
+from bisect import bisect
+from typing import Dict, List, Optional, Sequence
+from telegram import Bot, Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct('>I')
+
+async def write_frame(writer: asyncio.StreamWriter, payload: Dict) -> None:
+    data = json.dumps(payload, separators=(',', ':')).encode()
+    writer.write(FRAME_HEADER.pack(len(data)) + data)
+    await writer.drain()
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Dict]:
+    try:
+        size, = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+        return json.loads(await reader.readexactly(size))
+    except asyncio.IncompleteReadError:
+        return None
+
+def routing_key(update: Dict) -> Optional[int]:
+    """Shard key of a raw update: its user, else its chat.
+
+    Conversation states are keyed by (chat, user) and carts live in user_data,
+    which is per user, so all updates of one user must reach the same worker.
+    """
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        user = value.get('from') or value.get('user')
+        if isinstance(user, dict) and 'id' in user:
+            return user['id']
+        chat = value.get('chat') or (value.get('message') or {}).get('chat')
+        if isinstance(chat, dict) and 'id' in chat:
+            return chat['id']
+    return None
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+class HashRing:
+    """Consistent hash ring with virtual nodes: adding or removing a worker only
+    moves the keys of the ring segments that worker owns."""
+
+    def __init__(self, nodes: Sequence[str], replicas: int = 100):
+        points = sorted((_hash(f'{node}#{replica}'), node) for node in nodes for replica in range(replicas))
+        self.hashes = [point for point, _ in points]
+        self.nodes = [node for _, node in points]
+
+    def node_for_hash(self, point: int) -> str:
+        return self.nodes[bisect(self.hashes, point) % len(self.hashes)]
+
+    def node(self, key: object) -> str:
+        return self.node_for_hash(_hash(str(key)))
+
+    def points(self, node: str) -> List[int]:
+        return [point for point, owner in zip(self.hashes, self.nodes) if owner == node]
+
+# Worker side
+
+async def drain_application(application: Application) -> None:
+    """Wait until every update received so far is processed and its state written."""
+    await application.update_queue.join()
+    if application.persistence:
+        await application.update_persistence()
+        await application.persistence.sync()
+
+async def run_worker(application: Application, socket_path: str) -> None:
+    """Run the application, fed by the front over a Unix socket, until SIGTERM."""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        while (frame := await read_frame(reader)) is not None:
+            if 'update' in frame:
+                await application.update_queue.put(Update.de_json(frame['update'], application.bot))
+            elif 'drain' in frame:
+                await drain_application(application)
+                await write_frame(writer, {'drained': frame['drain']})
+        writer.close()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(handle, socket_path)
+    logger.info(f"Worker listening on {socket_path}")
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        # Application.stop processes the queued updates and flushes persistence
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+# Front side
+
+class WorkerProcess:
+    """A worker process and the queue of frames to forward to it.
+
+    The queue outlives the process, so updates routed while a worker restarts
+    are delivered to the new process.
+    """
+
+    def __init__(self, name: str, command: List[str], socket_path: str, env: Dict[str, str]):
+        self.name = name
+        self.command = command
+        self.socket_path = socket_path
+        self.env = env
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._sender: Optional[asyncio.Task] = None
+        # Frame taken off the queue and not yet fully handed to the worker
+        self._in_flight: Optional[Dict] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self._drains: Dict[int, asyncio.Future] = {}
+        self._drain_ids = 0
+
+    async def start(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command, '--socket', self.socket_path, env=self.env,
+            # Own session, so a Ctrl-C in the front's terminal doesn't reach the workers
+            start_new_session=True
+        )
+        logger.info(f"Started {self.name} (pid {self.process.pid})")
+        self._sender = asyncio.create_task(self._send())
+        self._watcher = asyncio.create_task(self._watch(self.process))
+
+    async def _connect(self):
+        while True:
+            if self.process.returncode is not None:
+                raise RuntimeError(f"{self.name} exited with code {self.process.returncode}")
+            try:
+                return await asyncio.open_unix_connection(self.socket_path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(0.1)
+
+    async def _send(self) -> None:
+        """Forward queued frames, reconnecting after an error with the frame in flight first."""
+        while True:
+            try:
+                await self._forward()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Forwarding to {self.name} failed, reconnecting: {e}")
+                frame, self._in_flight = self._in_flight, None
+                self._requeue(frame)
+                await asyncio.sleep(0.5)
+
+    async def _forward(self) -> None:
+        reader, writer = await self._connect()
+        try:
+            while True:
+                frame = self._in_flight = await self.queue.get()
+                await write_frame(writer, frame)
+                if 'drain' in frame:
+                    reply = await read_frame(reader)
+                    if reply is None:
+                        raise ConnectionError(f"{self.name} closed the connection while draining")
+                    # A drain resolved by a restart meanwhile has nobody waiting any more
+                    done = self._drains.pop(reply['drained'], None)
+                    if done is not None and not done.done():
+                        done.set_result(None)
+                self._in_flight = None
+        finally:
+            writer.close()
+
+    async def _watch(self, process: asyncio.subprocess.Process) -> None:
+        code = await process.wait()
+        if process is self.process:
+            # Crashed rather than stopped: restart it; its conversations are reloaded from persistence
+            logger.error(f"{self.name} exited unexpectedly with code {code}, restarting")
+            self._sender.cancel()
+            try:
+                await self._sender
+            except (asyncio.CancelledError, Exception):
+                pass
+            # The update being written when the worker died goes to the new process
+            # first. Drains are resolved below, so their frames are dropped.
+            frame, self._in_flight = self._in_flight, None
+            self._requeue(frame, keep_drains=False)
+            # Whatever the worker persisted is all there is; don't leave drains waiting
+            for done in self._drains.values():
+                if not done.done():
+                    done.set_result(None)
+            self._drains.clear()
+            await self.start()
+
+    def _requeue(self, first: Optional[Dict] = None, keep_drains: bool = True) -> None:
+        """Put `first` back at the head of the queue, dropping drain frames unless `keep_drains`."""
+        pending = [first] if first is not None else []
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for frame in pending:
+            if keep_drains or 'drain' not in frame:
+                self.queue.put_nowait(frame)
+
+    def forward(self, update: Dict) -> None:
+        self.queue.put_nowait({'update': update})
+
+    async def drain(self) -> None:
+        """Wait until the worker has processed everything forwarded so far and written its state."""
+        self._drain_ids += 1
+        done = self._drains[self._drain_ids] = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait({'drain': self._drain_ids})
+        await done
+
+    async def stop(self) -> None:
+        await self.drain()
+        process, self.process = self.process, None
+        self._sender.cancel()
+        self._watcher.cancel()
+        process.send_signal(signal.SIGTERM)
+        await process.wait()
+        logger.info(f"Stopped {self.name}")
+
+class ShardFront:
+    """Routes updates to worker processes and rebalances them when their number changes."""
+
+    def __init__(self, worker_command: List[str], socket_dir: str):
+        self.worker_command = worker_command
+        self.socket_dir = socket_dir
+        self.workers: Dict[str, WorkerProcess] = {}
+        self.ring: Optional[HashRing] = None
+        # Updates received during a rebalance, routed once the new ring is in place
+        self._held: Optional[List[Dict]] = None
+        self._lock = asyncio.Lock()
+
+    def _create_worker(self, index: int) -> WorkerProcess:
+        name = f'worker-{index}'
+        env = dict(os.environ, SHARD_WORKER=name)
+        # Each worker needs its own order journal, and its own metrics port if metrics are enabled
+        env['ORDER_JOURNAL_PATH'] = f"{os.getenv('ORDER_JOURNAL_PATH', 'orders.journal')}.{name}"
+        if os.getenv('METRICS_PORT'):
+            env['METRICS_PORT'] = str(int(os.environ['METRICS_PORT']) + 1 + index)
+        return WorkerProcess(name, self.worker_command, os.path.join(self.socket_dir, f'{name}.sock'), env)
+
+    def route(self, update: Dict) -> None:
+        if self._held is not None:
+            self._held.append(update)
+            return
+        key = routing_key(update)
+        self.workers[self.ring.node(key if key is not None else update.get('update_id'))].forward(update)
+
+    async def scale(self, count: int) -> None:
+        """Change the number of workers, moving conversations between them cleanly.
+
+        All workers finish and persist what they were sent first. Removed workers
+        are stopped, and remaining workers that take over users of a removed one
+        are restarted so they load those conversations from persistence.
+        """
+        async with self._lock:
+            names = [f'worker-{index}' for index in range(max(count, 1))]
+            if self.ring is not None and sorted(self.workers) == sorted(names):
+                return
+            old_ring, new_ring = self.ring, HashRing(names)
+            self._held = []
+            try:
+                await asyncio.gather(*(worker.drain() for worker in self.workers.values()))
+
+                removed = [worker for name, worker in self.workers.items() if name not in names]
+                gaining = {
+                    new_ring.node_for_hash(point)
+                    for worker in removed for point in old_ring.points(worker.name)
+                }
+                await asyncio.gather(*(worker.stop() for worker in removed))
+                for worker in removed:
+                    del self.workers[worker.name]
+                for name in gaining:
+                    await self.workers[name].stop()
+                    await self.workers[name].start()
+
+                for index, name in enumerate(names):
+                    if name not in self.workers:
+                        self.workers[name] = self._create_worker(index)
+                        await self.workers[name].start()
+                self.ring = new_ring
+            finally:
+                held, self._held = self._held, None
+                for update in held:
+                    self.route(update)
+            logger.info(f"Running {len(self.workers)} workers")
+
+    async def stop(self) -> None:
+        async with self._lock:
+            await asyncio.gather(*(worker.stop() for worker in self.workers.values()))
+            self.workers.clear()
+
+async def run_front(worker_command: List[str], workers: int, socket_dir: str, listen: str, port: int,
+                    url_path: str, webhook_url: str, secret_token: Optional[str], bot: Bot,
+                    allowed_updates: List[str]) -> None:
+    """Serve the webhook and forward updates to `workers` worker processes.
+
+    SIGUSR1 adds a worker, SIGUSR2 removes one, SIGTERM drains and stops all.
+    """
+    from tornado.web import Application as WebApplication, RequestHandler
+
+    front = ShardFront(worker_command, socket_dir)
+
+    class WebhookHandler(RequestHandler):
+        def post(self) -> None:
+            if secret_token and self.request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret_token:
+                self.set_status(403)
+                return
+            try:
+                update = json.loads(self.request.body)
+            except ValueError:
+                self.set_status(400)
+                return
+            front.route(update)
+
+    os.makedirs(socket_dir, exist_ok=True)
+    await front.scale(workers)
+    server = WebApplication([(rf'/{url_path}/?', WebhookHandler)]).listen(port, address=listen)
+    async with bot:
+        await bot.set_webhook(webhook_url, secret_token=secret_token, allowed_updates=allowed_updates)
+    logger.info(f"Front listening on {listen}:{port}/{url_path}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    loop.add_signal_handler(signal.SIGUSR1, lambda: asyncio.create_task(front.scale(len(front.workers) + 1)))
+    loop.add_signal_handler(signal.SIGUSR2, lambda: asyncio.create_task(front.scale(len(front.workers) - 1)))
+    try:
+        await stop.wait()
+    finally:
+        server.stop()
+        await front.stop()
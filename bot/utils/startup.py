@@ -0,0 +1,48 @@
+import time
+import logging
+from typing import Awaitable, Dict, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+class Startup:
+    """Timing of the startup phases, and readiness once they are done.
+
+    Sequential phases are recorded with mark(), which charges the time since the
+    previous mark; phases run concurrently are wrapped in timed(). The clock
+    starts when this module is imported, which bot.py does first.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+        self._last = self.started
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases[phase] = now - self._last
+        self._last = now
+
+    async def timed(self, phase: str, awaitable: Awaitable[T]) -> T:
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.phases[phase] = time.perf_counter() - started
+
+    def set_ready(self) -> None:
+        self.ready = True
+        self._last = time.perf_counter()
+        logger.info(
+            f"Ready {self._last - self.started:.3f}s after start ("
+            + ', '.join(f"{phase} {seconds:.3f}s" for phase, seconds in self.phases.items()) + ")"
+        )
+
+    def readiness(self) -> Tuple[int, str]:
+        """Response of the /ready endpoint."""
+        return (200, "ready\n") if self.ready else (503, "starting\n")
+
+# Initialize startup instance
+startup = Startup()
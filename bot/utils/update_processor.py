@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+def _chat_key(update: object) -> Optional[int]:
+    if isinstance(update, Update):
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+    return None
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates concurrently while keeping each chat's updates in order.
+
+    Updates from different chats run in parallel up to `max_concurrent_updates`;
+    an update waits for the previous update of the same chat to finish, so the
+    ConversationHandler always sees a chat's messages in the order they arrived.
+    Waiting takes no concurrency slot, so a backlog in one chat never holds up
+    the others.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # Completion future of the most recent update seen for each chat
+        self._tails: Dict[int, asyncio.Future] = {}
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        # Replaces the base class version, which would hold a concurrency slot
+        # while waiting for the chat's previous update: a busy chat would then
+        # take every slot and stall all other chats. The chat's turn is claimed
+        # before the first await, so its updates queue in arrival order.
+        key = _chat_key(update)
+        if key is None:
+            async with self._semaphore:
+                await self.do_process_update(update, coroutine)
+            return
+
+        previous = self._tails.get(key)
+        done = asyncio.get_running_loop().create_future()
+        self._tails[key] = done
+        try:
+            if previous is not None:
+                await asyncio.shield(previous)
+            async with self._semaphore:
+                await self.do_process_update(update, coroutine)
+        finally:
+            done.set_result(None)
+            if self._tails.get(key) is done:
+                del self._tails[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,59 @@
+import unittest
+from bot.models.models import Client
+from bot.utils.client_index import ClientIndex
+
+class FakeDatabase:
+    def __init__(self):
+        self.clients = []
+        self.calls = []
+
+    async def get_clients(self, after_id: int, recent: bool):
+        self.calls.append((after_id, recent))
+        return list(self.clients)
+
+class ClientIndexTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.db = FakeDatabase()
+        self.index = ClientIndex(self.db, sync_interval=60)
+        self.db.clients = [(2, 'Olena Bondar', None, 'Omega'), (1, 'Ivan Petrenko', 'ivan', 'Omega'),
+                           (3, 'Ivanna Shevchuk', None, 'Alpha')]
+        self.assertEqual(await self.index.sync(), 3)
+
+    async def test_prefix_search(self):
+        self.assertEqual([client.name for client in self.index.search('  IVAN')],
+                         ['Ivan Petrenko', 'Ivanna Shevchuk'])
+        self.assertEqual([client.id for client in self.index.search('ivan p')], [1])
+        self.assertEqual(self.index.search('ivan', limit=1), [Client(1, 'Ivan Petrenko', 'ivan', 'Omega')])
+        self.assertEqual(self.index.search(''), [])
+
+    async def test_sync_rereads_recent_clients(self):
+        # Ids are not committed in order: 4 appears after 5
+        self.db.clients = [(5, 'Petro Melnyk', None, 'Alpha')]
+        self.assertEqual(await self.index.sync(), 1)
+        self.db.clients = [(4, 'Anna Koval', None, 'Omega'), (5, 'Petro Melnyk', None, 'Alpha')]
+        self.assertEqual(await self.index.sync(), 1)
+        self.assertEqual(self.db.calls, [(0, False), (3, True), (5, True)])
+        self.assertEqual([client.name for client in self.index.search('anna')], ['Anna Koval'])
+        self.assertEqual(len(self.index), 5)
+
+    async def test_provisional_client_is_replaced_on_sync(self):
+        self.index.note_order('Anna  Koval', 'anna', 'Omega')
+        self.index.note_order('anna koval', 'anna', 'Omega')
+        provisional = self.index.find('Anna Koval', 'Omega')
+        self.assertEqual(provisional.id, -1)
+        self.assertIs(self.index.get(-1), provisional)
+        self.assertEqual(self.index.search('anna'), [provisional])
+
+        self.db.clients = [(4, 'Anna Koval', 'anna', 'Omega')]
+        self.assertEqual(await self.index.sync(), 0)
+        self.assertEqual(self.index.find('anna koval', 'Omega').id, 4)
+        self.assertIsNone(self.index.get(-1))
+        self.assertEqual([client.id for client in self.index.search('anna')], [4])
+        self.assertEqual(len(self.index), 4)
+
+    async def test_same_name_at_another_location_is_another_client(self):
+        self.index.note_order('Ivan Petrenko', None, 'Alpha')
+        self.assertEqual([client.location for client in self.index.search('ivan p')], ['Alpha', 'Omega'])
+
+if __name__ == '__main__':
+    unittest.main()
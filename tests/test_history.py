@@ -0,0 +1,86 @@
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+from bot.handlers import history_handlers
+from bot.handlers.history_handlers import HISTORY_PAGE_SIZE, decode_history_cursor, encode_history_cursor
+
+class FakeDatabase:
+    """get_client_orders over a list, with the keyset semantics of the SQL backends."""
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: (row[1], row[0]), reverse=True)
+
+    async def get_client_orders(self, client_id, cursor=None, newer=False, limit=10):
+        if cursor is None:
+            rows = self.rows
+        elif newer:
+            rows = [row for row in reversed(self.rows) if (row[1], row[0]) > cursor]
+        else:
+            rows = [row for row in self.rows if (row[1], row[0]) < cursor]
+        rows = rows[:limit]
+        return rows[::-1] if newer else rows
+
+def buttons(keyboard):
+    found = {}
+    for button in (keyboard.inline_keyboard[0] if keyboard else []):
+        found['newer' if 'Newer' in button.text else 'older'] = button.callback_data
+    return found
+
+class HistoryCursorTest(unittest.TestCase):
+    def test_round_trip(self):
+        data = encode_history_cursor(42, True, (date(2026, 9, 1), 1234))
+        self.assertEqual(decode_history_cursor(data), (42, (date(2026, 9, 1), 1234), True))
+        self.assertEqual(decode_history_cursor('history:42'), (42, None, False))
+
+    def test_fits_in_callback_data(self):
+        data = encode_history_cursor(2 ** 31 - 1, False, (date.max, 2 ** 31 - 1))
+        self.assertLessEqual(len(data.encode()), 64)
+        self.assertRegex(data, r'^history:[0-9]+(:[on]:[0-9]+:[0-9]+)?$')
+
+class HistoryPagingTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        # Several order lines a day, with ids not in date order
+        start = date(2026, 9, 1)
+        self.rows = [(1000 - i, start + timedelta(days=i // 3), 'Plastic', 1, 10.0)
+                     for i in range(2 * HISTORY_PAGE_SIZE + 5)]
+        patcher = mock.patch.object(history_handlers, 'db', FakeDatabase(self.rows))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.shown = []
+        format_patcher = mock.patch.object(
+            history_handlers, 'format_client_history',
+            lambda name, location, rows: self.shown.append([row[0] for row in rows]) or ''
+        )
+        format_patcher.start()
+        self.addCleanup(format_patcher.stop)
+
+    async def open(self, data):
+        client_id, cursor, newer = decode_history_cursor(data)
+        _, keyboard = await history_handlers._history_page(client_id, cursor, newer)
+        return self.shown[-1], buttons(keyboard)
+
+    async def test_pages_cover_every_order_once(self):
+        expected = [row[0] for row in sorted(self.rows, key=lambda row: (row[1], row[0]), reverse=True)]
+        pages, links = [], {'older': 'history:1'}
+        while 'older' in links:
+            page, links = await self.open(links['older'])
+            pages.append(page)
+        self.assertEqual([order_id for page in pages for order_id in page], expected)
+        self.assertEqual([len(page) for page in pages], [HISTORY_PAGE_SIZE, HISTORY_PAGE_SIZE, 5])
+
+        # And back again, ending on a full first page without a "Newer" button
+        back = []
+        while 'newer' in links:
+            page, links = await self.open(links['newer'])
+            back.append(page)
+        self.assertEqual(back, pages[-2::-1])
+        self.assertEqual(links.keys(), {'older'})
+
+    async def test_short_history_has_no_buttons(self):
+        history_handlers.db.rows = history_handlers.db.rows[:3]
+        page, links = await self.open('history:1')
+        self.assertEqual(len(page), 3)
+        self.assertEqual(links, {})
+
+if __name__ == '__main__':
+    unittest.main()
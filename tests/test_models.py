@@ -0,0 +1,69 @@
+import unittest
+from decimal import Decimal
+from bot.models.models import Cart, MAX_QUANTITY, MAX_TOTAL, format_money, from_minor_units, to_minor_units
+
+class MoneyTest(unittest.TestCase):
+    def test_minor_units(self):
+        self.assertEqual(to_minor_units(Decimal('12.50')), 1250)
+        self.assertEqual(to_minor_units(0.1 + 0.2), 30)
+        self.assertEqual(to_minor_units('0.105'), 11)
+        self.assertEqual(from_minor_units(1250), Decimal('12.50'))
+
+    def test_format_money(self):
+        self.assertEqual(format_money(1205), '12.05')
+        self.assertEqual(format_money(0), '0.00')
+        self.assertEqual(format_money(-5), '-0.05')
+
+class CartTest(unittest.TestCase):
+    def test_total_follows_lines(self):
+        cart = Cart()
+        cart.set('1', 'Plastic', 1250, 3)
+        cart.set('2', 'Leather', 999, 1)
+        self.assertEqual(cart.total, 4749)
+        cart.set('1', 'Plastic', 1250, 1)
+        self.assertEqual(cart.total, 2249)
+        self.assertEqual(list(cart), ['1', '2'])
+        cart.remove('2')
+        cart.remove('3')
+        self.assertEqual(cart.total, 1250)
+
+    def test_lines_are_rerendered_when_changed(self):
+        cart = Cart()
+        cart.set('1', 'Plastic', 1250, 3)
+        self.assertEqual(cart.lines(), ['• Plastic: 3 × ₴12.50 = ₴37.50'])
+        cart.set('1', 'Plastic', 1250, 2)
+        self.assertEqual(cart.lines(), ['• Plastic: 2 × ₴12.50 = ₴25.00'])
+
+    def test_copy_is_independent(self):
+        cart = Cart()
+        cart.set('1', 'Plastic', 1250, 3)
+        copy = cart.copy()
+        copy.set('1', 'Plastic', 1250, 5)
+        self.assertEqual(cart.get('1').quantity, 3)
+        self.assertEqual(cart.total, 3750)
+        self.assertEqual(copy.total, 6250)
+
+    def test_encode_round_trip(self):
+        cart = Cart()
+        cart.set('1', 'Plastic', 1250, 3)
+        cart.set('2', 'Leather', 999, 1)
+        decoded = Cart.decode(cart.encode())
+        self.assertEqual(decoded, cart)
+        self.assertEqual(decoded.total, cart.total)
+        # Carts persisted before prices were kopecks
+        legacy = Cart.decode({'1': ['Plastic', '12.50', 3]})
+        self.assertEqual(legacy.get('1').price, 1250)
+
+    def test_fits_storage_bounds(self):
+        cart = Cart()
+        self.assertTrue(cart.fits('1', 1, MAX_QUANTITY))
+        self.assertFalse(cart.fits('1', 0, MAX_QUANTITY + 1))
+        self.assertFalse(cart.fits('1', 100, MAX_TOTAL))
+        cart.set('1', 'Plastic', MAX_TOTAL - 100, 1)
+        self.assertFalse(cart.fits('2', 101, 1))
+        self.assertTrue(cart.fits('2', 100, 1))
+        # Replacing a line only counts its new subtotal
+        self.assertTrue(cart.fits('1', MAX_TOTAL, 1))
+
+if __name__ == '__main__':
+    unittest.main()
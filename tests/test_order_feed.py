@@ -0,0 +1,79 @@
+import asyncio
+import unittest
+from decimal import Decimal
+from bot.utils.order_feed import OrderFeed
+
+class FakeDatabase:
+    notifies = True
+
+    def __init__(self, rows):
+        self.rows = {row[0]: row for row in rows}
+        self.fail_ack = False
+
+    async def get_order_feed(self):
+        return sorted(self.rows.values())
+
+    async def ack_order_feed(self, feed_ids):
+        if self.fail_ack:
+            raise ConnectionError("database is gone")
+        for feed_id in feed_ids:
+            self.rows.pop(feed_id, None)
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        await asyncio.sleep(0.02)
+        self.sent.append(text)
+
+def row(feed_id: int):
+    return (feed_id, 100 + feed_id, f'Client {feed_id}', 'Omega', Decimal(feed_id))
+
+def sent_orders(bot):
+    return [line.split()[0] for text in bot.sent for line in text.splitlines() if line.startswith('#')]
+
+class OrderFeedTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.db = FakeDatabase([row(1)])
+        self.bot = FakeBot()
+        self.feed = OrderFeed(self.db, interval=0.01, max_orders=2)
+        self.feed.bot, self.feed.chat_id = self.bot, 1
+
+    async def test_loaded_and_notified_entry_is_sent_once(self):
+        # The row committed between LISTEN and the load: loaded, then notified
+        # while its digest is being sent
+        await self.feed.load()
+        flush = asyncio.create_task(self.feed.flush())
+        await asyncio.sleep(0.005)
+        self.db.rows[2] = row(2)
+        await asyncio.gather(self.feed._notified(list(row(1))), self.feed._notified(list(row(2))), flush)
+        await self.feed.flush()
+
+        self.assertEqual(sent_orders(self.bot), ['#101', '#102'])
+        self.assertEqual(self.db.rows, {})
+        self.assertEqual(self.feed._pending, {})
+
+    async def test_unacknowledged_digest_is_not_queued_again(self):
+        await self.feed.load()
+        self.db.fail_ack = True
+        with self.assertRaises(ConnectionError):
+            await self.feed.flush()
+        # A reconnect reads the sent entry back from the table
+        await self.feed.load()
+        self.db.fail_ack = False
+        await self.feed.flush()
+
+        self.assertEqual(sent_orders(self.bot), ['#101'])
+        self.assertEqual(self.db.rows, {})
+
+    async def test_digests_hold_max_orders(self):
+        self.db.rows = {feed_id: row(feed_id) for feed_id in range(1, 6)}
+        await self.feed.load()
+        await self.feed.flush()
+        self.assertEqual([text.count('\n#') for text in self.bot.sent], [2, 2, 1])
+        self.assertEqual(sent_orders(self.bot), ['#101', '#102', '#103', '#104', '#105'])
+        self.assertEqual(self.db.rows, {})
+
+if __name__ == '__main__':
+    unittest.main()
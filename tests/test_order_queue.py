@@ -0,0 +1,122 @@
+import os
+import json
+import asyncio
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from bot.database import order_queue as order_queue_module
+from bot.database.order_queue import OrderQueue, _encode_order
+from bot.models.models import Cart, Order
+
+def make_cart(quantity: int = 1) -> Cart:
+    cart = Cart()
+    cart.set('1', 'Plastic', 1250, quantity)
+    return cart
+
+class FakeDatabase:
+    def __init__(self):
+        self.saved = []
+        self.batches = []
+        self.unavailable = 0
+        self.refused = set()
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def save_orders(self, batch):
+        await self.gate.wait()
+        self.batches.append(len(batch))
+        if self.unavailable:
+            self.unavailable -= 1
+            raise ConnectionError("database is down")
+        if any(order.client_name in self.refused for order in batch):
+            raise sqlite3.IntegrityError("CHECK constraint failed")
+        self.saved.extend(order.client_name for order in batch)
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+class OrderQueueTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.journal = os.path.join(self.dir.name, 'orders.journal')
+        self.db = FakeDatabase()
+
+    def make_queue(self) -> OrderQueue:
+        queue = OrderQueue(self.db, self.journal, batch_size=10, max_retry_delay=0.01)
+        self.addAsyncCleanup(queue.stop, 0.1)
+        return queue
+
+    def read_journal(self, suffix: str = ''):
+        with open(self.journal + suffix, encoding='utf-8') as journal:
+            return [json.loads(line) for line in journal]
+
+    async def test_replays_unwritten_orders(self):
+        orders = [Order(f'key-{i}', f'Client {i}', None, 'Omega', make_cart(i + 1), chat_id=5) for i in range(3)]
+        with open(self.journal, 'w', encoding='utf-8') as journal:
+            journal.write(_encode_order(orders[0]) + '\n')
+            journal.write(_encode_order(orders[1]) + '\n')
+            journal.write(json.dumps({'op': 'done', 'keys': ['key-0']}) + '\n')
+            journal.write(_encode_order(orders[2]) + '\n')
+            journal.write('{"op": "order", "key": "torn')
+
+        queue = self.make_queue()
+        self.db.gate.clear()
+        await queue.start()
+        # Compacted to the outstanding orders before anything is written
+        self.assertEqual([record['key'] for record in self.read_journal()], ['key-1', 'key-2'])
+        self.assertEqual(queue._unwritten['key-2'].cart, orders[2].cart)
+
+        self.db.gate.set()
+        await queue._queue.join()
+        self.assertEqual(self.db.saved, ['Client 1', 'Client 2'])
+        self.assertEqual(queue._unwritten, {})
+
+    async def test_submitted_order_survives_restart(self):
+        queue = OrderQueue(self.db, self.journal, batch_size=10, max_retry_delay=0.01)
+        self.db.gate.clear()
+        await queue.start()
+        key = await queue.submit('Ivan', 'ivan', 'Omega', make_cart(3), client_id=7, chat_id=5)
+        await queue.stop(timeout=0.01)
+        self.assertEqual(self.db.saved, [])
+
+        self.db.gate.set()
+        restarted = self.make_queue()
+        await restarted.start()
+        await restarted._queue.join()
+        self.assertEqual(self.db.saved, ['Ivan'])
+        self.assertEqual(self.read_journal()[-1], {'op': 'done', 'keys': [key]})
+
+    async def test_retries_while_database_is_unavailable(self):
+        queue = self.make_queue()
+        await queue.start()
+        self.db.unavailable = 2
+        await queue.submit('Ivan', None, 'Omega', make_cart())
+        await queue._queue.join()
+        self.assertEqual(self.db.saved, ['Ivan'])
+        self.assertEqual(self.db.batches, [1, 1, 1])
+
+    async def test_refused_order_is_set_aside_and_reported(self):
+        bot = FakeBot()
+        queue = self.make_queue()
+        self.db.refused.add('Broken')
+        self.db.gate.clear()
+        with mock.patch.object(order_queue_module, 'admin_users', lambda: ({1, 5}, set())):
+            await queue.start(bot)
+            for name in ('Ivan', 'Broken', 'Olena'):
+                await queue.submit(name, None, 'Omega', make_cart(2), chat_id=5)
+            self.db.gate.set()
+            await queue._queue.join()
+
+        self.assertEqual(self.db.saved, ['Ivan', 'Olena'])
+        self.assertEqual([record['client_name'] for record in self.read_journal('.rejected')], ['Broken'])
+        self.assertEqual([chat_id for chat_id, _ in bot.sent], [5, 1])
+        self.assertIn('Broken (Omega, ₴25.00)', bot.sent[0][1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from bot.models.models import MAX_QUANTITY, Product
+from bot.utils.product_matcher import ProductMatcher, parse_cart_entry
+
+PRODUCTS = [Product(1, 'Plastic', 10.0), Product(2, 'Leather', 20.0),
+            Product(3, 'Bracelet', 5.0), Product(4, 'Bracket', 6.0)]
+
+def names(products):
+    return [product.name for product in products]
+
+class ProductMatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.matcher = ProductMatcher(PRODUCTS)
+
+    def test_exact_and_prefix(self):
+        self.assertEqual(names(self.matcher.match('  LEATHER ')), ['Leather'])
+        self.assertEqual(names(self.matcher.match('pla')), ['Plastic'])
+        self.assertEqual(names(self.matcher.match('brac')), ['Bracelet', 'Bracket'])
+        self.assertEqual(self.matcher.match(''), [])
+
+    def test_one_typo(self):
+        self.assertEqual(names(self.matcher.match('lether')), ['Leather'])
+        self.assertEqual(names(self.matcher.match('plsatic')), ['Plastic'])
+        self.assertEqual(names(self.matcher.match('plasticc')), ['Plastic'])
+        self.assertEqual(self.matcher.match('plsatc'), [])
+
+    def test_short_names_need_a_prefix(self):
+        self.assertEqual(self.matcher.match('lea'), self.matcher.match('leather'))
+        self.assertEqual(self.matcher.match('pls'), [])
+
+class ParseCartEntryTest(unittest.TestCase):
+    def setUp(self):
+        self.matcher = ProductMatcher(PRODUCTS)
+
+    def parse(self, text):
+        items, errors = parse_cart_entry(text, self.matcher)
+        return [(product.name, quantity) for product, quantity in items], errors
+
+    def test_quantity_forms(self):
+        self.assertEqual(
+            self.parse('Plastic 3, Leather x2; bracelet\n2 × bracket'),
+            ([('Plastic', 3), ('Leather', 2), ('Bracelet', 1), ('Bracket', 2)], [])
+        )
+        self.assertEqual(self.parse('leather x 4, 5x plastic'), ([('Leather', 4), ('Plastic', 5)], []))
+
+    def test_repeated_products_add_up(self):
+        self.assertEqual(self.parse('plastic 2, Plastic 3'), ([('Plastic', 5)], []))
+
+    def test_errors(self):
+        items, errors = self.parse('plastic 2, wood 1, brac 2, leather 0, 3, leather ' + str(MAX_QUANTITY + 1))
+        self.assertEqual(items, [('Plastic', 2)])
+        self.assertEqual(errors, [
+            '"wood 1": unknown product',
+            '"brac 2": did you mean Bracelet or Bracket?',
+            '"leather 0": the quantity must be positive',
+            '"3": which product?',
+            f'"leather {MAX_QUANTITY + 1}": the quantity is too large',
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import time
+import asyncio
+import unittest
+from unittest import mock
+from telegram.error import RetryAfter
+from bot.utils import rate_limiter
+from bot.utils.rate_limiter import OutboundScheduler, TokenBucket
+
+def make_scheduler(**overrides) -> OutboundScheduler:
+    settings = dict(global_rate=1000, chat_rate=20, chat_burst=1, group_rate=10, group_burst=1, max_retries=2)
+    settings.update(overrides)
+    return OutboundScheduler(**settings)
+
+class TokenBucketTest(unittest.TestCase):
+    def test_reservations_queue_up(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        delays = [bucket.reserve() for _ in range(4)]
+        self.assertEqual(delays[:2], [0.0, 0.0])
+        self.assertAlmostEqual(delays[2], 0.1, places=2)
+        self.assertAlmostEqual(delays[3], 0.2, places=2)
+
+    def test_pause_and_full(self):
+        bucket = TokenBucket(rate=10, burst=1)
+        self.assertTrue(bucket.full(time.monotonic()))
+        bucket.pause(0.5)
+        self.assertAlmostEqual(bucket.reserve(), 0.6, places=2)
+        self.assertFalse(bucket.full(time.monotonic()))
+
+class OutboundSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def send(self, scheduler, chat_id, endpoint='sendMessage', callback=None, **data):
+        async def call(**kwargs):
+            return kwargs
+        return await scheduler.process_request(
+            callback or call, (), {'chat_id': chat_id, **data}, endpoint, {'chat_id': chat_id, **data}, None)
+
+    async def test_busy_chat_does_not_delay_others(self):
+        scheduler = make_scheduler()
+        started = time.perf_counter()
+        finished = {}
+
+        async def send(name, chat_id):
+            await self.send(scheduler, chat_id)
+            finished[name] = time.perf_counter() - started
+
+        await asyncio.gather(*(send(f'a{i}', 1) for i in range(3)), send('b', 2), send('group', -5))
+        self.assertLess(finished['b'], 0.05)
+        self.assertLess(finished['group'], 0.05)
+        self.assertGreaterEqual(finished['a2'], 0.09)
+        self.assertEqual(scheduler.stats['delayed'], 2)
+        self.assertEqual(scheduler._chat_buckets[-5].rate, 10)
+
+    async def test_calls_without_chat_and_edits_skip_the_chat_bucket(self):
+        scheduler = make_scheduler(chat_rate=1)
+        started = time.perf_counter()
+        await self.send(scheduler, 1)
+        for message_id in range(3):
+            await self.send(scheduler, 1, 'editMessageText', message_id=message_id)
+        await scheduler.process_request(lambda: asyncio.sleep(0, True), (), {}, 'answerCallbackQuery', {}, None)
+        self.assertLess(time.perf_counter() - started, 0.1)
+        self.assertEqual(scheduler.stats['delayed'], 0)
+
+    async def test_waiting_edits_are_merged(self):
+        scheduler = make_scheduler()
+        scheduler.global_bucket = TokenBucket(rate=20, burst=1)
+        calls = []
+
+        async def edit(**kwargs):
+            calls.append(kwargs['text'])
+            return kwargs['text']
+
+        async def send(text, delay):
+            await asyncio.sleep(delay)
+            return await self.send(scheduler, 1, 'editMessageText', callback=edit, message_id=7, text=text)
+
+        results = await asyncio.gather(send('a', 0), send('b', 0.001), send('c', 0.01), send('d', 0.02))
+        self.assertEqual(calls, ['a', 'd'])
+        self.assertEqual(results, ['a', 'd', 'd', 'd'])
+        self.assertEqual(scheduler.stats['merged'], 2)
+        self.assertEqual(scheduler._edits, {})
+
+    async def test_merged_edits_share_the_error(self):
+        scheduler = make_scheduler()
+        scheduler.global_bucket = TokenBucket(rate=20, burst=0)
+
+        async def edit(**kwargs):
+            raise ValueError(kwargs['text'])
+
+        results = await asyncio.gather(
+            self.send(scheduler, 1, 'editMessageText', callback=edit, message_id=7, text='a'),
+            self.send(scheduler, 1, 'editMessageText', callback=edit, message_id=7, text='b'),
+            return_exceptions=True
+        )
+        self.assertEqual([str(result) for result in results], ['b', 'b'])
+        self.assertEqual(scheduler._edits, {})
+
+    async def test_retry_after(self):
+        scheduler = make_scheduler()
+        attempts = []
+
+        async def flaky(**kwargs):
+            attempts.append(time.perf_counter())
+            if len(attempts) < 3:
+                raise RetryAfter(0)
+            return True
+
+        self.assertTrue(await self.send(scheduler, 1, callback=flaky))
+        self.assertEqual(scheduler.stats['retried'], 2)
+
+        attempts.clear()
+        with self.assertRaises(RetryAfter):
+            await scheduler.process_request(flaky, (), {}, 'sendMessage', {'chat_id': 1}, 1)
+
+    async def test_idle_buckets_are_dropped(self):
+        scheduler = make_scheduler(chat_rate=1000)
+        for chat_id in range(5):
+            await self.send(scheduler, chat_id)
+        self.assertEqual(len(scheduler._chat_buckets), 5)
+        await asyncio.sleep(0.01)
+        scheduler._chat_buckets[2].pause(10)
+        with mock.patch.object(rate_limiter, 'BUCKET_SWEEP_INTERVAL', 0):
+            await self.send(scheduler, 9)
+        self.assertEqual(sorted(scheduler._chat_buckets), [2, 9])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from bot.utils.sharding import HashRing, WorkerProcess, routing_key
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# A stand-in worker: records updates, answers drains, and exits with code 1 on
+# an update whose id is in CRASH_ON (once, marked by a file next to the log)
+FAKE_WORKER = '''
+import os, sys, asyncio
+from bot.utils.sharding import read_frame, write_frame
+socket_path = sys.argv[sys.argv.index('--socket') + 1]
+log, crash_on = os.environ['WORKER_LOG'], {int(i) for i in os.environ.get('CRASH_ON', '').split(',') if i}
+
+async def handle(reader, writer):
+    while (frame := await read_frame(reader)) is not None:
+        if 'update' in frame:
+            update_id = frame['update']['update_id']
+            if update_id in crash_on and not os.path.exists(log + '.crashed'):
+                open(log + '.crashed', 'w').close()
+                os._exit(1)
+            with open(log, 'a') as f:
+                f.write(f"{update_id}\\n")
+        elif 'drain' in frame:
+            await write_frame(writer, {'drained': frame['drain']})
+
+async def main():
+    server = await asyncio.start_unix_server(handle, socket_path)
+    async with server:
+        await server.serve_forever()
+
+asyncio.run(main())
+'''
+
+class WorkerProcessTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        script = Path(self.dir.name) / 'worker.py'
+        script.write_text(FAKE_WORKER)
+        self.log = Path(self.dir.name) / 'updates.log'
+        self.env = dict(os.environ, PYTHONPATH=str(ROOT), WORKER_LOG=str(self.log))
+        self.command = [sys.executable, str(script)]
+
+    async def asyncTearDown(self):
+        self.dir.cleanup()
+
+    def received(self):
+        return [int(line) for line in self.log.read_text().split()] if self.log.exists() else []
+
+    async def test_crash_with_pending_drain(self):
+        worker = WorkerProcess('worker-0', self.command, os.path.join(self.dir.name, 'w.sock'),
+                               dict(self.env, CRASH_ON='2'))
+        await worker.start()
+        try:
+            worker.forward({'update_id': 1})
+            worker.forward({'update_id': 2})
+            # Queued behind the update that crashes the worker
+            first = asyncio.create_task(worker.drain())
+            second = asyncio.create_task(worker.drain())
+            await asyncio.wait_for(asyncio.gather(first, second), 10)
+
+            # The restarted worker keeps serving; the update it crashed on was
+            # already written to the socket, so it is not sent again
+            worker.forward({'update_id': 3})
+            await asyncio.wait_for(worker.drain(), 10)
+            self.assertEqual(self.received(), [1, 3])
+            self.assertEqual(worker._drains, {})
+        finally:
+            await asyncio.wait_for(worker.stop(), 10)
+
+    async def test_stop_drains_first(self):
+        worker = WorkerProcess('worker-0', self.command, os.path.join(self.dir.name, 'w.sock'), self.env)
+        await worker.start()
+        for update_id in range(5):
+            worker.forward({'update_id': update_id})
+        await asyncio.wait_for(worker.stop(), 10)
+        self.assertEqual(self.received(), list(range(5)))
+
+class HashRingTest(unittest.TestCase):
+    def test_removing_a_node_only_moves_its_keys(self):
+        before = HashRing(['worker-0', 'worker-1', 'worker-2'])
+        after = HashRing(['worker-0', 'worker-1'])
+        for key in range(1000):
+            if before.node(key) != 'worker-2':
+                self.assertEqual(after.node(key), before.node(key))
+
+    def test_routing_key_prefers_the_user(self):
+        self.assertEqual(routing_key({'update_id': 1, 'message': {'from': {'id': 7}, 'chat': {'id': -5}}}), 7)
+
+if __name__ == '__main__':
+    unittest.main()
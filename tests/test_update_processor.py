@@ -0,0 +1,46 @@
+import time
+import asyncio
+import unittest
+from datetime import datetime, timezone
+from telegram import Chat, Message, Update
+from bot.utils.update_processor import PerChatUpdateProcessor
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    chat = Chat(chat_id, Chat.PRIVATE)
+    return Update(update_id, message=Message(update_id, datetime.now(timezone.utc), chat, text='x'))
+
+class PerChatUpdateProcessorTest(unittest.IsolatedAsyncioTestCase):
+    async def test_busy_chat_does_not_delay_other_chats(self):
+        processor = PerChatUpdateProcessor(4)
+        started = time.perf_counter()
+        finished = {}
+
+        async def handle(name: str, delay: float) -> None:
+            await asyncio.sleep(delay)
+            finished[name] = time.perf_counter() - started
+
+        tasks = [asyncio.create_task(processor.process_update(make_update(i, 1), handle(f'a{i}', 0.2)))
+                 for i in range(6)]
+        tasks.append(asyncio.create_task(processor.process_update(make_update(6, 2), handle('b', 0))))
+        await asyncio.gather(*tasks)
+
+        self.assertLess(finished['b'], 0.1)
+        self.assertEqual(sorted(finished, key=finished.get), ['b'] + [f'a{i}' for i in range(6)])
+
+    async def test_chat_keeps_order_when_slots_are_taken(self):
+        processor = PerChatUpdateProcessor(1)
+        order = []
+
+        async def handle(name: str) -> None:
+            await asyncio.sleep(0.01)
+            order.append(name)
+
+        await asyncio.gather(*(
+            processor.process_update(make_update(i, 1 + i % 2), handle(f'{1 + i % 2}:{i}')) for i in range(8)
+        ))
+        self.assertEqual([name for name in order if name.startswith('1:')], ['1:0', '1:2', '1:4', '1:6'])
+        self.assertEqual([name for name in order if name.startswith('2:')], ['2:1', '2:3', '2:5', '2:7'])
+        self.assertEqual(processor._tails, {})
+
+if __name__ == '__main__':
+    unittest.main()